@@ -13,11 +13,17 @@ Consult the following papers for more detailed information:
 """
 
 import numpy as np
+from copy import copy
+from scipy.spatial import KDTree
 
 from .cobraConstants import COBRAS_SEPARATION
+from .cobraConstants import COLLISION_DETECTION_MEMORY
 from .cobraConstants import MODULE_FIRST_LINE_LENGTH
 from .cobraConstants import MODULE_SECOND_LINE_LENGTH
 from .cobraConstants import MODULES_PER_SECTOR
+from .cobraConstants import NEVER_COLLIDING_ASSOCIATION
+from .cobraConstants import POSSIBLY_COLLIDING_ASSOCIATION
+from .cobraConstants import OFTEN_COLLIDING_ASSOCIATION
 from .CobraGroup import CobraGroup
 
 
@@ -27,7 +33,7 @@ class Bench:
     """
 
     def __init__(self, cobraCenters=None, layout="full",
-                 calibrationProduct=None):
+                 calibrationProduct=None, pruneAssociations=True):
         """Constructs a new Bench instance.
 
         Parameters
@@ -43,6 +49,11 @@ class Bench:
         calibrationProduct: object, optional
             The cobras calibration product with the cobra properties to use.
             Default is None.
+        pruneAssociations: bool, optional
+            If True, the cobra associations that can never collide will be
+            removed from the cobra associations array, and they will not be
+            used in the collision calculations. The cobra neighbors are not
+            affected. Default is True.
 
         Returns
         -------
@@ -62,9 +73,23 @@ class Bench:
         self.cobras = CobraGroup(cobraCenters)
 
         # Update the cobra properties if necessary
+        self.calibrationProduct = calibrationProduct
+
         if calibrationProduct is not None:
             self.cobras.useCalibrationProduct(calibrationProduct)
 
+        # Calculate the bench center and radius
+        self.calculateCenterAndRadius()
+
+        # Calculate the cobra nearest neighbors associations array
+        self.pruneAssociations = pruneAssociations
+        self.calculateCobraAssociations()
+
+    def calculateCenterAndRadius(self):
+        """Calculates the bench center and radius using the cobras that have
+        no problems.
+
+        """
         # Calculate the bench center
         self.center = np.mean(self.cobras.centers[~self.cobras.hasProblem])
 
@@ -73,13 +98,327 @@ class Bench:
             self.cobras.centers[~self.cobras.hasProblem] - self.center) + 
             self.cobras.rMax[~self.cobras.hasProblem])
 
-        # Calculate the cobra nearest neighbors associations array
-        self.calculateCobraAssociations()
+    def resample(self, rng=None):
+        """Draws new random cobra properties without reconstructing the bench.
+
+        If the bench uses a calibration product with a different number of
+        cobras, the cobras link, status and motor map properties are assigned
+        again randomly from the calibration product. If the bench has no
+        calibration product, the cobras home angles are set to new random
+        values. The cobra centers are not modified, and the cobra associations
+        are only recalculated if the new cobras status changes them.
+
+        Parameters
+        ----------
+        rng: object, optional
+            The numpy random generator to use. If it is set to None, the numpy
+            global random generator will be used. Default is None.
+
+        """
+        # Save the current cobras status
+        hasProblem = self.cobras.hasProblem
+
+        # Draw the new random cobra properties
+        if self.calibrationProduct is None:
+            self.cobras.randomizeHomeAngles(rng)
+            self.cobras.calculatePatrolAreaRadii()
+            self.cobras.calculateHomePositions()
+        elif self.calibrationProduct.nCobras != self.cobras.nCobras:
+            self.cobras.useCalibrationProduct(self.calibrationProduct, rng=rng)
+        else:
+            # All the cobra properties come directly from the calibration
+            # product and there is nothing to resample
+            return
+
+        # Update the bench center and radius
+        self.calculateCenterAndRadius()
+
+        # The cobra associations only depend on the cobras with problems
+        # through the median minimum distance between cobras
+        if np.any(self.cobras.hasProblem != hasProblem):
+            oldMaxDistance = 1.5 * np.median(
+                self.minimumCobraDistances[~hasProblem])
+            newMaxDistance = 1.5 * np.median(
+                self.minimumCobraDistances[~self.cobras.hasProblem])
 
-    def calculateCobraAssociations(self):
+            if newMaxDistance != oldMaxDistance:
+                self.calculateCobraAssociations()
+                return
+
+        # The cobra link properties have changed and the associations need to
+        # be classified again
+        self.updateCobraAssociations()
+
+    def select(self, cobraIndices):
+        """Selects a subset of the bench cobras.
+
+        The nearby cobra associations of the new bench are the nearby
+        associations of the current bench between the selected cobras. They
+        are not recalculated, because the median minimum distance between the
+        selected cobras could be different.
+
+        The new bench cobras are obtained with the CobraGroup subset method,
+        so they share the current cobra arrays when the indices are equally
+        spaced, like the cobras in a module or a sector.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            A numpy array with the indices of the cobras to select.
+
+        Returns
+        -------
+        object
+            A new Bench instance containing only the selected cobras.
+
+        """
+        # Make sure cobraIndices is a numpy array
+        cobraIndices = np.array(cobraIndices, dtype=np.intp)
+
+        # Copy the instance and select the cobras
+        selectedBench = copy(self)
+        selectedBench.cobras = self.cobras.subset(cobraIndices)
+        selectedBench.minimumCobraDistances = self.minimumCobraDistances[
+            cobraIndices]
+
+        # Update the bench center and radius
+        selectedBench.calculateCenterAndRadius()
+
+        # Select the associations where both cobras are selected and use the
+        # new cobra indices
+        newIndices = np.full(self.cobras.nCobras, -1, dtype=np.intp)
+        newIndices[cobraIndices] = np.arange(len(cobraIndices))
+        cobraAssociations = newIndices[self.nearbyCobraAssociations]
+        cobraAssociations = np.sort(
+            cobraAssociations[:, np.all(cobraAssociations >= 0, axis=0)],
+            axis=0)
+        selectedBench.nearbyCobraAssociations = cobraAssociations[
+            :, np.lexsort(cobraAssociations[::-1])]
+
+        # Update the cobra associations and the cobra neighbors index
+        selectedBench.updateCobraAssociations()
+
+        return selectedBench
+
+    def calculateCobraAssociations(self, useKDTree=True):
         """Calculates the cobras nearest neighbors associations array.
 
-        Each column in the array contains a different cobra association.
+        Each column in the array contains a different cobra association. All
+        the nearby cobra pairs are saved in the nearbyCobraAssociations array,
+        and the ones that can collide in the cobraAssociations array (see the
+        updateCobraAssociations method).
+
+        Parameters
+        ----------
+        useKDTree: bool, optional
+            If True, the nearest neighbors will be found using a KD tree
+            constructed with the cobra centers, which scales as O(N log N). If
+            False, the full cobras distance matrix will be calculated. Both
+            methods produce the same associations array. Default is True.
+
+        """
+        if useKDTree:
+            (cobrasIndices, nearbyCobrasIndices) = self.findNearbyCobras()
+        else:
+            (cobrasIndices, nearbyCobrasIndices) = self.findNearbyCobrasDense()
+
+        # Save the cobra associations in a single array
+        self.nearbyCobraAssociations = np.vstack(
+            (cobrasIndices, nearbyCobrasIndices))
+
+        # Update the cobra associations and the cobra neighbors index
+        self.updateCobraAssociations()
+
+    def updateCobraAssociations(self):
+        """Classifies the nearby cobra associations and updates the cobra
+        associations array and the cobra neighbors index.
+
+        The association classes are saved in the associationClasses array,
+        which has one element for each nearby cobra association. If
+        pruneAssociations is True, the associations that can never collide are
+        not included in the cobraAssociations array. The index of each nearby
+        association in the cobraAssociations array is saved in the
+        nearbyAssociationIndices array (-1 for the removed associations).
+
+        """
+        # Classify the nearby cobra associations
+        self.associationClasses = self.classifyCobraAssociations(
+            self.nearbyCobraAssociations)
+
+        # Remove the associations that can never collide if necessary
+        if self.pruneAssociations:
+            keptAssociations = (self.associationClasses !=
+                                NEVER_COLLIDING_ASSOCIATION)
+            self.cobraAssociations = self.nearbyCobraAssociations[
+                :, keptAssociations]
+        else:
+            keptAssociations = np.full(len(self.associationClasses), True)
+            self.cobraAssociations = self.nearbyCobraAssociations
+
+        self.nearbyAssociationIndices = np.full(
+            len(keptAssociations), -1, dtype=np.intp)
+        self.nearbyAssociationIndices[keptAssociations] = np.arange(
+            np.sum(keptAssociations))
+
+        # Update the cobra neighbors index
+        self.calculateCobraNeighborsIndex()
+
+    def classifyCobraAssociations(self, cobraAssociations):
+        """Classifies the cobra associations according to the regions that
+        the cobra fiber links can sweep.
+
+        The fiber link of a cobra can only move inside a circle centered on
+        the cobra center, with a radius equal to the maximum of the L1 link
+        length and rMax. The fiber itself can only move inside the cobra
+        patrol area. The links of cobras with problems are fixed at their home
+        positions. An association is classified as never colliding if the
+        links swept regions are separated by more than the minimum link
+        separation, as often colliding if the fibers regions are not, and as
+        possibly colliding otherwise.
+
+        Parameters
+        ----------
+        cobraAssociations: object
+            An integer numpy array with the cobra associations to classify.
+            Each column in the array contains a different cobra association.
+
+        Returns
+        -------
+        object
+            An integer numpy array with the association classes:
+            NEVER_COLLIDING_ASSOCIATION, POSSIBLY_COLLIDING_ASSOCIATION or
+            OFTEN_COLLIDING_ASSOCIATION.
+
+        """
+        # Extract some useful information
+        cobras = self.cobras
+        (cobraIndices, nearbyCobraIndices) = cobraAssociations
+        sweptRadii = np.maximum(cobras.L1, cobras.rMax)
+        hasProblem = cobras.hasProblem
+
+        # Calculate the minimum separation allowed in each association. Use a
+        # small margin to account for rounding errors in the collision
+        # calculations
+        minimumSeparations = (cobras.linkRadius[cobraIndices] +
+                              cobras.linkRadius[nearbyCobraIndices] + 1e-6)
+
+        # Calculate the distances between the swept and the fiber regions,
+        # assuming that both cobras can move
+        centerDistances = np.abs(
+            cobras.centers[cobraIndices] - cobras.centers[nearbyCobraIndices])
+        sweptDistances = (centerDistances - sweptRadii[cobraIndices] -
+                          sweptRadii[nearbyCobraIndices])
+        fiberDistances = (centerDistances - cobras.rMax[cobraIndices] -
+                          cobras.rMax[nearbyCobraIndices])
+
+        # Use the fixed links for the associations with one cobra with
+        # problems
+        if np.any(hasProblem):
+            fiberPositions = cobras.home0.copy()
+            elbowPositions = cobras.calculateElbowPositions(fiberPositions)
+
+            for (indices1, indices2) in [(cobraIndices, nearbyCobraIndices),
+                                         (nearbyCobraIndices, cobraIndices)]:
+                selected = np.logical_and(
+                    hasProblem[indices1], ~hasProblem[indices2])
+                fixed = indices1[selected]
+                other = indices2[selected]
+                sweptDistances[selected] = Bench.distancesToLineSegments(
+                    cobras.centers[other], fiberPositions[fixed],
+                    elbowPositions[fixed]) - sweptRadii[other]
+                fiberDistances[selected] = np.abs(
+                    cobras.centers[other] - fiberPositions[fixed]) - \
+                    cobras.rMax[other]
+
+            # Use the distance between the fixed links if both cobras have
+            # problems
+            selected = np.logical_and(
+                hasProblem[cobraIndices], hasProblem[nearbyCobraIndices])
+            fixed = cobraIndices[selected]
+            other = nearbyCobraIndices[selected]
+            sweptDistances[selected] = Bench.distancesBetweenLineSegments(
+                fiberPositions[fixed], elbowPositions[fixed],
+                fiberPositions[other], elbowPositions[other])
+            fiberDistances[selected] = sweptDistances[selected]
+
+        # Classify the associations
+        associationClasses = np.full(
+            len(cobraIndices), POSSIBLY_COLLIDING_ASSOCIATION)
+        associationClasses[sweptDistances >= minimumSeparations] = \
+            NEVER_COLLIDING_ASSOCIATION
+        associationClasses[fiberDistances < minimumSeparations] = \
+            OFTEN_COLLIDING_ASSOCIATION
+
+        return associationClasses
+
+    def calculateCobraNeighborsIndex(self):
+        """Calculates the cobra neighbors index from the nearby cobra
+        associations array.
+
+        The index is saved in compressed sparse row format: the neighbors of
+        cobra i are stored in neighborIndices[neighborIndptr[i]:
+        neighborIndptr[i + 1]], and neighborAssociations contains the index of
+        the cobra association that connects the cobra with each neighbor, or
+        -1 if the association was removed because it can never collide.
+
+        """
+        # Extract some useful information
+        nCobras = self.cobras.nCobras
+
+        # Each association appears twice in the index, once for each cobra
+        cobraIndices = self.nearbyCobraAssociations.ravel()
+        neighborIndices = self.nearbyCobraAssociations[::-1].ravel()
+        associationIndices = np.tile(self.nearbyAssociationIndices, 2)
+
+        # Sort the index by cobra. The sort is stable, so the neighbors of each
+        # cobra will appear in the same order as in the getCobraNeighbors
+        # method
+        sortedIndices = np.argsort(cobraIndices, kind="stable")
+        self.neighborIndices = neighborIndices[sortedIndices]
+        self.neighborAssociations = associationIndices[sortedIndices]
+        self.neighborIndptr = np.zeros(nCobras + 1, dtype=np.intp)
+        np.cumsum(np.bincount(cobraIndices, minlength=nCobras),
+                  out=self.neighborIndptr[1:])
+
+    def _getIndexEntries(self, cobraIndices):
+        """Returns the positions in the neighbors index of the entries
+        associated to the given cobras.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            A numpy array with the cobra indices.
+
+        Returns
+        -------
+        object
+            An integer numpy array with the neighbors index positions.
+
+        """
+        # Get the index ranges for each cobra
+        cobraIndices = np.atleast_1d(cobraIndices)
+
+        if cobraIndices.dtype == bool:
+            (cobraIndices,) = np.where(cobraIndices)
+
+        starts = self.neighborIndptr[cobraIndices]
+        lengths = self.neighborIndptr[cobraIndices + 1] - starts
+
+        # Expand the ranges without looping over the cobras
+        offsets = np.cumsum(lengths) - lengths
+
+        return np.repeat(starts - offsets, lengths) + np.arange(np.sum(lengths))
+
+    def findNearbyCobrasDense(self):
+        """Finds the cobra pairs that are closer than 1.5 times the median
+        minimum distance between cobras using the full distance matrix.
+
+        Returns
+        -------
+        tuple
+            A python tuple with two integer numpy arrays containing the indices
+            of the cobras in each pair. The first array contains always the
+            lower indices and the pairs are sorted by these indices.
 
         """
         # Calculate the cobras distance matrix
@@ -91,8 +430,9 @@ class Bench:
                        np.arange(self.cobras.nCobras)] = np.Inf
 
         # Calculate the median minimum distance between cobras
+        self.minimumCobraDistances = np.min(distanceMatrix, axis=1)
         medianMinDistance = np.median(
-            np.min(distanceMatrix, axis=1)[~self.cobras.hasProblem])
+            self.minimumCobraDistances[~self.cobras.hasProblem])
 
         # Obtain the nearest neighbors indices
         (cobrasIndices, nearbyCobrasIndices) = np.where(
@@ -100,11 +440,72 @@ class Bench:
 
         # Remove all the duplicated cobra associations
         uniqueAssociations = cobrasIndices < nearbyCobrasIndices
-        cobrasIndices = cobrasIndices[uniqueAssociations]
-        nearbyCobrasIndices = nearbyCobrasIndices[uniqueAssociations]
 
-        # Save the cobra associations in a single array
-        self.cobraAssociations = np.vstack((cobrasIndices, nearbyCobrasIndices))
+        return (cobrasIndices[uniqueAssociations],
+                nearbyCobrasIndices[uniqueAssociations])
+
+    def findNearbyCobras(self):
+        """Finds the cobra pairs that are closer than 1.5 times the median
+        minimum distance between cobras using a KD tree.
+
+        The distances used in the comparisons are calculated in the same way
+        as in the findNearbyCobrasDense method, so both methods return exactly
+        the same pairs.
+
+        Returns
+        -------
+        tuple
+            A python tuple with two integer numpy arrays containing the indices
+            of the cobras in each pair. The first array contains always the
+            lower indices and the pairs are sorted by these indices.
+
+        """
+        # Extract some useful information
+        nCobras = self.cobras.nCobras
+        centers = self.cobras.centers
+
+        # There are no associations if we have less than two cobras
+        if nCobras < 2:
+            self.minimumCobraDistances = np.full(nCobras, np.Inf)
+            emptyIndices = np.empty(0, dtype=np.intp)
+            return (emptyIndices, emptyIndices.copy())
+
+        # Construct the KD tree using the cobra centers
+        kdTree = KDTree(np.column_stack((centers.real, centers.imag)))
+
+        # Get the closest neighbors of each cobra and calculate their exact
+        # distances, masking the cobra itself. Several neighbors are used to
+        # account for cobras that are at the same distance from a given cobra
+        nNeighbors = min(nCobras, 8)
+        (_, neighborIndices) = kdTree.query(
+            np.column_stack((centers.real, centers.imag)), k=nNeighbors)
+        neighborDistances = np.abs(
+            centers[:, np.newaxis] - centers[neighborIndices])
+        neighborDistances[
+            neighborIndices == np.arange(nCobras)[:, np.newaxis]] = np.Inf
+        self.minimumCobraDistances = np.min(neighborDistances, axis=1)
+
+        # Calculate the median minimum distance between cobras
+        maxDistance = 1.5 * np.median(
+            self.minimumCobraDistances[~self.cobras.hasProblem])
+
+        # Get all the pairs within that distance. Use a slightly larger search
+        # radius to make sure that no pair is lost because of the different
+        # rounding errors in the KD tree distance calculation
+        pairs = kdTree.query_pairs(
+            maxDistance * (1 + 1e-9), output_type="ndarray")
+        (cobrasIndices, nearbyCobrasIndices) = np.sort(pairs, axis=1).T
+
+        # Apply the exact distance condition
+        distances = np.abs(centers[cobrasIndices] - centers[nearbyCobrasIndices])
+        validPairs = distances < maxDistance
+        cobrasIndices = cobrasIndices[validPairs].astype(np.intp)
+        nearbyCobrasIndices = nearbyCobrasIndices[validPairs].astype(np.intp)
+
+        # Sort the pairs by the cobra indices
+        sortedIndices = np.lexsort((nearbyCobrasIndices, cobrasIndices))
+
+        return (cobrasIndices[sortedIndices], nearbyCobrasIndices[sortedIndices])
 
     def getCobraNeighbors(self, cobraIndex):
         """Returns the indices of the cobras that are neighbors to a given
@@ -121,13 +522,9 @@ class Bench:
             A numpy array with the cobra neighbor indices.
 
         """
-        # Get the two cobra neighbor association possibilities
-        firstNeighborGroup = self.cobraAssociations[
-            1][self.cobraAssociations[0] == cobraIndex]
-        secondNeighborGroup = self.cobraAssociations[
-            0][self.cobraAssociations[1] == cobraIndex]
-
-        return np.concatenate((firstNeighborGroup, secondNeighborGroup))
+        return self.neighborIndices[
+            self.neighborIndptr[cobraIndex]:self.neighborIndptr[cobraIndex + 1]
+            ].copy()
 
     def getCobrasNeighbors(self, cobraIndices):
         """Returns the indices of the cobras that are neighbors to the given
@@ -144,14 +541,28 @@ class Bench:
             A numpy array with the cobras neighbor indices.
 
         """
-        # Get the two neighbor association possibilities
-        firstNeighborGroup = self.cobraAssociations[
-            1][np.in1d(self.cobraAssociations[0], cobraIndices)]
-        secondNeighborGroup = self.cobraAssociations[
-            0][np.in1d(self.cobraAssociations[1], cobraIndices)]
-
         return np.unique(
-            np.concatenate((firstNeighborGroup, secondNeighborGroup)))
+            self.neighborIndices[self._getIndexEntries(cobraIndices)])
+
+    def getCobrasAssociations(self, cobraIndices):
+        """Returns the indices of the cobra associations where at least one of
+        the given cobras is involved.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            A numpy array with the cobra indices.
+
+        Returns
+        -------
+        object
+            A sorted numpy array with the cobra association indices.
+
+        """
+        associationIndices = self.neighborAssociations[
+            self._getIndexEntries(cobraIndices)]
+
+        return np.unique(associationIndices[associationIndices >= 0])
 
     def getCollisionsForCobra(self, cobraIndex, fiberPositions):
         """Calculates the total number of collisions for a given cobra.
@@ -199,24 +610,142 @@ class Bench:
 
         return np.sum(collisions)
 
-    def calculateCobraAssociationCollisions(self, fiberPositions,
-                                            associationIndices=None):
-        """Calculates which cobra associations are involved in a collision.
+    def calculateAssociationDistances(self, fiberPositions, elbowPositions,
+                                      associationIndices=None,
+                                      useBroadPhase=False):
+        """Calculates the distances between the cobra links in each cobra
+        association.
+
+        If the broad phase is used, each link is first enclosed in a circle
+        centered on the link midpoint. The distance between the circles is a
+        lower bound of the distance between the links, and only those
+        associations where that lower bound is smaller than the minimum
+        separation allowed between the links are passed to the exact line
+        segments distance calculation. The other associations get the lower
+        bound as their distance, which is always too large to produce a
+        collision. The broad phase should then only be used when the
+        distances are compared with the minimum separations.
 
         Parameters
         ----------
         fiberPositions: object
-            A complex numpy array with the cobras fiber positions.
+            A complex numpy array with the cobras fiber positions. It can have
+            a second dimension, for example with the positions for each step
+            in a trajectory.
+        elbowPositions: object
+            A complex numpy array with the cobras elbow positions. It should
+            have the same shape as the fiber positions array.
         associationIndices: object, optional
             A numpy array with the cobra association indices to use. If it is
             set to None, all the cobra associations will be used. Default is
             None.
+        useBroadPhase: bool, optional
+            If True, the broad phase will be used to skip the exact distance
+            calculation for associations that cannot collide. Default is
+            False.
 
         Returns
         -------
-        object
-            A boolean numpy array indicating which cobra associations are
-            involved in a collision at the given fiber positions.
+        tuple
+            A python tuple with the link distances for each association, the
+            minimum separation allowed between the links, with the same number
+            of dimensions as the distances array, and a boolean numpy array
+            indicating which distances were calculated exactly.
+
+        """
+        # Extract some useful information
+        cobraAssociations = self.cobraAssociations
+        linkRadius = self.cobras.linkRadius
+
+        # Select a subset of the cobra associations if necessary
+        if associationIndices is not None:
+            cobraAssociations = cobraAssociations[:, associationIndices]
+
+        # Calculate the minimum separation allowed in each association
+        minimumSeparations = (linkRadius[cobraAssociations[0]] +
+                              linkRadius[cobraAssociations[1]])
+        minimumSeparations = minimumSeparations.reshape(
+            minimumSeparations.shape + (1,) * (np.ndim(fiberPositions) - 1))
+
+        # Calculate the link bounding circles if the broad phase is used
+        if useBroadPhase:
+            (midPoints, halfLengths) = Bench.calculateLinkCircles(
+                fiberPositions, elbowPositions)
+        else:
+            (midPoints, halfLengths) = (None, None)
+
+        # Calculate the distances between the links
+        (distances, narrowPhase) = Bench._calculateLinkDistances(
+            fiberPositions, elbowPositions, cobraAssociations,
+            minimumSeparations, midPoints, halfLengths)
+
+        return distances, minimumSeparations, narrowPhase
+
+    def calculateAssociationCollisionSummary(
+            self, fiberPositions, elbowPositions, associationIndices=None,
+            useBroadPhase=False, chunkAssociations=False, chunkSize=None,
+            memoryBudget=COLLISION_DETECTION_MEMORY, returnDistances=False):
+        """Calculates the collisions between the cobra links in each cobra
+        association along a set of trajectories, processing the trajectories
+        in chunks.
+
+        The trajectories are split in chunks of trajectory steps or cobra
+        associations, and the link distances in each chunk are reduced to the
+        association collision flags, the first collision steps and the minimum
+        link distances before the next chunk is processed. This limits the
+        memory used by the calculation, which is otherwise proportional to
+        the number of associations times the number of trajectory steps.
+
+        The fraction of (association, step) pairs that were discarded by the
+        broad phase is saved in the cullingRatio attribute.
+
+        Parameters
+        ----------
+        fiberPositions: object
+            A complex numpy array with the cobras fiber positions along the
+            trajectories. The trajectory steps should be in the last axis. It
+            can have extra dimensions between the cobras and the steps axes,
+            for example with different trajectory realizations.
+        elbowPositions: object
+            A complex numpy array with the cobras elbow positions. It should
+            have the same shape as the fiber positions array.
+        associationIndices: object, optional
+            A numpy array with the cobra association indices to use. If it is
+            set to None, all the cobra associations will be used. Default is
+            None.
+        useBroadPhase: bool, optional
+            If True, the broad phase will be used to skip the exact distance
+            calculation for associations that cannot collide. In that case,
+            the minimum distances and the link distances of associations that
+            cannot collide are only lower bounds, so it should only be used
+            when the collision flags are needed. Default is False.
+        chunkAssociations: bool, optional
+            If True, the trajectories will be split in chunks of cobra
+            associations, and only the trajectories of the cobras in each
+            chunk will be used. If False, they will be split in chunks of
+            trajectory steps. Default is False.
+        chunkSize: int, optional
+            The number of trajectory steps or cobra associations in each
+            chunk. If it is set to None, it will be calculated from the memory
+            budget. Default is None.
+        memoryBudget: int, optional
+            The approximate memory in bytes that can be used to process each
+            chunk. It is only used if chunkSize is None. Default is
+            COLLISION_DETECTION_MEMORY.
+        returnDistances: bool, optional
+            If True, the full link distances array will also be returned. Note
+            that this array is not included in the memory budget. Default is
+            False.
+
+        Returns
+        -------
+        tuple
+            A python tuple with a boolean numpy array indicating which cobra
+            associations are involved in a collision, an integer numpy array
+            with the first trajectory step where each association collides (-1
+            if it doesn't collide), a double numpy array with the minimum link
+            distances along the trajectories, and the full link distances
+            array if requested (None otherwise).
 
         """
         # Extract some useful information
@@ -227,6 +756,235 @@ class Bench:
         if associationIndices is not None:
             cobraAssociations = cobraAssociations[:, associationIndices]
 
+        # Calculate the minimum separation allowed in each association
+        nAssociations = cobraAssociations.shape[1]
+        trajectoriesShape = fiberPositions.shape[1:]
+        nSteps = trajectoriesShape[-1]
+        minimumSeparations = (linkRadius[cobraAssociations[0]] +
+                              linkRadius[cobraAssociations[1]])
+        minimumSeparations = minimumSeparations.reshape(
+            minimumSeparations.shape + (1,) * len(trajectoriesShape))
+
+        # Calculate the chunk size from the memory budget. Each (association,
+        # step) pair uses about 256 bytes in the exact distances calculation
+        if chunkSize is None:
+            elementsPerChunk = memoryBudget // 256
+            chunkLength = (np.prod(trajectoriesShape) if chunkAssociations
+                           else nAssociations * np.prod(trajectoriesShape[:-1]))
+            chunkSize = int(max(elementsPerChunk // max(chunkLength, 1), 1))
+
+        # Define the chunks as (associations, steps) slices
+        if chunkAssociations:
+            chunks = [(slice(start, start + chunkSize), slice(None))
+                      for start in range(0, nAssociations, chunkSize)]
+        else:
+            chunks = [(slice(None), slice(start, start + chunkSize))
+                      for start in range(0, nSteps, chunkSize)]
+
+        # Initialize the arrays with the reduced values
+        collisions = np.full((nAssociations,) + trajectoriesShape[:-1], False)
+        firstCollisionSteps = np.full(collisions.shape, -1)
+        minimumDistances = np.full(collisions.shape, np.inf)
+        distances = (np.empty((nAssociations,) + trajectoriesShape)
+                     if returnDistances else None)
+        nNarrowPhase = 0
+
+        for (associations, steps) in chunks:
+            # Get the trajectories of the cobras in the chunk. Association
+            # chunks only use the cobras involved in the chunk associations
+            if chunkAssociations:
+                (chunkCobras, chunkCobraAssociations) = np.unique(
+                    cobraAssociations[:, associations], return_inverse=True)
+                chunkCobraAssociations = chunkCobraAssociations.reshape(2, -1)
+                chunkFiberPositions = fiberPositions[chunkCobras]
+                chunkElbowPositions = elbowPositions[chunkCobras]
+            else:
+                chunkCobraAssociations = cobraAssociations
+                chunkFiberPositions = fiberPositions[..., steps]
+                chunkElbowPositions = elbowPositions[..., steps]
+
+            # Calculate the link bounding circles for the chunk trajectories
+            if useBroadPhase:
+                (midPoints, halfLengths) = Bench.calculateLinkCircles(
+                    chunkFiberPositions, chunkElbowPositions)
+            else:
+                (midPoints, halfLengths) = (None, None)
+
+            # Calculate the link distances in this chunk
+            (chunkDistances, narrowPhase) = Bench._calculateLinkDistances(
+                chunkFiberPositions, chunkElbowPositions,
+                chunkCobraAssociations, minimumSeparations[associations],
+                midPoints, halfLengths)
+            nNarrowPhase += np.sum(narrowPhase)
+
+            # Update the first collision steps of the associations that
+            # collide for the first time in this chunk
+            chunkCollisions = (chunkDistances <
+                               minimumSeparations[associations])
+            newCollisions = np.logical_and(
+                np.any(chunkCollisions, axis=-1),
+                ~collisions[associations])
+            firstCollisionSteps[associations][newCollisions] = (
+                (steps.start or 0) +
+                np.argmax(chunkCollisions, axis=-1)[newCollisions])
+
+            # Update the collision flags and the minimum distances
+            collisions[associations] |= newCollisions
+            np.minimum(minimumDistances[associations],
+                       np.min(chunkDistances, axis=-1),
+                       out=minimumDistances[associations])
+
+            # Save the link distances if necessary
+            if returnDistances:
+                distances[associations, ..., steps] = chunkDistances
+
+        # Save the fraction of association steps discarded by the broad phase
+        nPairs = nAssociations * np.prod(trajectoriesShape)
+        self.cullingRatio = 1 - nNarrowPhase / nPairs if nPairs > 0 else 0.0
+
+        return collisions, firstCollisionSteps, minimumDistances, distances
+
+    def calculateSampledAssociationCollisions(self, fiberPositions,
+                                              elbowPositions,
+                                              associationIndices=None,
+                                              samplingStep=10):
+        """Calculates which cobra associations are involved in a collision
+        along a set of trajectories, using a coarse-to-fine sampling of the
+        trajectory steps.
+
+        The link distances are first calculated every samplingStep steps and
+        in the last step. Between two consecutive samples, the link end
+        points cannot move more than the maximum displacement of the cobra
+        fiber and elbow positions with respect to the first sample, so the
+        link distances in the intermediate steps are at least the sampled
+        distance minus the maximum displacements of the two links. Only the
+        intermediate steps of the intervals where this lower bound is smaller
+        than the minimum separation allowed between the links are calculated,
+        in order, and the associations stop being evaluated once a collision
+        is found. The results are the same as the ones obtained evaluating all
+        the trajectory steps.
+
+        Parameters
+        ----------
+        fiberPositions: object
+            A complex numpy array with the cobras fiber positions for each
+            step in the trajectories.
+        elbowPositions: object
+            A complex numpy array with the cobras elbow positions. It should
+            have the same shape as the fiber positions array.
+        associationIndices: object, optional
+            A numpy array with the cobra association indices to use. If it is
+            set to None, all the cobra associations will be used. Default is
+            None.
+        samplingStep: int, optional
+            The number of trajectory steps between two consecutive samples.
+            Default is 10.
+
+        Returns
+        -------
+        tuple
+            A python tuple with two boolean numpy arrays indicating which cobra
+            associations are involved in a collision along the trajectories
+            and in the last trajectory step.
+
+        """
+        # Extract some useful information
+        cobraAssociations = self.cobraAssociations
+        nSteps = fiberPositions.shape[1]
+
+        # Select a subset of the cobra associations if necessary
+        if associationIndices is not None:
+            cobraAssociations = cobraAssociations[:, associationIndices]
+
+        # Calculate the link distances in the sampled steps. The broad phase
+        # lower bounds can be used, because the intermediate steps bounds are
+        # also lower bounds
+        samples = np.unique(np.append(
+            np.arange(0, nSteps, samplingStep), nSteps - 1))
+        (distances, minimumSeparations, _) = \
+            self.calculateAssociationDistances(
+                fiberPositions[:, samples], elbowPositions[:, samples],
+                associationIndices, useBroadPhase=True)
+        sampleCollisions = distances < minimumSeparations
+        collisions = np.any(sampleCollisions, axis=1)
+        endPointCollisions = sampleCollisions[:, -1]
+
+        # Calculate the maximum displacement of the link end points in each
+        # interval between samples
+        references = samples[np.searchsorted(
+            samples, np.arange(nSteps), side="right") - 1]
+        displacements = np.maximum(
+            np.abs(fiberPositions - fiberPositions[:, references]),
+            np.abs(elbowPositions - elbowPositions[:, references]))
+        maxDisplacements = np.maximum.reduceat(
+            displacements, samples[:-1], axis=1)
+
+        # Find the intervals where the links could collide in the
+        # intermediate steps. Use a small margin to account for rounding
+        # errors
+        lowerBounds = (distances[:, :-1] -
+                       maxDisplacements[cobraAssociations[0]] -
+                       maxDisplacements[cobraAssociations[1]])
+        ambiguous = lowerBounds < minimumSeparations + 1e-6
+        ambiguous[collisions] = False
+        (associations, intervals) = np.nonzero(ambiguous)
+
+        # Refine the ambiguous intervals, one intermediate step at a time
+        intervalStarts = samples[intervals]
+        intervalEnds = samples[intervals + 1]
+        minimumSeparations = minimumSeparations[associations, 0]
+
+        for offset in range(1, samplingStep):
+            # Remove the intervals without more intermediate steps and the
+            # associations where a collision was already found
+            active = np.logical_and(intervalStarts + offset < intervalEnds,
+                                    ~collisions[associations])
+            associations = associations[active]
+            intervalStarts = intervalStarts[active]
+            intervalEnds = intervalEnds[active]
+            minimumSeparations = minimumSeparations[active]
+
+            if len(associations) == 0:
+                break
+
+            # Calculate the link distances in the intermediate steps
+            steps = intervalStarts + offset
+            (cobras1, cobras2) = cobraAssociations[:, associations]
+            stepDistances = Bench.distancesBetweenLineSegments(
+                fiberPositions[cobras1, steps], elbowPositions[cobras1, steps],
+                fiberPositions[cobras2, steps], elbowPositions[cobras2, steps])
+            collisions[associations[stepDistances < minimumSeparations]] = True
+
+        return collisions, endPointCollisions
+
+    def calculateCobraAssociationCollisions(self, fiberPositions,
+                                            associationIndices=None,
+                                            useBroadPhase=True):
+        """Calculates which cobra associations are involved in a collision.
+
+        The fraction of associations that were discarded by the broad phase
+        is saved in the cullingRatio attribute.
+
+        Parameters
+        ----------
+        fiberPositions: object
+            A complex numpy array with the cobras fiber positions.
+        associationIndices: object, optional
+            A numpy array with the cobra association indices to use. If it is
+            set to None, all the cobra associations will be used. Default is
+            None.
+        useBroadPhase: bool, optional
+            If True, a broad phase based on the links bounding circles will be
+            used to skip the exact distance calculation for associations that
+            cannot collide. Default is True.
+
+        Returns
+        -------
+        object
+            A boolean numpy array indicating which cobra associations are
+            involved in a collision at the given fiber positions.
+
+        """
         # Set the fiber positions to the home position for cobras with problems
         fiberPositions = fiberPositions.copy()
         fiberPositions[self.cobras.hasProblem] = self.cobras.home0[
@@ -236,16 +994,14 @@ class Bench:
         elbowPositions = self.cobras.calculateElbowPositions(fiberPositions)
 
         # Calculate the distances between the cobras links
-        startPoints1 = fiberPositions[cobraAssociations[0]]
-        endPoints1 = elbowPositions[cobraAssociations[0]]
-        startPoints2 = fiberPositions[cobraAssociations[1]]
-        endPoints2 = elbowPositions[cobraAssociations[1]]
-        distances = Bench.distancesBetweenLineSegments(
-            startPoints1, endPoints1, startPoints2, endPoints2)
+        (distances, minimumSeparations, narrowPhase) = \
+            self.calculateAssociationDistances(
+                fiberPositions, elbowPositions, associationIndices,
+                useBroadPhase)
+        self.cullingRatio = 1 - np.mean(narrowPhase) if narrowPhase.size > 0 else 0.0
 
         # Return the cobra associations collisions
-        return distances < (
-            linkRadius[cobraAssociations[0]] + linkRadius[cobraAssociations[1]])
+        return distances < minimumSeparations
 
     def getProblematicCobraAssociations(self, fiberPositions):
         """Returns the indices of the cobra associations involved in a
@@ -270,6 +1026,103 @@ class Bench:
         # Return the indices of the cobras involved in the collisions
         return self.cobraAssociations[:, collisions]
 
+    def calculateCandidatePositionsCollisions(self, cobraIndices,
+                                              candidatePositions,
+                                              fiberPositions,
+                                              elbowPositions=None):
+        """Calculates the collisions of a set of cobras with their neighbors
+        for several candidate fiber positions.
+
+        The neighbor cobras stay fixed at the given fiber positions, also if
+        they are part of the evaluated cobras. All the candidate positions are
+        evaluated in a single vectorized calculation.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            The cobra index or a numpy array with the cobra indices.
+        candidatePositions: object
+            A complex numpy array with the candidate fiber positions. It should
+            have as many rows as cobras and one column for each candidate
+            position.
+        fiberPositions: object
+            A complex numpy array with the cobras fiber positions.
+        elbowPositions: object, optional
+            A complex numpy array with the cobras elbow positions at the given
+            fiber positions. If it is set to None, they will be calculated.
+            Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with two numpy arrays with the same shape as the
+            candidate positions array. The first one contains the number of
+            collisions with the neighbor cobras, and the second one the
+            minimum clearance between the cobra links and the neighbor links,
+            that is, the minimum link distance minus the minimum separation
+            allowed between the links. The minimum clearance is infinite for
+            cobras without neighbors.
+
+        """
+        # Make sure that we are working with two dimensional arrays
+        cobraIndices = np.atleast_1d(cobraIndices)
+        candidatePositions = np.array(
+            candidatePositions, dtype="complex", ndmin=2).reshape(
+                len(cobraIndices), -1)
+        (nCobras, nCandidates) = candidatePositions.shape
+
+        # Calculate the elbow positions for all the candidate positions
+        candidateElbows = self.cobras.calculateInverseKinematics(
+            candidatePositions, cobraIndices)[2]
+
+        # The candidate positions of cobras with problems are their home
+        # positions
+        hasProblem = self.cobras.hasProblem[cobraIndices]
+        candidatePositions[hasProblem] = self.cobras.home0[
+            cobraIndices[hasProblem], np.newaxis]
+
+        # Get the neighbors of each cobra from the neighbors index
+        entries = self._getIndexEntries(cobraIndices)
+        neighborIndices = self.neighborIndices[entries]
+        rows = np.repeat(np.arange(nCobras), self.neighborIndptr[
+            cobraIndices + 1] - self.neighborIndptr[cobraIndices])
+
+        # Get the neighbors fiber and elbow positions. Cobras with problems
+        # are at their home positions
+        neighborFibers = fiberPositions[neighborIndices]
+        neighborHasProblem = self.cobras.hasProblem[neighborIndices]
+        neighborFibers[neighborHasProblem] = self.cobras.home0[
+            neighborIndices[neighborHasProblem]]
+
+        if elbowPositions is None:
+            neighborElbows = self.cobras.calculateInverseKinematics(
+                neighborFibers, neighborIndices)[2]
+        else:
+            neighborElbows = elbowPositions[neighborIndices]
+
+        # Calculate the distances between the candidate links and the
+        # neighbor links
+        (startPoints1, endPoints1, startPoints2, endPoints2) = \
+            np.broadcast_arrays(
+                candidatePositions[rows], candidateElbows[rows],
+                neighborFibers[:, np.newaxis], neighborElbows[:, np.newaxis])
+        distances = Bench.distancesBetweenLineSegments(
+            startPoints1, endPoints1, startPoints2, endPoints2)
+
+        # Calculate the clearances between the links
+        linkRadius = self.cobras.linkRadius
+        clearances = distances - (
+            linkRadius[cobraIndices[rows]] + linkRadius[neighborIndices])[
+                :, np.newaxis]
+
+        # Accumulate the collisions and the minimum clearances for each cobra
+        nCollisions = np.zeros((nCobras, nCandidates), dtype="int")
+        np.add.at(nCollisions, rows, clearances < 0)
+        minClearances = np.full((nCobras, nCandidates), np.Inf)
+        np.minimum.at(minClearances, rows, clearances)
+
+        return nCollisions, minClearances
+
     @staticmethod
     def calculateCobraCenters(layout):
         """Calculates the cobras central positions for a given bench layout.
@@ -374,11 +1227,100 @@ class Bench:
 
         return cobraCenters
 
+    @staticmethod
+    def calculateLinkCircles(fiberPositions, elbowPositions):
+        """Calculates the circles that enclose the cobra links.
+
+        Parameters
+        ----------
+        fiberPositions: object
+            A complex numpy array with the cobras fiber positions.
+        elbowPositions: object
+            A complex numpy array with the cobras elbow positions.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the link midpoints, which are the centers of
+            the circles, and the link half lengths, which are their radii.
+
+        """
+        midPoints = 0.5 * (fiberPositions + elbowPositions)
+        halfLengths = 0.5 * np.abs(fiberPositions - elbowPositions)
+
+        return midPoints, halfLengths
+
+    @staticmethod
+    def _calculateLinkDistances(fiberPositions, elbowPositions,
+                                cobraAssociations, minimumSeparations,
+                                midPoints=None, halfLengths=None):
+        """Calculates the distances between the cobra links in the given
+        cobra associations.
+
+        Parameters
+        ----------
+        fiberPositions: object
+            A complex numpy array with the cobras fiber positions.
+        elbowPositions: object
+            A complex numpy array with the cobras elbow positions.
+        cobraAssociations: object
+            An integer numpy array with the cobra associations.
+        minimumSeparations: object
+            A numpy array with the minimum separation allowed between the
+            links in each association.
+        midPoints: object, optional
+            A complex numpy array with the links midpoints. If it is set to
+            None, the broad phase will not be used. Default is None.
+        halfLengths: object, optional
+            A numpy array with the links half lengths. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the link distances for each association and a
+            boolean numpy array indicating which distances were calculated
+            exactly.
+
+        """
+        # Get the links positions in each association
+        startPoints1 = fiberPositions[cobraAssociations[0]]
+        endPoints1 = elbowPositions[cobraAssociations[0]]
+        startPoints2 = fiberPositions[cobraAssociations[1]]
+        endPoints2 = elbowPositions[cobraAssociations[1]]
+
+        # Calculate all the distances exactly if the broad phase is not used
+        if midPoints is None:
+            distances = Bench.distancesBetweenLineSegments(
+                startPoints1, endPoints1, startPoints2, endPoints2)
+            return distances, np.full(distances.shape, True)
+
+        # Calculate the lower bound of the link distances using the link
+        # bounding circles
+        distances = np.abs(
+            midPoints[cobraAssociations[0]] - midPoints[cobraAssociations[1]])
+        distances -= halfLengths[cobraAssociations[0]]
+        distances -= halfLengths[cobraAssociations[1]]
+
+        # Calculate the exact distances only where the links could collide.
+        # Use a small margin to account for rounding errors
+        narrowPhase = distances < minimumSeparations + 1e-6
+        distances[narrowPhase] = Bench.distancesBetweenLineSegments(
+            startPoints1[narrowPhase], endPoints1[narrowPhase],
+            startPoints2[narrowPhase], endPoints2[narrowPhase])
+
+        return distances, narrowPhase
+
     @staticmethod
     def distancesBetweenLineSegments(startPoints1, endPoints1, startPoints2,
-                                     endPoints2):
+                                     endPoints2, squared=False, out=None):
         """Calculates the minimum distances between line segments.
 
+        The distance is the minimum of the four point to segment distances
+        between the segment end points and the other segment. Each point to
+        segment distance is calculated projecting the point on the segment and
+        clamping the projection parameter to the segment limits, which avoids
+        any trigonometric function evaluation.
+
         Parameters
         ----------
         startPoints1: object
@@ -392,6 +1334,13 @@ class Bench:
         endPoints2: object
             A complex numpy array with the second line segments end
             coordinates.
+        squared: bool, optional
+            If True, the squared distances will be returned. This saves the
+            square root calculation when the distances are only going to be
+            compared with a threshold. Default is False.
+        out: object, optional
+            A float numpy array where the results should be saved. It should
+            have the same shape as the input arrays. Default is None.
 
         Returns
         -------
@@ -399,18 +1348,124 @@ class Bench:
             A numpy array with the minimum distance between the line segments.
 
         """
-        # Calculate the minimum distances for each point to segment combination
-        distances1 = Bench.distancesToLineSegments(
-            startPoints1, startPoints2, endPoints2)
-        distances2 = Bench.distancesToLineSegments(
-            endPoints1, startPoints2, endPoints2)
-        distances3 = Bench.distancesToLineSegments(
-            startPoints2, startPoints1, endPoints1)
-        distances4 = Bench.distancesToLineSegments(
-            endPoints2, startPoints1, endPoints1)
+        # Extract the segments coordinates
+        (x1, y1) = (np.real(startPoints1), np.imag(startPoints1))
+        (x2, y2) = (np.real(endPoints1), np.imag(endPoints1))
+        (x3, y3) = (np.real(startPoints2), np.imag(startPoints2))
+        (x4, y4) = (np.real(endPoints2), np.imag(endPoints2))
+
+        # Calculate the segments direction vectors and their squared lengths
+        (dx1, dy1) = (x2 - x1, y2 - y1)
+        (dx2, dy2) = (x4 - x3, y4 - y3)
+        lengthsSq1 = dx1 * dx1 + dy1 * dy1
+        lengthsSq2 = dx2 * dx2 + dy2 * dy2
+
+        # Calculate the minimum squared distances for each point to segment
+        # combination
+        if out is None:
+            out = np.empty(np.shape(lengthsSq1))
+
+        np.minimum(
+            Bench._squaredDistancesToLineSegments(
+                x1, y1, x3, y3, dx2, dy2, lengthsSq2),
+            Bench._squaredDistancesToLineSegments(
+                x2, y2, x3, y3, dx2, dy2, lengthsSq2), out=out)
+        np.minimum(out, Bench._squaredDistancesToLineSegments(
+            x3, y3, x1, y1, dx1, dy1, lengthsSq1), out=out)
+        np.minimum(out, Bench._squaredDistancesToLineSegments(
+            x4, y4, x1, y1, dx1, dy1, lengthsSq1), out=out)
 
         # Return the minimum distances
-        return np.min((distances1, distances2, distances3, distances4), axis=0)
+        return out if squared else np.sqrt(out, out=out)
+
+    @staticmethod
+    def _squaredDistancesToLineSegments(x, y, startX, startY, directionX,
+                                        directionY, lengthsSq):
+        """Calculates the squared minimum distances between points and line
+        segments.
+
+        Parameters
+        ----------
+        x: object
+            A numpy array with the points x coordinates.
+        y: object
+            A numpy array with the points y coordinates.
+        startX: object
+            A numpy array with the line segments start x coordinates.
+        startY: object
+            A numpy array with the line segments start y coordinates.
+        directionX: object
+            A numpy array with the line segments direction x coordinates.
+        directionY: object
+            A numpy array with the line segments direction y coordinates.
+        lengthsSq: object
+            A numpy array with the line segments squared lengths.
+
+        Returns
+        -------
+        object
+            A numpy array with the squared minimum distances between the points
+            and the line segments.
+
+        """
+        # Translate the points to the line segment starting points
+        translatedX = x - startX
+        translatedY = y - startY
+
+        # Calculate the projection parameter of the points on the segments
+        # and clamp it to the segments limits. Zero length segments are
+        # treated as single points
+        projections = translatedX * directionX + translatedY * directionY
+        np.divide(projections, lengthsSq, out=projections,
+                  where=lengthsSq > 0)
+        projections[lengthsSq == 0] = 0
+        np.clip(projections, 0, 1, out=projections)
+
+        # Calculate the vectors from the closest segment points to the points
+        translatedX -= projections * directionX
+        translatedY -= projections * directionY
+
+        return translatedX * translatedX + translatedY * translatedY
+
+    @staticmethod
+    def collisionsBetweenLineSegments(startPoints1, endPoints1, startPoints2,
+                                      endPoints2, minimumDistances, out=None):
+        """Checks which line segments are closer than a given minimum
+        distance.
+
+        Parameters
+        ----------
+        startPoints1: object
+            A complex numpy array with the first line segments start
+            coordinates.
+        endPoints1: object
+            A complex numpy array with the first line segments end coordinates.
+        startPoints2: object
+            A complex numpy array with the second line segments start
+            coordinates.
+        endPoints2: object
+            A complex numpy array with the second line segments end
+            coordinates.
+        minimumDistances: object
+            A numpy array with the minimum distances allowed between the line
+            segments. It should be broadcastable to the input arrays shape.
+        out: object, optional
+            A boolean numpy array where the results should be saved. It should
+            have the same shape as the input arrays. Default is None.
+
+        Returns
+        -------
+        object
+            A boolean numpy array indicating which line segments are closer
+            than the minimum distance.
+
+        """
+        # Calculate the squared distances between the line segments
+        distancesSq = Bench.distancesBetweenLineSegments(
+            startPoints1, endPoints1, startPoints2, endPoints2, squared=True)
+
+        # Compare them with the squared minimum distances
+        return np.less(distancesSq, np.square(minimumDistances), out=out)
 
     @staticmethod
     def distancesToLineSegments(points, startPoints, endPoints):
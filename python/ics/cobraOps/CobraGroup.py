@@ -13,6 +13,8 @@ Consult the following papers for more detailed information:
 """
 
 import numpy as np
+from copy import copy
+from scipy.spatial import KDTree
 
 from ics.cobraCharmer.pfiDesign import PFIDesign
 
@@ -54,15 +56,8 @@ class CobraGroup(AttributePrinter):
         self.status = np.full(self.nCobras, PFIDesign.COBRA_OK_MASK, dtype="u2")
         self.hasProblem = np.full(self.nCobras, False)
 
-        # Set the theta home angles randomly
-        self.tht0 = 2 * np.pi * np.random.random(self.nCobras)
-        self.tht1 = (self.tht0 + HOMES_THETA_DISTANCE) % (2 * np.pi)
-
-        # Set the phi home angles randomly
-        self.phiIn = -np.pi + PHI_SAFETY_ANGLE * (
-            1.0 + 0.2 * np.random.random(self.nCobras))
-        self.phiOut = -PHI_SAFETY_ANGLE * (
-            1.0 + 0.2 * np.random.random(self.nCobras))
+        # Set the theta and phi home angles randomly
+        self.randomizeHomeAngles()
 
         # Set the default link lengths and radius
         self.L1 = np.full(self.nCobras, COBRA_LINK_LENGTH)
@@ -83,10 +78,44 @@ class CobraGroup(AttributePrinter):
         # Calculate the home positions
         self.calculateHomePositions()
 
+    def randomizeHomeAngles(self, rng=None):
+        """Sets the cobras theta and phi home angles to random values.
+
+        Parameters
+        ----------
+        rng: object, optional
+            The numpy random generator to use. If it is set to None, the numpy
+            global random generator will be used. Default is None.
+
+        """
+        # Select the random number generator
+        random = np.random.random if rng is None else rng.random
+
+        # Set the theta home angles randomly
+        self.tht0 = 2 * np.pi * random(self.nCobras)
+        self.tht1 = (self.tht0 + HOMES_THETA_DISTANCE) % (2 * np.pi)
+
+        # Set the phi home angles randomly
+        self.phiIn = -np.pi + PHI_SAFETY_ANGLE * (
+            1.0 + 0.2 * random(self.nCobras))
+        self.phiOut = -PHI_SAFETY_ANGLE * (
+            1.0 + 0.2 * random(self.nCobras))
+
     def calculatePatrolAreaRadii(self):
         """Calculates the minimum and maximum radius that the cobras can reach.
 
+        It also updates the link constants used in the inverse kinematics
+        calculations, so it should be called every time the cobra link lengths
+        change.
+
         """
+        # Calculate the link constants
+        self.L1Sq = self.L1 ** 2
+        self.L2Sq = self.L2 ** 2
+        self.twoL1 = 2 * self.L1
+        self.twoL1L2 = 2 * self.L1 * self.L2
+
+        # Calculate the patrol areas radii
         self.rMin = np.abs(
             self.L1 + self.L2 * np.exp(1j * np.maximum(-np.pi, self.phiIn)))
         self.rMax = np.abs(
@@ -150,6 +179,107 @@ class CobraGroup(AttributePrinter):
         # Return the fiber positions
         return centers + L1 * np.exp(1j * tht) + L2 * np.exp(1j * (tht + phi))
 
+    def calculateInverseKinematics(self, fiberPositions, indices=None,
+                                   useNegativePhi=True, out=None):
+        """Calculates the cobra rotation angles and elbow positions for the
+        given fiber positions.
+
+        The cobra properties are selected before any calculation is done, so
+        only the requested cobras are processed. The fiber positions of cobras
+        with problems are replaced by their home positions.
+
+        The code assumes that the cobras can reach the given positions.
+
+        Parameters
+        ----------
+        fiberPositions: object
+            A complex numpy array with the cobra fiber positions. Its first
+            dimensions should match the shape of the cobra indices array, and
+            it can have additional dimensions, for example with several fiber
+            positions for each cobra.
+        indices: object, optional
+            A numpy array or an integer with the indices of the cobras
+            associated to the fiber positions. If it is set to None, the first
+            dimension of the fiber positions array should contain all the
+            cobras. Default is None.
+        useNegativePhi: bool, optional
+            If True the phi angle values will be negative. If False, the phi
+            angles will be positive. Default is True.
+        out: object, optional
+            A python tuple with the theta angles, phi angles and elbow
+            positions arrays where the results will be saved. They should have
+            the same shape as the fiber positions array. If it is set to None,
+            new arrays will be created. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the cobra theta angles (from -pi to pi), the
+            cobra phi angles and the cobra elbow positions.
+
+        """
+        # Make sure that we are working with numpy arrays
+        fiberPositions = np.asarray(fiberPositions)
+
+        # Select the cobra properties if necessary
+        properties = (self.centers, self.L1, self.L1Sq, self.L2Sq,
+                      self.twoL1, self.twoL1L2)
+
+        if indices is not None:
+            properties = tuple(
+                np.asarray(property[indices]) for property in properties)
+
+        # Add extra dimensions to the cobra properties to match the fiber
+        # positions array
+        extraDimensions = (1,) * (fiberPositions.ndim - properties[0].ndim)
+        (centers, L1, L1Sq, L2Sq, twoL1, twoL1L2) = (
+            property.reshape(property.shape + extraDimensions)
+            for property in properties)
+
+        # Set the fiber positions to the home position for cobras with problems
+        hasProblem = self.hasProblem if indices is None else np.asarray(
+            self.hasProblem[indices])
+
+        if np.any(hasProblem):
+            home0 = self.home0 if indices is None else np.asarray(
+                self.home0[indices])
+            fiberPositions = np.where(
+                hasProblem.reshape(hasProblem.shape + extraDimensions),
+                home0.reshape(home0.shape + extraDimensions), fiberPositions)
+
+        # Create the output arrays if necessary
+        if out is None:
+            out = (np.empty(fiberPositions.shape),
+                   np.empty(fiberPositions.shape),
+                   np.empty(fiberPositions.shape, dtype="complex"))
+
+        (tht, phi, elbowPositions) = out
+
+        # Calculate the cobras rotation angles applying the law of cosines
+        relativePositions = fiberPositions - centers
+        distance = np.abs(relativePositions)
+        distanceSq = distance ** 2
+        np.arccos((distanceSq - L1Sq - L2Sq) / twoL1L2, out=phi)
+        np.arccos(-(L2Sq - L1Sq - distanceSq) / (twoL1 * distance), out=tht)
+
+        if useNegativePhi:
+            np.negative(phi, out=phi)
+            np.add(np.angle(relativePositions), tht, out=tht)
+        else:
+            np.subtract(np.angle(relativePositions), tht, out=tht)
+
+        # Calculate the elbow positions. This is equivalent to centers + L1 *
+        # exp(1j * tht), but avoids the slower complex exponential
+        np.add(centers.real, L1 * np.cos(tht), out=elbowPositions.real)
+        np.add(centers.imag, L1 * np.sin(tht), out=elbowPositions.imag)
+
+        # Force tht to go from -pi to pi
+        np.subtract(tht, np.pi, out=tht)
+        np.mod(tht, 2 * np.pi, out=tht)
+        np.subtract(tht, np.pi, out=tht)
+
+        return (tht, phi, elbowPositions)
+
     def calculateElbowPositions(self, fiberPositions, indices=None,
                                 useNegativePhi=True):
         """Calculates the cobra elbow positions for the given fiber positions.
@@ -173,34 +303,12 @@ class CobraGroup(AttributePrinter):
             A complex numpy array with the cobra elbow positions.
 
         """
-        # Set the fiber positions to the home position for cobras with problems
-        fiberPositions = fiberPositions.copy()
-        fiberPositions[self.hasProblem] = self.home0[self.hasProblem]
-
-        # Extract some useful information
-        centers = self.centers
-        L1 = self.L1
-        L2 = self.L2
-
         # Select a subset of the cobras if necessary
         if indices is not None:
-            centers = centers[indices]
-            L1 = L1[indices]
-            L2 = L2[indices]
             fiberPositions = fiberPositions[indices]
 
-        # Calculate the cobras theta angles applying the law of cosines
-        relativePositions = fiberPositions - centers
-        distance = np.abs(relativePositions)
-        distanceSq = distance ** 2
-        L1Sq = L1 ** 2
-        L2Sq = L2 ** 2
-        phiSign = -1 if useNegativePhi else +1
-        tht = np.angle(relativePositions) - phiSign * np.arccos(
-            -(L2Sq - L1Sq - distanceSq) / (2 * L1 * distance))
-
-        # Return the elbow positions
-        return centers + L1 * np.exp(1j * tht)
+        return self.calculateInverseKinematics(
+            fiberPositions, indices, useNegativePhi)[2]
 
     def calculateMultipleElbowPositions(self, finalPositions, cobraIndices,
                                         targetIndices, useNegativePhi=True):
@@ -227,29 +335,8 @@ class CobraGroup(AttributePrinter):
             A complex numpy array with the cobra elbow positions.
 
         """
-        # Extract some useful information
-        centers = self.centers[cobraIndices]
-        hasProblem = self.hasProblem[cobraIndices]
-        L1 = self.L1[cobraIndices]
-        L2 = self.L2[cobraIndices]
-        home0 = self.home0[cobraIndices]
-        finalPositions = finalPositions[targetIndices]
-
-        # Set the target positions to the home position for cobras with problems
-        finalPositions[hasProblem] = home0[hasProblem]
-
-        # Calculate the cobras theta angles applying the law of cosines
-        relativePositions = finalPositions - centers
-        distance = np.abs(relativePositions)
-        distanceSq = distance ** 2
-        L1Sq = L1 ** 2
-        L2Sq = L2 ** 2
-        phiSign = -1 if useNegativePhi else +1
-        tht = np.angle(relativePositions) - phiSign * np.arccos(
-            -(L2Sq - L1Sq - distanceSq) / (2 * L1 * distance))
-
-        # Return the elbow positions
-        return centers + L1 * np.exp(1j * tht)
+        return self.calculateInverseKinematics(
+            finalPositions[targetIndices], cobraIndices, useNegativePhi)[2]
 
     def calculateCobraElbowPositions(self, cobraIndex, fiberPositions,
                                      useNegativePhi=True):
@@ -274,28 +361,8 @@ class CobraGroup(AttributePrinter):
             A complex numpy array with the cobra elbow positions.
 
         """
-        # Set the fiber positions to the home position if the cobra has problems
-        if self.hasProblem[cobraIndex]:
-            fiberPositions = fiberPositions.copy()
-            fiberPositions[:] = self.home0[cobraIndex]
-
-        # Extract the cobra information
-        center = self.centers[cobraIndex]
-        L1 = self.L1[cobraIndex]
-        L2 = self.L2[cobraIndex]
-
-        # Calculate the cobra theta angles applying the law of cosines
-        relativePositions = fiberPositions - center
-        distance = np.abs(relativePositions)
-        distanceSq = distance ** 2
-        L1Sq = L1 ** 2
-        L2Sq = L2 ** 2
-        phiSign = -1 if useNegativePhi else +1
-        tht = np.angle(relativePositions) - phiSign * np.arccos(
-            -(L2Sq - L1Sq - distanceSq) / (2 * L1 * distance))
-
-        # Return the elbow positions
-        return center + L1 * np.exp(1j * tht)
+        return self.calculateInverseKinematics(
+            fiberPositions, cobraIndex, useNegativePhi)[2]
 
     def calculateRotationAngles(self, fiberPositions, indices=None,
                                 useNegativePhi=True):
@@ -320,40 +387,186 @@ class CobraGroup(AttributePrinter):
             A python tuple with the cobra rotation angles (theta, phi).
 
         """
-        # Set the fiber positions to the home position for cobras with problems
-        fiberPositions = fiberPositions.copy()
-        fiberPositions[self.hasProblem] = self.home0[self.hasProblem]
-
-        # Extract some useful information
-        centers = self.centers
-        L1 = self.L1
-        L2 = self.L2
-
         # Select a subset of the cobras if necessary
         if indices is not None:
-            centers = centers[indices]
-            L1 = L1[indices]
-            L2 = L2[indices]
             fiberPositions = fiberPositions[indices]
 
-        # Calculate the cobras rotation angles applying the law of cosines
-        relativePositions = fiberPositions - centers
-        distance = np.abs(relativePositions)
-        distanceSq = distance ** 2
-        L1Sq = L1 ** 2
-        L2Sq = L2 ** 2
-        phiSign = -1 if useNegativePhi else +1
-        phi = phiSign * np.arccos((distanceSq - L1Sq - L2Sq) / (2 * L1 * L2))
-        tht = np.angle(relativePositions) - phiSign * np.arccos(
-            -(L2Sq - L1Sq - distanceSq) / (2 * L1 * distance))
-
-        # Force tht to go from -pi to pi
-        tht = (tht - np.pi) % (2 * np.pi) - np.pi
+        (tht, phi, _) = self.calculateInverseKinematics(
+            fiberPositions, indices, useNegativePhi)
 
         return (tht, phi)
 
+    def calculateReachability(self, positions, indices=None,
+                              maximumDistance=np.Inf, avoidBlackDots=True,
+                              useNegativePhi=True):
+        """Checks which positions can be reached by their associated cobras and
+        calculates the cobra rotation angles and elbow positions for them.
+
+        A position is reachable if its distance to the cobra center is larger
+        than rMin and smaller than rMax (or the maximum distance), which
+        corresponds to the phi hard stop limits, and if it does not fall on
+        the cobra black dot. The theta hard stops do not limit the reachable
+        positions, because the cobras can rotate more than 2 pi in theta.
+
+        Parameters
+        ----------
+        positions: object
+            A complex numpy array with the positions to check. Its first
+            dimensions should match the shape of the cobra indices array, and
+            it can have additional dimensions, for example with several
+            positions for each cobra.
+        indices: object, optional
+            A numpy array or an integer with the indices of the cobras
+            associated to the positions. If it is set to None, the first
+            dimension of the positions array should contain all the cobras.
+            Default is None.
+        maximumDistance: float, optional
+            The maximum radial distance allowed between the positions and the
+            cobra centers. Default is no limit (the maximum radius that the
+            cobra can reach).
+        avoidBlackDots: bool, optional
+            If True, the positions that fall on the cobra black dots will be
+            considered unreachable. Default is True.
+        useNegativePhi: bool, optional
+            If True the phi angle values will be negative. If False, the phi
+            angles will be positive. Default is True.
+
+        Returns
+        -------
+        tuple
+            A python tuple with a boolean numpy array indicating which
+            positions are reachable, and the cobra theta angles, phi angles
+            and elbow positions at those positions. The angles and elbow
+            positions are set to NaN for the unreachable positions.
+
+        """
+        # Make sure that we are working with numpy arrays
+        positions = np.asarray(positions)
+
+        # Get the cobra indices associated to each position
+        if indices is None:
+            indices = np.arange(self.nCobras)
+
+        indices = np.asarray(indices)
+        indices = np.broadcast_to(indices.reshape(
+            indices.shape + (1,) * (positions.ndim - indices.ndim)),
+            positions.shape)
+
+        # Check which positions fall inside the cobra patrol areas
+        centers = self.centers[indices]
+        distances = np.abs(positions - centers)
+        reachable = np.logical_and(
+            distances > self.rMin[indices],
+            distances < np.minimum(self.rMax[indices], maximumDistance))
+
+        # Remove the positions that fall on the cobra black dots
+        if avoidBlackDots:
+            blackDotDistances = np.abs(
+                centers + self.blackDotPosition[indices] - positions)
+            reachable &= blackDotDistances > self.blackDotRadius[indices]
+
+        # Calculate the inverse kinematics for the reachable positions
+        tht = np.full(positions.shape, np.nan)
+        phi = np.full(positions.shape, np.nan)
+        elbowPositions = np.full(positions.shape, np.nan, dtype="complex")
+        (tht[reachable], phi[reachable], elbowPositions[reachable]) = \
+            self.calculateInverseKinematics(
+                positions[reachable], indices[reachable], useNegativePhi)
+
+        return (reachable, tht, phi, elbowPositions)
+
+    def findReachablePositions(self, positions, indices=None,
+                               maximumDistance=np.Inf, avoidBlackDots=True,
+                               useNegativePhi=True, kdTree=None):
+        """Finds all the positions that each cobra can reach.
+
+        A KD tree constructed with the positions is used to find the
+        positions that fall inside each cobra neighborhood, defined by the
+        cobra rMax radius. Only those cobra-position pairs are then checked
+        with the calculateReachability method.
+
+        Parameters
+        ----------
+        positions: object
+            A 1D complex numpy array with the positions to check.
+        indices: object, optional
+            A numpy array with the indices of the cobras to use. If it is set
+            to None, all the cobras will be used. Default is None.
+        maximumDistance: float, optional
+            The maximum radial distance allowed between the positions and the
+            cobra centers. Default is no limit (the maximum radius that the
+            cobra can reach).
+        avoidBlackDots: bool, optional
+            If True, the positions that fall on the cobra black dots will be
+            considered unreachable. Default is True.
+        useNegativePhi: bool, optional
+            If True the phi angle values will be negative. If False, the phi
+            angles will be positive. Default is True.
+        kdTree: object, optional
+            A KD tree already constructed with the positions. If it is set to
+            None, a new KD tree will be constructed. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the cobra indices, the position indices and
+            the distances to the cobra centers for each reachable cobra-position
+            pair, and the cobra theta angles, phi angles and elbow positions at
+            those positions. The pairs are ordered by cobra, following the
+            order in the indices array, and then by their distance to the cobra
+            center (closer positions appear first).
+
+        """
+        # Make sure that we are working with numpy arrays
+        positions = np.asarray(positions)
+        indices = np.arange(self.nCobras) if indices is None else np.array(
+            indices, ndmin=1)
+
+        # Construct the KD tree if necessary. An unbalanced tree is faster to
+        # construct and is good enough for uniformly distributed positions
+        if kdTree is None:
+            kdTree = KDTree(np.column_stack((positions.real, positions.imag)),
+                            balanced_tree=False, compact_nodes=False)
+
+        # Get the positions inside each cobra neighborhood. Use a slightly
+        # larger search radius to make sure that no position is lost because
+        # of the different rounding errors in the KD tree distance calculation
+        centers = self.centers[indices]
+        radii = np.minimum(self.rMax[indices], maximumDistance)
+        neighbors = kdTree.query_ball_point(
+            np.column_stack((centers.real, centers.imag)), radii * (1 + 1e-9))
+        positionIndices = np.concatenate(
+            [np.array(n, dtype=np.intp) for n in neighbors] + [
+                np.empty(0, dtype=np.intp)])
+        order = np.repeat(np.arange(len(indices)),
+                          [len(n) for n in neighbors])
+
+        # Check which of those positions are reachable
+        cobraIndices = indices[order]
+        (reachable, tht, phi, elbowPositions) = self.calculateReachability(
+            positions[positionIndices], cobraIndices, maximumDistance,
+            avoidBlackDots, useNegativePhi)
+        distances = np.abs(
+            positions[positionIndices] - self.centers[cobraIndices])
+
+        # Sort the reachable pairs by distance. The pairs are already grouped
+        # by cobra, so it is faster to sort each cobra group independently
+        sortedIndices = np.flatnonzero(reachable)
+        groupEnds = np.cumsum(np.bincount(
+            order[sortedIndices], minlength=len(indices)))
+
+        for start, end in zip(groupEnds - np.diff(groupEnds, prepend=0),
+                              groupEnds):
+            groupIndices = sortedIndices[start:end]
+            sortedIndices[start:end] = groupIndices[
+                np.argsort(distances[groupIndices], kind="stable")]
+
+        return (cobraIndices[sortedIndices], positionIndices[sortedIndices],
+                distances[sortedIndices], tht[sortedIndices],
+                phi[sortedIndices], elbowPositions[sortedIndices])
+
     def useCalibrationProduct(self, calibrationProduct, useRealLinks=True,
-                              useRealMaps=True):
+                              useRealMaps=True, rng=None):
         """Updates the cobra properties with the calibration product ones.
 
         Parameters
@@ -366,6 +579,11 @@ class CobraGroup(AttributePrinter):
         useRealMaps: bool, optional
             If True, the cobras motor maps will be updated with the calibration
             product values. Default is True.
+        rng: object, optional
+            The numpy random generator to use when the calibration product
+            properties are assigned randomly to the cobras. If it is set to
+            None, the numpy global random generator will be used. Default is
+            None.
 
         """
         # Check if we should use the calibration product link properties
@@ -381,8 +599,12 @@ class CobraGroup(AttributePrinter):
                 self.L2 = calibrationProduct.L2.copy()
             else:
                 # Randomize the calibration cobra indices
-                indices = np.random.randint(
-                    calibrationProduct.nCobras, size=(4, self.nCobras))
+                if rng is None:
+                    indices = np.random.randint(
+                        calibrationProduct.nCobras, size=(4, self.nCobras))
+                else:
+                    indices = rng.integers(
+                        calibrationProduct.nCobras, size=(4, self.nCobras))
 
                 # Assign random link properties to each cobra
                 self.status = calibrationProduct.status[indices[0]]
@@ -404,7 +626,103 @@ class CobraGroup(AttributePrinter):
 
         # Check if we should use the calibration product motor maps
         if useRealMaps:
-            self.motorMaps.useCalibrationProduct(calibrationProduct)
+            self.motorMaps.useCalibrationProduct(calibrationProduct, rng=rng)
+
+    def select(self, indices):
+        """Selects a subset of the cobras.
+
+        Parameters
+        ----------
+        indices: object
+            A numpy array or a slice with the indices of the cobras to select.
+            If it is a slice, the selected arrays will be views of the current
+            arrays.
+
+        Returns
+        -------
+        object
+            A new CobraGroup instance containing only the selected cobras.
+
+        """
+        # Make sure indices is a numpy array or a slice
+        if not isinstance(indices, slice):
+            indices = np.array(indices)
+
+        # Copy the instance and select the cobra property arrays
+        selectedCobras = copy(self)
+        selectedCobras.nCobras = np.arange(self.nCobras)[indices].size
+
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray) and value.shape[:1] == (self.nCobras,):
+                setattr(selectedCobras, name, value[indices])
+
+        # Select the motor maps
+        selectedCobras.motorMaps = self.motorMaps.select(indices)
+
+        return selectedCobras
+
+    def subset(self, indices):
+        """Returns a lightweight subset of the cobras.
+
+        If the indices can be expressed as a slice (a slice object, or a list
+        of equally spaced increasing indices, like the cobras in a module or a
+        sector), the subset arrays will be numpy views of the current arrays
+        and no data will be copied. In that case, any in-place change in the
+        subset arrays will also affect the current cobras. Otherwise, the
+        arrays are gathered only once, as in the select method.
+
+        The subset is a CobraGroup instance, so it can be used anywhere a
+        CobraGroup instance is accepted.
+
+        Parameters
+        ----------
+        indices: object
+            A numpy array, a boolean mask or a slice with the indices of the
+            cobras to select.
+
+        Returns
+        -------
+        object
+            A CobraGroup instance containing only the selected cobras.
+
+        """
+        return self.select(self._getIndicesSlice(indices))
+
+    def _getIndicesSlice(self, indices):
+        """Converts the given cobra indices to a slice if it is possible.
+
+        Parameters
+        ----------
+        indices: object
+            A numpy array, a boolean mask or a slice with the cobra indices.
+
+        Returns
+        -------
+        object
+            A slice with the cobra indices, or an integer numpy array if the
+            indices cannot be expressed as a slice.
+
+        """
+        # Slices don't need to be converted
+        if isinstance(indices, slice):
+            return indices
+
+        # Make sure that we are working with an integer array
+        indices = np.asarray(indices)
+
+        if indices.dtype == bool:
+            (indices,) = np.where(indices)
+
+        if indices.ndim != 1 or len(indices) == 0 or np.any(indices < 0):
+            return indices
+
+        # Check if the indices are equally spaced and increasing
+        step = indices[1] - indices[0] if len(indices) > 1 else 1
+
+        if step <= 0 or np.any(np.diff(indices) != step):
+            return indices
+
+        return slice(indices[0], indices[-1] + 1, step)
 
     def addPatrolAreasToFigure(self, colors=np.array([0.0, 0.0, 1.0, 0.15]),
                                indices=None, paintHardStops=True,
@@ -424,44 +742,35 @@ class CobraGroup(AttributePrinter):
             True if the cobra black dots should be painted. Default is True.
 
         """
-        # Extract some useful information
-        centers = self.centers
-        rMin = self.rMin
-        rMax = self.rMax
-        tht0 = self.tht0
-        tht1 = self.tht1
-        blackDotPosition = self.blackDotPosition
-        blackDotRadius = self.blackDotRadius
-
         # Select a subset of the cobras if necessary
+        cobras = self
+
         if indices is not None:
-            centers = centers[indices]
-            rMin = rMin[indices]
-            rMax = rMax[indices]
-            tht0 = tht0[indices]
-            tht1 = tht1[indices]
-            blackDotPosition = blackDotPosition[indices]
-            blackDotRadius = blackDotRadius[indices]
+            cobras = self.subset(indices)
 
             if colors.ndim == 2:
                 colors = colors[indices]
 
+        # Extract some useful information
+        centers = cobras.centers
+        rMax = cobras.rMax
+
         # Draw the cobra patrol areas using ring shapes
-        plotUtils.addRings(centers, rMin, rMax, facecolors=colors)
+        plotUtils.addRings(centers, cobras.rMin, rMax, facecolors=colors)
 
         # Draw the cobra black dots if necessary
         if paintBlackDots:
             plotUtils.addCircles(
-                centers + blackDotPosition, blackDotRadius,
+                centers + cobras.blackDotPosition, cobras.blackDotRadius,
                 facecolors=np.array([0.0, 0.0, 0.0, 0.15]))
 
         # Add the theta hard stops if necessary
         if paintHardStops:
             plotUtils.addLines(
-                centers, centers + rMax * np.exp(1j * tht0),
+                centers, centers + rMax * np.exp(1j * cobras.tht0),
                 linewidths=1, linestyles="dashed", color="0.3")
             plotUtils.addLines(
-                centers, centers + rMax * np.exp(1j * tht1),
+                centers, centers + rMax * np.exp(1j * cobras.tht1),
                 linewidths=1, linestyles="dashdot", color="0.3")
 
     def addLinksToFigure(self, fiberPositions,
@@ -479,29 +788,25 @@ class CobraGroup(AttributePrinter):
             all the cobras will be used. Default is None.
 
         """
-        # Set the fiber positions to the home position for cobras with problems
-        fiberPositions = fiberPositions.copy()
-        fiberPositions[self.hasProblem] = self.home0[self.hasProblem]
-
-        # Calculate the elbow positions
-        elbowPositions = self.calculateElbowPositions(
-            fiberPositions, indices=indices)
-
-        # Extract some useful information
-        centers = self.centers
-        linkRadius = self.linkRadius
-
         # Select a subset of the cobras if necessary
+        cobras = self
+
         if indices is not None:
-            centers = centers[indices]
-            linkRadius = linkRadius[indices]
+            cobras = self.subset(indices)
             fiberPositions = fiberPositions[indices]
 
             if colors.ndim == 2:
                 colors = colors[indices]
 
+        # Set the fiber positions to the home position for cobras with problems
+        fiberPositions = np.where(
+            cobras.hasProblem, cobras.home0, fiberPositions)
+
+        # Calculate the elbow positions
+        elbowPositions = cobras.calculateElbowPositions(fiberPositions)
+
         # Draw the cobras using a combination of thin and thick lines
         plotUtils.addLines(
-            centers, elbowPositions, edgecolor=colors, linewidths=2)
-        plotUtils.addThickLines(
-            elbowPositions, fiberPositions, linkRadius, facecolors=colors)
+            cobras.centers, elbowPositions, edgecolor=colors, linewidths=2)
+        plotUtils.addThickLines(elbowPositions, fiberPositions,
+                                cobras.linkRadius, facecolors=colors)
@@ -25,7 +25,7 @@ class CollisionSimulator():
 
     """
 
-    def __init__(self, bench, targets, trajectorySteps=200, trajectoryStepWidth=50):
+    def __init__(self, bench, targets, trajectorySteps=200, trajectoryStepWidth=50, keepDistances=False):
         """Constructs a new collision simulator instance.
 
         Parameters
@@ -39,6 +39,13 @@ class CollisionSimulator():
             200.
         trajectoryStepWidth: int, optional
             The trajectory step width in units of motor steps. Default is 50.
+        keepDistances: bool, optional
+            If True, the full cobra association distances array along the
+            trajectories will be calculated in each collision detection pass
+            and saved in the distances attribute. If False, only the
+            collision flags and the minimum distances of each association will
+            be calculated, without creating the full distances array. Default
+            is False.
 
         Returns
         -------
@@ -53,6 +60,7 @@ class CollisionSimulator():
         # Save the trajectory parameters
         self.trajectorySteps = trajectorySteps
         self.trajectoryStepWidth = trajectoryStepWidth
+        self.keepDistances = keepDistances
 
         # Check which cobras are assigned to a target
         self.assignedCobras = self.targets.notNull.copy()
@@ -66,8 +74,12 @@ class CollisionSimulator():
         self.trajectories = None
         self.associationCollisions = None
         self.associationEndPointCollisions = None
+        self.associationMinimumDistances = None
+        self.distances = None
         self.collisions = None
         self.endPointCollisions = None
+        self.collisionCounts = None
+        self.endPointCollisionCounts = None
         self.nCollisions = None
         self.nEndPointCollisions = None
 
@@ -167,10 +179,12 @@ class CollisionSimulator():
 
         """
         # Get the cobra rotation angles for the starting positive and negative
-        # home positions and the final fiber positions
-        (posStartTht, posStartPhi) = self.bench.cobras.calculateRotationAngles(self.bench.cobras.home0)
-        (negStartTht, negStartPhi) = self.bench.cobras.calculateRotationAngles(self.bench.cobras.home1)
-        (finalTht, finalPhi) = self.bench.cobras.calculateRotationAngles(self.finalFiberPositions)
+        # home positions and the final fiber positions in a single call
+        cobras = self.bench.cobras
+        (tht, phi, _) = cobras.calculateInverseKinematics(np.column_stack(
+            (cobras.home0, cobras.home1, self.finalFiberPositions)))
+        (posStartTht, negStartTht, finalTht) = tht.T
+        (posStartPhi, negStartPhi, finalPhi) = phi.T
 
         # Calculate the required theta and phi delta offsets to move from the
         # positive and negative home positions to the final positions
@@ -264,26 +278,24 @@ class CollisionSimulator():
         """Detects collisions in the cobra trajectories.
 
         """
-        # Detect trajectory collisions between cobra associations
-        trajectoryCollisions, self.distances = self.trajectories.calculateCobraAssociationCollisions()
-
-        # Check which are the cobra associations affected by collisions
-        self.associationCollisions = np.any(trajectoryCollisions, axis=1)
-        self.associationEndPointCollisions = trajectoryCollisions[:, -1]
-
-        # Check which cobras are involved in collisions
-        collidingCobras = np.unique(self.bench.cobraAssociations[:, self.associationCollisions])
-        self.collisions = np.full(self.bench.cobras.nCobras, False)
-        self.collisions[collidingCobras] = True
-        self.nCollisions = np.sum(self.collisions)
-
-        # Check which cobras are involved in end point collisions
-        collidingCobras = np.unique(self.bench.cobraAssociations[:, self.associationEndPointCollisions])
-        self.endPointCollisions = np.full(self.bench.cobras.nCobras, False)
-        self.endPointCollisions[collidingCobras] = True
-        self.nEndPointCollisions = np.sum(self.endPointCollisions)
-
-    def solveTrajectoryCollisions(self, selectLowerIndices):
+        # Reset the collision information
+        nCobras = self.bench.cobras.nCobras
+        nAssociations = self.bench.cobraAssociations.shape[1]
+        self.associationCollisions = np.full(nAssociations, False)
+        self.associationEndPointCollisions = np.full(nAssociations, False)
+        self.associationMinimumDistances = np.full(nAssociations, np.inf)
+        self.collisions = np.full(nCobras, False)
+        self.endPointCollisions = np.full(nCobras, False)
+        self.collisionCounts = np.zeros(nCobras, dtype="int")
+        self.endPointCollisionCounts = np.zeros(nCobras, dtype="int")
+        self.nCollisions = 0
+        self.nEndPointCollisions = 0
+
+        # Detect trajectory collisions between all the cobra associations
+        associationIndices = np.arange(nAssociations)
+        self.updateCollisions(associationIndices, *self.calculateAssociationCollisions(associationIndices))
+
+    def solveTrajectoryCollisions(self, selectLowerIndices, associationIndices=None):
         """Solves trajectory collisions changing the cobras theta movement
         directions.
 
@@ -292,11 +304,20 @@ class CollisionSimulator():
         selectLowerIndices: bool
             If True, the cobras selected to be changed in the association will
             be the ones with the lower indices values.
+        associationIndices: object, optional
+            A numpy array with the indices of the cobra associations whose
+            collisions should be solved. If it is set to None, the collisions
+            of all the cobra associations will be solved. Default is None.
 
         """
         # Get the indices of the cobras involved in a mid point trajectory
         # collision
         associationMidPointCollisions = np.logical_and(self.associationCollisions, self.associationEndPointCollisions == False)
+
+        if associationIndices is not None:
+            selectedAssociations = np.full(len(associationMidPointCollisions), False)
+            selectedAssociations[associationIndices] = True
+            associationMidPointCollisions &= selectedAssociations
         collidingAssociations = self.bench.cobraAssociations[:, associationMidPointCollisions]
 
         # Select the indices of the cobras whose movement should be changed
@@ -304,6 +325,10 @@ class CollisionSimulator():
 
         # Make sure that there is at least one cobra to change
         if len(cobraIndices) > 0:
+            # Save the current movement directions and strategies
+            previousDirections = self.movementDirections.copy()
+            previousStrategies = self.movementStrategies.copy()
+
             # Change the cobras theta movement directions
             self.movementDirections[0, cobraIndices] = np.logical_not(self.movementDirections[0, cobraIndices])
 
@@ -315,8 +340,12 @@ class CollisionSimulator():
             # Define the theta and phi movement strategies
             self.defineMovementStrategies()
 
-            # Calculate the cobra trajectories
-            self.calculateTrajectories()
+            # Update the trajectories of the cobras whose movement has changed
+            changedCobras = np.flatnonzero(np.any(np.logical_or(
+                self.movementDirections != previousDirections, self.movementStrategies != previousStrategies), axis=0))
+
+            if len(changedCobras) > 0:
+                self.trajectories.updateCobraTrajectories(changedCobras, self.movementDirections, self.movementStrategies)
 
             # Recalculate the cobra collisions during the trajectory
             self.recalculateTrajectoryCollisions(cobraIndices)
@@ -333,27 +362,92 @@ class CollisionSimulator():
 
         """
         # Get the cobra associations for the given cobras
-        cobraAssociationIndices = np.in1d(self.bench.cobraAssociations[0], cobraIndices)
-        cobraAssociationIndices = np.logical_or(cobraAssociationIndices, np.in1d(self.bench.cobraAssociations[1], cobraIndices))
-
-        # Detect trajectory collisions between these cobra associations
-        trajectoryCollisions, self.distances = self.trajectories.calculateCobraAssociationCollisions(cobraAssociationIndices)
-
-        # Update the cobra associations affected by collisions
-        self.associationCollisions[cobraAssociationIndices] = np.any(trajectoryCollisions, axis=1)
-        self.associationEndPointCollisions[cobraAssociationIndices] = trajectoryCollisions[:, -1]
-
-        # Check which cobras are involved in collisions
-        collidingCobras = np.unique(self.bench.cobraAssociations[:, self.associationCollisions])
-        self.collisions[:] = False
-        self.collisions[collidingCobras] = True
-        self.nCollisions = np.sum(self.collisions)
-
-        # Check which cobras are involved in end point collisions
-        collidingCobras = np.unique(self.bench.cobraAssociations[:, self.associationEndPointCollisions])
-        self.endPointCollisions[:] = False
-        self.endPointCollisions[collidingCobras] = True
-        self.nEndPointCollisions = np.sum(self.endPointCollisions)
+        cobraAssociationIndices = self.bench.getCobrasAssociations(cobraIndices)
+
+        # Detect trajectory collisions between these cobra associations and
+        # update their collision information
+        self.updateCollisions(cobraAssociationIndices, *self.calculateAssociationCollisions(cobraAssociationIndices))
+
+    def calculateAssociationCollisions(self, associationIndices):
+        """Calculates the trajectory collisions of the given cobra
+        associations.
+
+        If the keepDistances attribute is False, the association distances
+        are reduced in chunks of trajectory steps and the full distances
+        array is never created. Otherwise, the full distances array is saved
+        in the distances attribute.
+
+        Parameters
+        ----------
+        associationIndices: object
+            A numpy array with the cobra association indices.
+
+        Returns
+        -------
+        tuple
+            A python tuple with a boolean numpy array indicating which cobra
+            associations are involved in a collision along the trajectories, a
+            boolean numpy array indicating which cobra associations are
+            involved in an end point collision, and a double numpy array with
+            the minimum association distances along the trajectories.
+
+        """
+        # Use the collision reductions if the distances are not needed
+        if not self.keepDistances:
+            return self.trajectories.calculateCobraAssociationCollisionReductions(associationIndices)
+
+        # Calculate the full distances array and reduce it
+        trajectoryCollisions, self.distances = self.trajectories.calculateCobraAssociationCollisions(associationIndices)
+
+        return np.any(trajectoryCollisions, axis=1), trajectoryCollisions[:, -1], np.min(self.distances, axis=1)
+
+    def updateCollisions(self, associationIndices, associationCollisions, associationEndPointCollisions, associationMinimumDistances):
+        """Updates the collision information of the given cobra associations
+        and the cobras involved in them.
+
+        The number of colliding associations of each cobra is updated
+        incrementally, so only the cobras in the given associations are
+        checked.
+
+        Parameters
+        ----------
+        associationIndices: object
+            A numpy array with the cobra association indices.
+        associationCollisions: object
+            A boolean numpy array indicating which of the cobra associations
+            are involved in a collision along the trajectories.
+        associationEndPointCollisions: object
+            A boolean numpy array indicating which of the cobra associations
+            are involved in a collision at the trajectories end points.
+        associationMinimumDistances: object
+            A double numpy array with the minimum distances of the cobra
+            associations along the trajectories.
+
+        """
+        # Calculate the changes in the association collisions
+        collisionChanges = associationCollisions.astype("int") - self.associationCollisions[associationIndices]
+        endPointCollisionChanges = associationEndPointCollisions.astype("int") - self.associationEndPointCollisions[associationIndices]
+
+        # Update the association collisions
+        self.associationCollisions[associationIndices] = associationCollisions
+        self.associationEndPointCollisions[associationIndices] = associationEndPointCollisions
+        self.associationMinimumDistances[associationIndices] = associationMinimumDistances
+
+        # Update the number of colliding associations of each cobra
+        cobraAssociations = self.bench.cobraAssociations[:, associationIndices]
+
+        for cobraIndices in cobraAssociations:
+            np.add.at(self.collisionCounts, cobraIndices, collisionChanges)
+            np.add.at(self.endPointCollisionCounts, cobraIndices, endPointCollisionChanges)
+
+        # Check which of the affected cobras are involved in collisions
+        affectedCobras = np.unique(cobraAssociations)
+        collisions = self.collisionCounts[affectedCobras] > 0
+        endPointCollisions = self.endPointCollisionCounts[affectedCobras] > 0
+        self.nCollisions += np.sum(collisions) - np.sum(self.collisions[affectedCobras])
+        self.nEndPointCollisions += np.sum(endPointCollisions) - np.sum(self.endPointCollisions[affectedCobras])
+        self.collisions[affectedCobras] = collisions
+        self.endPointCollisions[affectedCobras] = endPointCollisions
 
     def plotResults(self, extraTargets=None, paintFootprints=False):
         """Plots the collision simulator results in a new figure.
@@ -16,6 +16,7 @@ import numpy as np
 
 from procedures.moduleTest import engineer
 from . import plotUtils
+from .cobraConstants import COLLISION_DETECTION_MEMORY
 
 
 class CollisionSimulator2():
@@ -65,12 +66,16 @@ class CollisionSimulator2():
         self.nSteps = None
         self.associationCollisions = None
         self.associationEndPointCollisions = None
+        self.associationFirstCollisionSteps = None
+        self.associationMinimumDistances = None
         self.collisions = None
         self.endPointCollisions = None
         self.nCollisions = None
         self.nEndPointCollisions = None
+        self.cullingRatio = None
 
-    def run(self, timeStep=20, maxSteps=3000):
+    def run(self, timeStep=20, maxSteps=3000, samplingStep=None,
+            useBroadPhase=False):
         """Runs the collisions simulator.
 
         Parameters
@@ -80,6 +85,14 @@ class CollisionSimulator2():
             steps.
         maxSteps: int, optional
             The trajectories maximum number of steps. Default is 3000 steps.
+        samplingStep: int, optional
+            If it is not None, the trajectory collisions will be detected
+            using a coarse-to-fine sampling with this number of trajectory
+            steps between samples. Default is None.
+        useBroadPhase: bool, optional
+            If True, the broad phase will be used to skip the exact distance
+            calculation for trajectory steps where the links cannot collide.
+            Default is False.
 
         """
         # Calculate the final fiber positions
@@ -89,7 +102,8 @@ class CollisionSimulator2():
         self.calculateTrajectories(timeStep, maxSteps)
 
         # Detect cobra collisions during the trajectory
-        self.detectTrajectoryCollisions()
+        self.detectTrajectoryCollisions(samplingStep=samplingStep,
+                                        useBroadPhase=useBroadPhase)
 
     def calculateFinalFiberPositions(self):
         """Calculates the cobras final fiber positions.
@@ -140,34 +154,63 @@ class CollisionSimulator2():
             self.cobraCoach)
         self.nSteps = self.fiberPositions.shape[1]
 
-    def detectTrajectoryCollisions(self):
+    def detectTrajectoryCollisions(self,
+                                   memoryBudget=COLLISION_DETECTION_MEMORY,
+                                   samplingStep=None, useBroadPhase=False):
         """Detects collisions in the cobra trajectories.
 
-        """
-        # Extract some useful information from the bench instance
-        cobraAssociations = self.bench.cobraAssociations
-        linkRadius = self.bench.cobras.linkRadius
+        Parameters
+        ----------
+        memoryBudget: int, optional
+            The approximate memory in bytes that can be used to process each
+            chunk of trajectory steps. Default is COLLISION_DETECTION_MEMORY.
+        samplingStep: int, optional
+            If it is not None, the collisions will be detected using a
+            coarse-to-fine sampling with this number of trajectory steps
+            between samples. In that case, the association first collision
+            steps and minimum distances are not calculated. Default is None.
+        useBroadPhase: bool, optional
+            If True, the broad phase will be used to skip the exact distance
+            calculation for trajectory steps where the links cannot collide.
+            In that case, the association minimum distances are not
+            calculated, because they would only be lower bounds for the
+            skipped steps. Default is False.
 
-        # Calculate the distances between the cobras links for each step in the
-        # trajectory
-        startPoints1 = self.fiberPositions[cobraAssociations[0]].ravel()
-        endPoints1 = self.elbowPositions[cobraAssociations[0]].ravel()
-        startPoints2 = self.fiberPositions[cobraAssociations[1]].ravel()
-        endPoints2 = self.elbowPositions[cobraAssociations[1]].ravel()
-        distances = self.bench.distancesBetweenLineSegments(
-            startPoints1, endPoints1, startPoints2, endPoints2)
-
-        # Reshape the distances array
-        distances = distances.reshape((len(cobraAssociations[0]), self.nSteps))
-
-        # Detect trajectory collisions between cobra associations
-        minimumSeparation = linkRadius[cobraAssociations[0]] + linkRadius[
-            cobraAssociations[1]]
-        trajectoryCollisions = distances < minimumSeparation[:, np.newaxis]
-
-        # Check which cobra associations are affected by collisions
-        self.associationCollisions = np.any(trajectoryCollisions, axis=1)
-        self.associationEndPointCollisions = trajectoryCollisions[:, -1]
+        """
+        # Use the coarse-to-fine sampling if requested
+        if samplingStep is not None:
+            (self.associationCollisions,
+             self.associationEndPointCollisions) = \
+                self.bench.calculateSampledAssociationCollisions(
+                    self.fiberPositions, self.elbowPositions,
+                    samplingStep=samplingStep)
+            self.associationFirstCollisionSteps = None
+            self.associationMinimumDistances = None
+            self.cullingRatio = None
+        else:
+            # Detect trajectory collisions between cobra associations,
+            # processing the trajectory steps in chunks
+            (self.associationCollisions, self.associationFirstCollisionSteps,
+             self.associationMinimumDistances, _) = \
+                self.bench.calculateAssociationCollisionSummary(
+                    self.fiberPositions, self.elbowPositions,
+                    useBroadPhase=useBroadPhase, memoryBudget=memoryBudget)
+            self.cullingRatio = self.bench.cullingRatio
+
+            # The minimum distances are only lower bounds if the broad phase
+            # was used
+            if useBroadPhase:
+                self.associationMinimumDistances = None
+
+            # Check which cobra associations are affected by end point
+            # collisions. The link lengths used in the broad phase are
+            # calculated from the fiber and elbow positions
+            (distances, minimumSeparations, _) = \
+                self.bench.calculateAssociationDistances(
+                    self.fiberPositions[:, -1], self.elbowPositions[:, -1],
+                    useBroadPhase=True)
+            self.associationEndPointCollisions = (distances <
+                                                  minimumSeparations)
 
         # Check which cobras are involved in collisions
         collidingCobras = np.unique(
@@ -0,0 +1,219 @@
+"""
+
+EndPointCollisionState class.
+
+Consult the following papers for more detailed information:
+
+  https://ui.adsabs.harvard.edu/abs/2012SPIE.8450E..17F
+  https://ui.adsabs.harvard.edu/abs/2014SPIE.9151E..1YF
+  https://ui.adsabs.harvard.edu/abs/2016arXiv160801075T
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10707E..28Y
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10702E..1CT
+
+"""
+
+import numpy as np
+
+from .AttributePrinter import AttributePrinter
+
+
+class EndPointCollisionState(AttributePrinter):
+    """Class describing the collision state of a bench for a given set of
+    cobra fiber positions.
+
+    The state keeps the cobras elbow positions and the cobra association
+    distances and collisions in memory, so moving a few cobras only requires
+    the evaluation of the associations where those cobras are involved.
+
+    """
+
+    def __init__(self, bench, fiberPositions):
+        """Constructs a new EndPointCollisionState instance.
+
+        Parameters
+        ----------
+        bench: object
+            The PFI bench instance.
+        fiberPositions: object
+            A complex numpy array with the cobras fiber positions.
+
+        Returns
+        -------
+        object
+            The EndPointCollisionState instance.
+
+        """
+        # Save the bench instance
+        self.bench = bench
+
+        # Set the fiber positions to the home position for cobras with problems
+        cobras = self.bench.cobras
+        self.fiberPositions = fiberPositions.copy()
+        self.fiberPositions[cobras.hasProblem] = cobras.home0[cobras.hasProblem]
+
+        # Calculate the cobras elbow positions
+        self.elbowPositions = cobras.calculateElbowPositions(
+            self.fiberPositions)
+
+        # Calculate the minimum separation allowed in each cobra association
+        cobraAssociations = self.bench.cobraAssociations
+        self.minimumSeparations = (cobras.linkRadius[cobraAssociations[0]] +
+                                   cobras.linkRadius[cobraAssociations[1]])
+
+        # Calculate the distances and collisions for all the associations
+        self.associationDistances = self.calculateAssociationDistances(
+            np.arange(cobraAssociations.shape[1]))
+        self.associationCollisions = (
+            self.associationDistances < self.minimumSeparations)
+
+        # Count the number of collisions for each cobra
+        self.nCollisions = np.zeros(cobras.nCobras, dtype="int")
+        np.add.at(self.nCollisions,
+                  cobraAssociations[:, self.associationCollisions].ravel(), 1)
+
+    def calculateAssociationDistances(self, associationIndices,
+                                      cobraIndices=None, fiberPositions=None,
+                                      elbowPositions=None):
+        """Calculates the link distances for the given cobra associations.
+
+        Parameters
+        ----------
+        associationIndices: object
+            A numpy array with the cobra association indices.
+        cobraIndices: object, optional
+            A numpy array with the indices of the cobras whose positions should
+            be replaced by the given fiber and elbow positions. If it is set to
+            None, the current state positions will be used for all the cobras.
+            Default is None.
+        fiberPositions: object, optional
+            A complex numpy array with the replacement fiber positions. Default
+            is None.
+        elbowPositions: object, optional
+            A complex numpy array with the replacement elbow positions. Default
+            is None.
+
+        Returns
+        -------
+        object
+            A numpy array with the link distances for each association.
+
+        """
+        # Get the positions of the cobras in each association
+        cobraAssociations = self.bench.cobraAssociations[:, associationIndices]
+        startPoints1 = self.fiberPositions[cobraAssociations[0]]
+        endPoints1 = self.elbowPositions[cobraAssociations[0]]
+        startPoints2 = self.fiberPositions[cobraAssociations[1]]
+        endPoints2 = self.elbowPositions[cobraAssociations[1]]
+
+        # Replace the positions of the moved cobras if necessary
+        if cobraIndices is not None:
+            for c, fiber, elbow in zip(
+                    cobraIndices, fiberPositions, elbowPositions):
+                isFirst = cobraAssociations[0] == c
+                isSecond = cobraAssociations[1] == c
+                startPoints1[isFirst] = fiber
+                endPoints1[isFirst] = elbow
+                startPoints2[isSecond] = fiber
+                endPoints2[isSecond] = elbow
+
+        return self.bench.distancesBetweenLineSegments(
+            startPoints1, endPoints1, startPoints2, endPoints2)
+
+    def trialMove(self, cobraIndices, newPositions):
+        """Calculates the number of collisions that the given cobras would
+        have if they were moved to new fiber positions.
+
+        The state is not modified.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            The cobra index or a numpy array with the cobra indices.
+        newPositions: object
+            The new fiber position or a complex numpy array with the new fiber
+            positions for each cobra.
+
+        Returns
+        -------
+        object
+            A numpy array with the number of collisions for each cobra at the
+            new positions.
+
+        """
+        (cobraIndices, newPositions, newElbows, associationIndices,
+         distances) = self._evaluateMove(cobraIndices, newPositions)
+
+        # Count the collisions for each cobra
+        collisions = distances < self.minimumSeparations[associationIndices]
+        cobraAssociations = self.bench.cobraAssociations[:, associationIndices]
+        collidingCobras = cobraAssociations[:, collisions]
+
+        return np.array([np.sum(collidingCobras == c) for c in cobraIndices])
+
+    def move(self, cobraIndices, newPositions):
+        """Moves the given cobras to new fiber positions and updates the
+        collision state.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            The cobra index or a numpy array with the cobra indices.
+        newPositions: object
+            The new fiber position or a complex numpy array with the new fiber
+            positions for each cobra.
+
+        """
+        (cobraIndices, newPositions, newElbows, associationIndices,
+         distances) = self._evaluateMove(cobraIndices, newPositions)
+
+        # Update the cobra collision counts
+        collisions = distances < self.minimumSeparations[associationIndices]
+        cobraAssociations = self.bench.cobraAssociations[:, associationIndices]
+        np.subtract.at(self.nCollisions, cobraAssociations[
+            :, self.associationCollisions[associationIndices]].ravel(), 1)
+        np.add.at(self.nCollisions, cobraAssociations[:, collisions].ravel(), 1)
+
+        # Update the state positions and the association collisions
+        self.fiberPositions[cobraIndices] = newPositions
+        self.elbowPositions[cobraIndices] = newElbows
+        self.associationDistances[associationIndices] = distances
+        self.associationCollisions[associationIndices] = collisions
+
+    def _evaluateMove(self, cobraIndices, newPositions):
+        """Evaluates the associations affected by a cobras movement.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            The cobra index or a numpy array with the cobra indices.
+        newPositions: object
+            The new fiber position or a complex numpy array with the new fiber
+            positions for each cobra.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the cobra indices, the new fiber and elbow
+            positions, the affected association indices and their link
+            distances after the movement.
+
+        """
+        # Make sure that we are working with numpy arrays
+        cobraIndices = np.atleast_1d(cobraIndices)
+        newPositions = np.array(newPositions, dtype="complex", ndmin=1)
+
+        # Calculate the new elbow positions. Cobras with problems will stay at
+        # their home positions
+        cobras = self.bench.cobras
+        hasProblem = cobras.hasProblem[cobraIndices]
+        newPositions[hasProblem] = cobras.home0[cobraIndices[hasProblem]]
+        newElbows = cobras.calculateInverseKinematics(
+            newPositions, cobraIndices)[2]
+
+        # Calculate the new distances for the affected associations
+        associationIndices = self.bench.getCobrasAssociations(cobraIndices)
+        distances = self.calculateAssociationDistances(
+            associationIndices, cobraIndices, newPositions, newElbows)
+
+        return (cobraIndices, newPositions, newElbows, associationIndices,
+                distances)
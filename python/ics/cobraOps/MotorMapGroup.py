@@ -13,12 +13,15 @@ Consult the following papers for more detailed information:
 """
 
 import numpy as np
+from copy import copy
 
 from . import plotUtils
 from .cobraConstants import HOMES_THETA_DISTANCE
 from .cobraConstants import MOTOR_MAP_ANGULAR_STEP
 from .cobraConstants import MOTOR1_STEP_SIZE
 from .cobraConstants import MOTOR2_STEP_SIZE
+from .cobraConstants import STEP_TABLES_MAX_SIZE
+from .cobraConstants import STEP_TABLES_MIN_BIN_WIDTH
 
 
 class MotorMapGroup():
@@ -63,40 +66,117 @@ class MotorMapGroup():
         self.thtOffsets = np.arange(nTht + 1) * self.angularSteps[:, np.newaxis]
         self.phiOffsets = np.arange(nPhi + 1) * self.angularSteps[:, np.newaxis]
 
+        # Initialize the integrated step maps and step tables caches
+        self.stepsDtype = np.dtype("float64")
+        self.integratedStepMaps = {}
+        self.stepTables = {}
+
         # Calculate the integrated step maps
         self.calculateIntegratedStepMaps()
 
-    def calculateIntegratedStepMaps(self, useSlowMaps=True):
+    def calculateIntegratedStepMaps(self, useSlowMaps=True, dtype=None):
         """Calculates the integrated theta and phi step maps.
 
+        The integrated slow and fast step maps are calculated only once and
+        are kept in memory, so changing the motor maps type doesn't require
+        any new calculation.
+
         Parameters
         ----------
-        useSlowMaps: bool, optional
+        useSlowMaps: bool or object, optional
             If True (False), the slow (fast) motor maps will be used in the
-            calculation. Default is True.
+            calculation. It can also be a boolean numpy array indicating the
+            motor maps type to use for each cobra. Default is True.
+        dtype: object, optional
+            The data type of the integrated step maps (e.g. "float32" to
+            reduce the memory use). If it is set to None, the current data
+            type will be used ("float64" by default). Default is None.
 
         """
-        # Calculate the cumulative step sums
-        zeros = np.zeros((self.nMaps, 1))
-
-        if useSlowMaps:
-            self.posThtSteps = np.hstack((zeros, np.cumsum(self.S1Pm, axis=1)))
-            self.negThtSteps = np.hstack((zeros, np.cumsum(self.S1Nm, axis=1)))
-            self.posPhiSteps = np.hstack((zeros, np.cumsum(self.S2Pm, axis=1)))
-            self.negPhiSteps = np.hstack((zeros, np.cumsum(self.S2Nm, axis=1)))
+        # Save the motor maps type
+        self.useSlowMaps = useSlowMaps if np.ndim(useSlowMaps) == 0 else np.asarray(useSlowMaps)
+
+        # Remove the cached integrated step maps if the data type changed
+        if dtype is not None and np.dtype(dtype) != self.stepsDtype:
+            self.stepsDtype = np.dtype(dtype)
+            self.integratedStepMaps = {}
+            self.stepTables = {}
+
+        # Get the slow and fast integrated step maps for each movement
+        # direction
+        thtSteps = self.getIntegratedStepMaps(useThtMaps=True).reshape(2, 2, self.nMaps, -1)
+        phiSteps = self.getIntegratedStepMaps(useThtMaps=False).reshape(2, 2, self.nMaps, -1)
+
+        # Use views of the integrated step maps if all the cobras use the
+        # same motor maps type
+        if np.ndim(self.useSlowMaps) == 0:
+            mapsType = 0 if self.useSlowMaps else 1
+            (self.posThtSteps, self.negThtSteps) = thtSteps[mapsType]
+            (self.posPhiSteps, self.negPhiSteps) = phiSteps[mapsType]
         else:
-            self.posThtSteps = np.hstack((zeros, np.cumsum(self.F1Pm, axis=1)))
-            self.negThtSteps = np.hstack((zeros, np.cumsum(self.F1Nm, axis=1)))
-            self.posPhiSteps = np.hstack((zeros, np.cumsum(self.F2Pm, axis=1)))
-            self.negPhiSteps = np.hstack((zeros, np.cumsum(self.F2Nm, axis=1)))
+            useSlowMaps = self.useSlowMaps[:, np.newaxis]
+            (self.posThtSteps, self.negThtSteps) = np.where(useSlowMaps, thtSteps[0], thtSteps[1])
+            (self.posPhiSteps, self.negPhiSteps) = np.where(useSlowMaps, phiSteps[0], phiSteps[1])
+
+    def updateIntegratedStepMaps(self):
+        """Updates the integrated step maps and the step tables.
+
+        This method should be called after modifying directly the motor maps
+        arrays, because the integrated step maps and the step tables are
+        cached.
+
+        """
+        # Remove the cached integrated step maps and step tables
+        self.integratedStepMaps = {}
+        self.stepTables = {}
+
+        # Calculate again the integrated step maps
+        self.calculateIntegratedStepMaps(self.useSlowMaps)
+
+    def getIntegratedStepMaps(self, useThtMaps=True):
+        """Returns the slow and fast integrated step maps for both movement
+        directions.
 
-    def useCalibrationProduct(self, calibrationProduct):
+        The integrated step maps are calculated only once and are saved in
+        the integrated step maps cache.
+
+        Parameters
+        ----------
+        useThtMaps: bool, optional
+            If True (False), the theta (phi) motor maps will be used. Default
+            is True.
+
+        Returns
+        -------
+        object
+            A 2D numpy array with the stacked slow positive, slow negative,
+            fast positive and fast negative integrated step maps.
+
+        """
+        # Calculate the integrated step maps if they are not in the cache
+        if useThtMaps not in self.integratedStepMaps:
+            if useThtMaps:
+                stepMaps = (self.S1Pm, self.S1Nm, self.F1Pm, self.F1Nm)
+            else:
+                stepMaps = (self.S2Pm, self.S2Nm, self.F2Pm, self.F2Nm)
+
+            zeros = np.zeros((self.nMaps, 1))
+            self.integratedStepMaps[useThtMaps] = np.vstack(
+                [np.hstack((zeros, np.cumsum(m, axis=1))) for m in stepMaps]).astype(self.stepsDtype)
+
+        return self.integratedStepMaps[useThtMaps]
+
+    def useCalibrationProduct(self, calibrationProduct, rng=None):
         """Updates the motor map properties with the calibration product ones.
 
         Parameters
         ----------
         calibrationProduct: object
             The cobras calibration product containing the motor map properties.
+        rng: object, optional
+            The numpy random generator to use when the motor maps are assigned
+            randomly. If it is set to None, the numpy global random generator
+            will be used. Default is None.
 
         """
         if calibrationProduct.nCobras == self.nMaps:
@@ -112,7 +192,10 @@ class MotorMapGroup():
             self.F2Nm = calibrationProduct.F2Nm.copy()
         else:
             # Assign the motor maps properties randomly
-            indices = np.random.randint(calibrationProduct.nCobras, size=self.nMaps)
+            if rng is None:
+                indices = np.random.randint(calibrationProduct.nCobras, size=self.nMaps)
+            else:
+                indices = rng.integers(calibrationProduct.nCobras, size=self.nMaps)
             self.angularSteps = calibrationProduct.angularSteps[indices]
             self.S1Pm = calibrationProduct.S1Pm[indices]
             self.S2Pm = calibrationProduct.S2Pm[indices]
@@ -127,9 +210,252 @@ class MotorMapGroup():
         self.thtOffsets = np.arange(self.S1Pm.shape[1] + 1) * self.angularSteps[:, np.newaxis]
         self.phiOffsets = np.arange(self.S2Pm.shape[1] + 1) * self.angularSteps[:, np.newaxis]
 
+        # Remove the integrated step maps and step tables calculated with the
+        # old motor maps
+        self.integratedStepMaps = {}
+        self.stepTables = {}
+
         # Update the integrated step maps
         self.calculateIntegratedStepMaps()
 
+    def getStepTables(self, useThtMaps=True):
+        """Returns the inverse step tables used to convert motor steps to
+        angle offsets.
+
+        The inverse tables divide the integrated step maps in uniform step
+        bins smaller than the smallest map step increment, and save the map
+        interval at the start of each bin. This way the map interval
+        associated to a number of steps can be obtained with a single look
+        up. There is one table for each row in the integrated step maps
+        returned by the getIntegratedStepMaps method. The tables are
+        calculated only once and are saved in the step tables cache.
+
+        Flat map intervals (zero step increments) are ignored when selecting
+        the bin widths. Maps with flat intervals, maps that would need bins
+        smaller than STEP_TABLES_MIN_BIN_WIDTH, and the largest maps that
+        don't fit in STEP_TABLES_MAX_SIZE bins don't have a table. Their map
+        intervals are searched directly in the integrated step maps.
+
+        Parameters
+        ----------
+        useThtMaps: bool, optional
+            If True (False), the theta (phi) motor maps will be used. Default
+            is True.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the tables bin widths, the tables start
+            indices, the tables sizes, the flattened tables and a boolean
+            numpy array indicating which rows don't have a table and should
+            be searched.
+
+        """
+        # Check if the tables are already in the cache
+        if useThtMaps in self.stepTables:
+            return self.stepTables[useThtMaps]
+
+        # Calculate the tables bin widths from the smallest non-zero step
+        # increments
+        stepMaps = self.getIntegratedStepMaps(useThtMaps)
+        nPoints = stepMaps.shape[1]
+        increments = np.diff(stepMaps, axis=1).astype("float64")
+        binWidths = 0.5 * np.min(np.where(increments > 0, increments, np.inf), axis=1)
+
+        # Search the rows with flat intervals or with too small bins
+        searchRows = np.logical_or(np.any(increments <= 0, axis=1), binWidths < STEP_TABLES_MIN_BIN_WIDTH)
+        tableSizes = np.ones(len(stepMaps), dtype=np.intp)
+        tableSizes[~searchRows] = np.floor(stepMaps[~searchRows, -1] / binWidths[~searchRows]).astype(np.intp) + 1
+
+        # Search also the largest tables if the total size is too large
+        sortedRows = np.argsort(tableSizes, kind="stable")
+        searchRows[sortedRows[np.cumsum(tableSizes[sortedRows]) > STEP_TABLES_MAX_SIZE]] = True
+        binWidths[searchRows] = np.inf
+        tableSizes[searchRows] = 1
+        tableStarts = np.concatenate(([0], np.cumsum(tableSizes)[:-1]))
+
+        # Count the number of map points that fall inside each bin, using the
+        # same bin calculation that will be used in the look ups
+        bins = np.floor(stepMaps[:, 1:] / binWidths[:, np.newaxis]).astype(np.intp)
+        bins = np.minimum(bins, tableSizes[:, np.newaxis] - 1)
+        counts = np.bincount((tableStarts[:, np.newaxis] + bins).ravel(), minlength=np.sum(tableSizes))
+
+        # The map interval at each bin is given by the number of map points
+        # inside the previous bins
+        intervals = np.cumsum(counts)
+        intervals -= np.repeat(intervals[tableStarts] - counts[tableStarts], tableSizes)
+        intervals = np.minimum(intervals, nPoints - 2).astype(np.min_scalar_type(nPoints))
+
+        # Save the tables in the cache
+        self.stepTables[useThtMaps] = (binWidths, tableStarts, tableSizes, intervals, searchRows)
+
+        return self.stepTables[useThtMaps]
+
+    def calculateStepOffsets(self, angleOffsets, positiveMovements, useThtMaps=True, useSlowMaps=None, indices=None):
+        """Calculates the motor steps needed to move the cobras from their
+        home positions to the given angle offsets.
+
+        Parameters
+        ----------
+        angleOffsets: object
+            A numpy array with the angle offsets relative to the home
+            positions. Its first dimensions should match the shape of the map
+            indices array, and it can have additional dimensions, for example
+            with several angle offsets for each cobra.
+        positiveMovements: object
+            A boolean numpy array or a bool indicating if the cobras move in
+            the positive direction. It should be broadcastable to the map
+            indices array.
+        useThtMaps: bool, optional
+            If True (False), the theta (phi) motor maps will be used. Default
+            is True.
+        useSlowMaps: object, optional
+            A boolean numpy array or a bool indicating if the slow (True) or
+            the fast (False) motor maps should be used. It should be
+            broadcastable to the map indices array. If it is set to None, the
+            maps used in the integrated step maps will be used. Default is
+            None.
+        indices: object, optional
+            A numpy array or an integer with the indices of the motor maps to
+            use. If it is set to None, the first dimension of the angle offsets
+            array should contain all the maps. Default is None.
+
+        Returns
+        -------
+        object
+            A numpy array with the motor steps.
+
+        """
+        # Get the angle offsets and the integrated step maps
+        offsets = self.thtOffsets if useThtMaps else self.phiOffsets
+        stepMaps = self.getIntegratedStepMaps(useThtMaps)
+
+        # Get the map and table rows associated to each angle offset
+        angleOffsets = np.asarray(angleOffsets)
+        (mapRows, tableRows) = self.getTableRows(positiveMovements, useSlowMaps, indices, angleOffsets.ndim)
+
+        # Estimate the grid interval of each angle offset from the angular
+        # steps
+        with np.errstate(invalid="ignore"):
+            intervals = np.floor(angleOffsets / self.angularSteps[mapRows])
+
+        intervals = np.clip(np.nan_to_num(intervals), 0, offsets.shape[1] - 2).astype(np.intp)
+
+        return MotorMapGroup.interpolateIntervals(angleOffsets, offsets, stepMaps, mapRows, tableRows, intervals)
+
+    def calculateAngleOffsets(self, steps, positiveMovements, useThtMaps=True, useSlowMaps=None, indices=None):
+        """Calculates the angle offsets relative to the home positions that
+        the cobras reach after moving the given motor steps.
+
+        This is the inverse of the calculateStepOffsets method. The map
+        intervals are obtained from the inverse step tables, so the
+        calculation doesn't require any search in the integrated step maps,
+        except for the maps that don't have a table.
+
+        Parameters
+        ----------
+        steps: object
+            A numpy array with the motor steps relative to the home positions.
+            Its first dimensions should match the shape of the map indices
+            array, and it can have additional dimensions, for example with
+            several motor steps for each cobra.
+        positiveMovements: object
+            A boolean numpy array or a bool indicating if the cobras move in
+            the positive direction. It should be broadcastable to the map
+            indices array.
+        useThtMaps: bool, optional
+            If True (False), the theta (phi) motor maps will be used. Default
+            is True.
+        useSlowMaps: object, optional
+            A boolean numpy array or a bool indicating if the slow (True) or
+            the fast (False) motor maps should be used. It should be
+            broadcastable to the map indices array. If it is set to None, the
+            maps used in the integrated step maps will be used. Default is
+            None.
+        indices: object, optional
+            A numpy array or an integer with the indices of the motor maps to
+            use. If it is set to None, the first dimension of the steps array
+            should contain all the maps. Default is None.
+
+        Returns
+        -------
+        object
+            A numpy array with the angle offsets.
+
+        """
+        # Get the angle offsets, the integrated step maps and the step tables
+        offsets = self.thtOffsets if useThtMaps else self.phiOffsets
+        stepMaps = self.getIntegratedStepMaps(useThtMaps)
+        (binWidths, tableStarts, tableSizes, tables, searchRows) = self.getStepTables(useThtMaps)
+
+        # Get the map and table rows associated to each motor step
+        steps = np.asarray(steps)
+        (mapRows, tableRows) = self.getTableRows(positiveMovements, useSlowMaps, indices, steps.ndim)
+
+        # Look up the map interval at the start of each step bin
+        with np.errstate(invalid="ignore"):
+            bins = np.floor(steps / binWidths[tableRows])
+
+        bins = np.clip(np.nan_to_num(bins), 0, tableSizes[tableRows] - 1).astype(np.intp)
+        intervals = tables[tableStarts[tableRows] + bins].astype(np.intp)
+
+        # Search the map intervals of the rows without a table
+        searchedSteps = searchRows[tableRows]
+
+        if np.any(searchedSteps):
+            searchedSteps = np.broadcast_to(searchedSteps, intervals.shape)
+            intervals[searchedSteps] = MotorMapGroup.searchIntervals(
+                steps[searchedSteps], stepMaps, np.broadcast_to(tableRows, intervals.shape)[searchedSteps])
+
+        return MotorMapGroup.interpolateIntervals(steps, stepMaps, offsets, tableRows, mapRows, intervals)
+
+    def getTableRows(self, positiveMovements, useSlowMaps, indices, ndim):
+        """Returns the motor map rows and the integrated step map rows for
+        the given movement directions, motor map types and map indices.
+
+        Parameters
+        ----------
+        positiveMovements: object
+            A boolean numpy array or a bool indicating if the cobras move in
+            the positive direction.
+        useSlowMaps: object
+            A boolean numpy array or a bool indicating if the slow (True) or
+            the fast (False) motor maps should be used. If it is set to None,
+            the maps used in the integrated step maps will be used.
+        indices: object
+            A numpy array or an integer with the indices of the motor maps. If
+            it is set to None, all the maps will be used.
+        ndim: int
+            The number of dimensions of the array that will be used with the
+            rows.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the motor map rows and the integrated step map
+            rows, with extra dimensions to match the given number of
+            dimensions.
+
+        """
+        # Use the same maps as in the integrated step maps if necessary
+        if useSlowMaps is None:
+            useSlowMaps = self.useSlowMaps
+
+            if np.ndim(useSlowMaps) > 0 and indices is not None:
+                useSlowMaps = useSlowMaps[indices]
+
+        # Use all the maps if the indices parameter was not provided
+        if indices is None:
+            indices = np.arange(self.nMaps)
+
+        # The integrated step maps are ordered by maps type, movement
+        # direction and map index
+        mapRows = np.asarray(indices)
+        tableRows = mapRows + self.nMaps * (2 * np.logical_not(useSlowMaps) + np.logical_not(positiveMovements))
+        mapRows = np.broadcast_to(mapRows, tableRows.shape)
+
+        return tuple(rows.reshape(rows.shape + (1,) * (ndim - rows.ndim)) for rows in (mapRows, tableRows))
+
     def calculateSteps(self, deltaTht, startPhi, deltaPhi):
         """Calculates the total number of motor steps required to move the
         cobra fibers the given theta and phi delta angles.
@@ -152,34 +478,223 @@ class MotorMapGroup():
             and phi angles.
 
         """
-        # Get the integrated step maps for the theta angle
-        thtSteps = self.negThtSteps.copy()
-        thtSteps[deltaTht >= 0] = self.posThtSteps[deltaTht >= 0]
-
-        # Get the integrated step maps for the phi angle
-        phiSteps = self.negPhiSteps.copy()
-        phiSteps[deltaPhi >= 0] = self.posPhiSteps[deltaPhi >= 0]
-
         # Calculate the theta and phi offsets relative to the home positions
         thtOffset = np.zeros(self.nMaps)
         phiOffset = np.abs(startPhi)
         phiOffset[deltaPhi >= 0] = np.pi + startPhi[deltaPhi >= 0]
 
-        # Calculate the total number of motor steps for each angle
-        nThtSteps = np.empty(self.nMaps)
-        nPhiSteps = np.empty(self.nMaps)
+        # Calculate the total number of motor steps for the theta movement
+        stepsRange = self.calculateStepOffsets(
+            np.column_stack((thtOffset, thtOffset + np.abs(deltaTht))),
+            deltaTht >= 0)
+        nThtSteps = stepsRange[:, 1] - stepsRange[:, 0]
 
-        for c in range(self.nMaps):
-            # Calculate the total number of motor steps for the theta movement
-            stepsRange = np.interp([thtOffset[c], thtOffset[c] + np.abs(deltaTht[c])], self.thtOffsets[c], thtSteps[c])
-            nThtSteps[c] = stepsRange[1] - stepsRange[0]
-
-            # Calculate the total number of motor steps for the phi movement
-            stepsRange = np.interp([phiOffset[c], phiOffset[c] + np.abs(deltaPhi[c])], self.phiOffsets[c], phiSteps[c])
-            nPhiSteps[c] = stepsRange[1] - stepsRange[0]
+        # Calculate the total number of motor steps for the phi movement
+        stepsRange = self.calculateStepOffsets(
+            np.column_stack((phiOffset, phiOffset + np.abs(deltaPhi))),
+            deltaPhi >= 0, useThtMaps=False)
+        nPhiSteps = stepsRange[:, 1] - stepsRange[:, 0]
 
         return (nThtSteps, nPhiSteps)
 
+    @staticmethod
+    def interpolateUniformGrids(x, xp, fp, gridSteps):
+        """Interpolates several functions defined on uniform grids at once.
+
+        Each row in the xp and fp arrays defines a different function, and the
+        values in the same row of the x array are interpolated using that
+        function. The grid interval of each value is estimated from the grid
+        step and then corrected using the actual grid values, so the results
+        are exactly the same as calling np.interp for each row.
+
+        Parameters
+        ----------
+        x: object
+            A 2D numpy array with the x coordinates where the functions should
+            be evaluated.
+        xp: object
+            A 2D numpy array with the increasing uniform grids where the
+            functions are defined.
+        fp: object
+            A 2D numpy array with the function values at the grid points.
+        gridSteps: object
+            A numpy array with the grid step of each function.
+
+        Returns
+        -------
+        object
+            A 2D numpy array with the interpolated values.
+
+        """
+        # Estimate the grid interval of each x value from the grid steps
+        with np.errstate(invalid="ignore"):
+            intervals = np.floor(x / gridSteps[:, np.newaxis])
+
+        intervals = np.clip(np.nan_to_num(intervals), 0, xp.shape[1] - 2).astype(np.intp)
+
+        rows = np.arange(len(xp))[:, np.newaxis]
+
+        return MotorMapGroup.interpolateIntervals(x, xp, fp, rows, rows, intervals)
+
+    @staticmethod
+    def searchIntervals(x, xp, xpRows):
+        """Searches the grid intervals of several values at once using a
+        bisection.
+
+        The grids can contain repeated points. As with np.interp, the
+        interval of a value equal to a repeated point is the last one that
+        starts at that point.
+
+        Parameters
+        ----------
+        x: object
+            A numpy array with the x values.
+        xp: object
+            A 2D numpy array with the non-decreasing grids.
+        xpRows: object
+            A numpy array with the xp rows associated to each x value. It
+            should have the same shape as the x array.
+
+        Returns
+        -------
+        object
+            A numpy array with the grid intervals of the x values, between 0
+            and the number of grid points minus 2.
+
+        """
+        # Find the last grid point that is smaller or equal than each value
+        nPoints = xp.shape[1]
+        xp = xp.ravel()
+        xpStarts = xpRows * nPoints
+        lowIndices = np.zeros(x.shape, dtype=np.intp)
+        highIndices = np.full(x.shape, nPoints - 1, dtype=np.intp)
+
+        for i in range(int(np.ceil(np.log2(nPoints)))):
+            midIndices = (lowIndices + highIndices + 1) // 2
+            below = xp[xpStarts + midIndices] <= x
+            lowIndices = np.where(below, midIndices, lowIndices)
+            highIndices = np.where(below, highIndices, midIndices - 1)
+
+        return np.minimum(lowIndices, nPoints - 2)
+
+    @staticmethod
+    def interpolateIntervals(x, xp, fp, xpRows, fpRows, intervals):
+        """Interpolates several functions using estimated grid intervals.
+
+        The estimated grid intervals are corrected using the actual grid
+        values, so they can be off by one interval. The results are exactly
+        the same as calling np.interp for each x value with its function.
+
+        Parameters
+        ----------
+        x: object
+            A numpy array with the x coordinates where the functions should be
+            evaluated.
+        xp: object
+            A 2D numpy array with the increasing grids where the functions are
+            defined.
+        fp: object
+            A 2D numpy array with the function values at the grid points.
+        xpRows: object
+            A numpy array with the xp rows associated to each x value. It
+            should be broadcastable to the x array.
+        fpRows: object
+            A numpy array with the fp rows associated to each x value. It
+            should be broadcastable to the x array.
+        intervals: object
+            A numpy array with the estimated grid intervals of the x values.
+            Their values should be between 0 and the number of grid points
+            minus 2.
+
+        Returns
+        -------
+        object
+            A numpy array with the interpolated values.
+
+        """
+        # Work with the flattened arrays, because indexing them is faster
+        nPoints = xp.shape[1]
+        xp = xp.ravel()
+        fp = fp.ravel()
+        xpStarts = xpRows * nPoints
+        fpStarts = fpRows * nPoints
+
+        # Correct the estimated intervals using the actual grid values, so
+        # that xp[intervals] <= x < xp[intervals + 1]. Values below the grid
+        # get -1 and values above or at the last grid point get nPoints - 1
+        indices = xpStarts + intervals
+        indices -= x < xp[indices]
+        indices += x >= xp[indices + 1]
+        intervals = indices - xpStarts
+
+        # Interpolate the function values following the np.interp recipe,
+        # which works in double precision
+        validIntervals = np.clip(intervals, 0, nPoints - 2)
+        lowIndices = xpStarts + validIntervals
+        xLow = xp[lowIndices].astype("float64", copy=False)
+        xHigh = xp[lowIndices + 1].astype("float64", copy=False)
+        lowIndices = fpStarts + validIntervals
+        fLow = fp[lowIndices].astype("float64", copy=False)
+        fHigh = fp[lowIndices + 1].astype("float64", copy=False)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slopes = (fHigh - fLow) / (xHigh - xLow)
+            values = slopes * (x - xLow) + fLow
+
+        # Try the other direction if we get nan values, which can happen in
+        # flat grid intervals
+        nanValues = np.isnan(values)
+
+        if np.any(nanValues):
+            with np.errstate(invalid="ignore"):
+                values[nanValues] = (slopes * (x - xHigh) + fHigh)[nanValues]
+
+            nanValues = np.logical_and(np.isnan(values), fLow == fHigh)
+            values[nanValues] = fLow[nanValues]
+
+        # Use the function values at the grid points for exact matches and
+        # for values outside the grid
+        values = np.where(x == xLow, fLow, values)
+        values = np.where(intervals < 0, fp[fpStarts], values)
+        values = np.where(intervals == nPoints - 1, fp[fpStarts + nPoints - 1], values)
+
+        # The interpolated values are nan where x is nan
+        values[np.isnan(x)] = np.nan
+
+        return values
+
+    def select(self, indices):
+        """Selects a subset of the motor maps.
+
+        Parameters
+        ----------
+        indices: object
+            A numpy array or a slice with the indices of the motor maps to
+            select. If it is a slice, the selected arrays will be views of the
+            current arrays.
+
+        Returns
+        -------
+        object
+            A new MotorMapGroup instance containing only the selected motor
+            maps.
+
+        """
+        # Copy the instance and select the motor map arrays
+        selectedMaps = copy(self)
+        selectedMaps.nMaps = np.arange(self.nMaps)[indices].size
+
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray) and value.shape[:1] == (self.nMaps,):
+                setattr(selectedMaps, name, value[indices])
+
+        # The integrated step maps and step tables will be calculated again
+        # when they are needed
+        selectedMaps.integratedStepMaps = {}
+        selectedMaps.stepTables = {}
+
+        return selectedMaps
+
     def plot(self, useSlowMaps=True, indices=None):
         """Plots the cobras motor maps on a new figure.
 
@@ -0,0 +1,378 @@
+"""
+
+MotorNoiseSimulator class.
+
+Consult the following papers for more detailed information:
+
+  https://ui.adsabs.harvard.edu/abs/2012SPIE.8450E..17F
+  https://ui.adsabs.harvard.edu/abs/2014SPIE.9151E..1YF
+  https://ui.adsabs.harvard.edu/abs/2016arXiv160801075T
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10707E..28Y
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10702E..1CT
+
+"""
+
+import numpy as np
+
+from .MotorMapGroup import MotorMapGroup
+from .cobraConstants import MOTOR_NOISE_ALPHA
+from .cobraConstants import MOTOR_NOISE_BETA
+
+
+class MotorNoiseSimulator():
+    """
+
+    Class used to simulate the effect of the cobras motor noise on their
+    trajectories.
+
+    The motor noise is simulated following the MATLAB collision code: each
+    motor map bin is traversed with a series of moves whose lengths, in units
+    of the bin width, follow a normal distribution with mean 1 and standard
+    deviation alpha * binWidth^(beta - 1). This gives a noisy motor map for
+    each cobra and noise realization, which is then used to convert the
+    planned motor steps into the actual cobra rotation angles.
+
+    """
+
+    def __init__(self, trajectories, alpha=MOTOR_NOISE_ALPHA, beta=MOTOR_NOISE_BETA):
+        """Constructs a new motor noise simulator instance.
+
+        Parameters
+        ----------
+        trajectories: object
+            The trajectory group instance with the planned cobra trajectories.
+            The trajectories should have been calculated using the cobras
+            motor maps.
+        alpha: float, optional
+            The motor noise normalization factor. Default is
+            MOTOR_NOISE_ALPHA.
+        beta: float, optional
+            The motor noise exponent. Default is MOTOR_NOISE_BETA.
+
+        Returns
+        -------
+        object
+            The motor noise simulator instance.
+
+        """
+        # Make sure that the trajectories motor steps are available
+        if trajectories.motorSteps is None:
+            raise ValueError("The trajectories motor steps are not available. "
+                             "Please use trajectories calculated with the "
+                             "cobras motor maps.")
+
+        # Save the trajectories, the bench and the noise parameters
+        self.trajectories = trajectories
+        self.bench = trajectories.bench
+        self.alpha = alpha
+        self.beta = beta
+
+        # Calculate the fractional bin errors of each cobra motor map
+        self.fractionalBinErrors = self.alpha * self.bench.cobras.motorMaps.angularSteps ** (self.beta - 1)
+
+        # Prepare the information that is common to all the noise realizations
+        self.prepareRealizations()
+
+        # Define some internal variables that will filled by the run method
+        self.nRealizations = None
+        self.associationCollisionProbabilities = None
+        self.collisionProbabilities = None
+
+    def prepareRealizations(self):
+        """Calculates the trajectory properties that are common to all the
+        noise realizations.
+
+        """
+        # Extract some useful information
+        cobras = self.bench.cobras
+        motorMaps = cobras.motorMaps
+        (posThtMovement, posPhiMovement) = self.trajectories.movementDirections
+        (thtSteps, phiSteps) = self.trajectories.motorSteps
+
+        # Get the cobra rotation angles at the trajectories starting positions
+        (startTht, startPhi, _) = cobras.calculateInverseKinematics(self.trajectories.startFiberPositions)
+        self.startTht = startTht
+        self.thtSigns = np.where(posThtMovement, 1.0, -1.0)
+
+        # Get the integrated step maps that have been used for each cobra
+        (_, thtRows) = motorMaps.getTableRows(posThtMovement, None, None, 1)
+        (_, phiRows) = motorMaps.getTableRows(posPhiMovement, None, None, 1)
+        self.thtStepMaps = motorMaps.getIntegratedStepMaps(useThtMaps=True)[thtRows]
+        self.phiStepMaps = motorMaps.getIntegratedStepMaps(useThtMaps=False)[phiRows]
+
+        # Calculate the phi offsets and motor steps at the starting positions
+        self.phiStartOffsets = np.where(posPhiMovement, np.pi + startPhi, np.abs(startPhi))
+        self.phiStartSteps = motorMaps.calculateStepOffsets(self.phiStartOffsets, posPhiMovement, useThtMaps=False)
+
+        # The noisy motor steps are measured relative to the starting
+        # positions
+        self.thtSteps = thtSteps
+        self.phiRelativeSteps = phiSteps - self.phiStartSteps[:, np.newaxis]
+
+        # Use the map intervals of the planned trajectories as the starting
+        # point for the noisy map interval searches
+        self.thtIntervals = self.calculateMapIntervals(
+            motorMaps.calculateAngleOffsets(thtSteps, posThtMovement), motorMaps.thtOffsets.shape[1])
+        self.phiIntervals = self.calculateMapIntervals(
+            motorMaps.calculateAngleOffsets(phiSteps, posPhiMovement, useThtMaps=False), motorMaps.phiOffsets.shape[1])
+
+    def calculateMapIntervals(self, angleOffsets, nPoints):
+        """Calculates the motor map intervals for the given angle offsets.
+
+        Parameters
+        ----------
+        angleOffsets: object
+            A 2D numpy array with the angle offsets for each cobra.
+        nPoints: int
+            The number of points in the motor maps.
+
+        Returns
+        -------
+        object
+            A 2D numpy array with the motor map intervals.
+
+        """
+        intervals = np.floor(angleOffsets / self.bench.cobras.motorMaps.angularSteps[:, np.newaxis])
+
+        return np.clip(np.nan_to_num(intervals), 0, nPoints - 2).astype(np.intp)
+
+    def run(self, nRealizations, realizationsPerChunk=5, rng=None):
+        """Calculates the cobra collision probabilities using noisy
+        realizations of the planned trajectories.
+
+        Parameters
+        ----------
+        nRealizations: int
+            The total number of noise realizations to simulate.
+        realizationsPerChunk: int, optional
+            The maximum number of noise realizations that are processed at the
+            same time. It sets the memory used by the simulation. Default is 5.
+        rng: object, optional
+            The numpy random generator to use. If it is set to None, the numpy
+            global random generator will be used. Default is None.
+
+        """
+        # Extract some useful information
+        nCobras = self.bench.cobras.nCobras
+        cobraAssociations = self.bench.cobraAssociations
+
+        # Count the number of realizations where each association and each
+        # cobra are involved in a collision
+        associationCounts = np.zeros(cobraAssociations.shape[1], dtype="int")
+        cobraCounts = np.zeros(nCobras, dtype="int")
+
+        for chunkStart in range(0, nRealizations, realizationsPerChunk):
+            # Calculate the noisy trajectories for this chunk of realizations
+            chunkSize = min(realizationsPerChunk, nRealizations - chunkStart)
+            (fiberPositions, elbowPositions) = self.calculateNoisyTrajectories(chunkSize, rng)
+
+            # Calculate the association collisions, moving the realizations
+            # axis after the cobras axis, as expected by the collision kernel
+            (associationCollisions, _, _, _) = self.bench.calculateAssociationCollisionSummary(
+                np.moveaxis(fiberPositions, 0, 1), np.moveaxis(elbowPositions, 0, 1), useBroadPhase=True)
+            associationCounts += np.sum(associationCollisions, axis=1)
+
+            # Check which cobras are involved in collisions
+            cobraCollisions = np.full((nCobras, chunkSize), False)
+            np.logical_or.at(cobraCollisions, cobraAssociations[0], associationCollisions)
+            np.logical_or.at(cobraCollisions, cobraAssociations[1], associationCollisions)
+            cobraCounts += np.sum(cobraCollisions, axis=1)
+
+        # Save the collision probabilities
+        self.nRealizations = nRealizations
+        self.associationCollisionProbabilities = associationCounts / nRealizations
+        self.collisionProbabilities = cobraCounts / nRealizations
+
+    def calculateNoisyTrajectories(self, nRealizations, rng=None):
+        """Calculates noisy realizations of the planned cobra trajectories.
+
+        Parameters
+        ----------
+        nRealizations: int
+            The number of noise realizations to calculate.
+        rng: object, optional
+            The numpy random generator to use. If it is set to None, the numpy
+            global random generator will be used. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the fiber and elbow positions along the noisy
+            trajectories. Their shape is (nRealizations, nCobras, nSteps).
+
+        """
+        # Extract some useful information
+        cobras = self.bench.cobras
+        motorMaps = cobras.motorMaps
+        posPhiMovement = self.trajectories.movementDirections[1]
+        nCobras = cobras.nCobras
+        rows = (np.arange(nRealizations)[:, np.newaxis] * nCobras + np.arange(nCobras))[..., np.newaxis]
+        cobraRows = np.arange(nCobras)[:, np.newaxis]
+
+        # Calculate the noisy theta motor maps and use them to convert the
+        # planned motor steps into theta angles
+        thtStepMaps = self.calculateNoisyStepMaps(self.thtStepMaps, nRealizations, rng)
+        steps = np.broadcast_to(self.thtSteps, thtStepMaps.shape[:2] + self.thtSteps.shape[1:])
+        intervals = MotorNoiseSimulator.searchIntervals(steps, thtStepMaps, rows, self.thtIntervals)
+        tht = MotorMapGroup.interpolateIntervals(steps, thtStepMaps.reshape(-1, thtStepMaps.shape[2]), motorMaps.thtOffsets, rows, cobraRows, intervals)
+        tht = self.startTht[:, np.newaxis] + self.thtSigns[:, np.newaxis] * tht
+
+        # Calculate the noisy phi motor maps and the motor steps at the
+        # starting positions, which are different for each realization
+        phiStepMaps = self.calculateNoisyStepMaps(self.phiStepMaps, nRealizations, rng)
+        startOffsets = np.broadcast_to(self.phiStartOffsets[:, np.newaxis], (nRealizations, nCobras, 1))
+        intervals = np.broadcast_to(self.calculateMapIntervals(startOffsets[0], motorMaps.phiOffsets.shape[1]), startOffsets.shape)
+        startSteps = MotorMapGroup.interpolateIntervals(
+            startOffsets, motorMaps.phiOffsets, phiStepMaps.reshape(-1, phiStepMaps.shape[2]), cobraRows, rows, intervals.copy())
+
+        # Use the noisy phi motor maps to convert the planned motor steps into
+        # phi angles
+        steps = self.phiRelativeSteps + startSteps
+        intervals = MotorNoiseSimulator.searchIntervals(steps, phiStepMaps, rows, self.phiIntervals)
+        phi = MotorMapGroup.interpolateIntervals(steps, phiStepMaps.reshape(-1, phiStepMaps.shape[2]), motorMaps.phiOffsets, rows, cobraRows, intervals)
+        phi = np.where(posPhiMovement[:, np.newaxis], phi - np.pi, -phi)
+
+        # Calculate the elbow and fiber positions along the trajectories
+        elbowPositions = cobras.centers[:, np.newaxis] + cobras.L1[:, np.newaxis] * np.exp(1j * tht)
+        fiberPositions = elbowPositions + cobras.L2[:, np.newaxis] * np.exp(1j * (tht + phi))
+
+        return fiberPositions, elbowPositions
+
+    def calculateNoisyStepMaps(self, stepMaps, nRealizations, rng=None):
+        """Calculates noisy realizations of the given integrated step maps.
+
+        Parameters
+        ----------
+        stepMaps: object
+            A 2D numpy array with the integrated step maps of each cobra.
+        nRealizations: int
+            The number of noise realizations to calculate.
+        rng: object, optional
+            The numpy random generator to use. If it is set to None, the numpy
+            global random generator will be used. Default is None.
+
+        Returns
+        -------
+        object
+            A 3D numpy array with the noisy integrated step maps. Its shape is
+            (nRealizations, nCobras, nPoints).
+
+        """
+        # Multiply the number of steps in each map bin by the noise factors
+        binSteps = np.diff(stepMaps, axis=1)
+        factors = MotorNoiseSimulator.calculateMapFactors(
+            self.fractionalBinErrors[:, np.newaxis], (nRealizations,) + binSteps.shape, rng)
+
+        # Integrate the noisy step maps
+        noisyStepMaps = np.zeros((nRealizations,) + stepMaps.shape)
+        np.cumsum(binSteps * factors, axis=2, out=noisyStepMaps[:, :, 1:])
+
+        return noisyStepMaps
+
+    @staticmethod
+    def calculateMapFactors(fractionalBinErrors, shape, rng=None):
+        """Calculates the factors that should be applied to the motor map bins
+        to simulate the motor noise.
+
+        Each bin is traversed with a series of moves with random lengths, in
+        units of the bin width, until the total distance is equal or larger
+        than one. The factor is the number of moves needed, where the last
+        move contributes with the fraction used to reach the end of the bin.
+
+        Parameters
+        ----------
+        fractionalBinErrors: object
+            A numpy array with the standard deviation of the move lengths. It
+            should be broadcastable to the given shape.
+        shape: tuple
+            The shape of the factors array.
+        rng: object, optional
+            The numpy random generator to use. If it is set to None, the numpy
+            global random generator will be used. Default is None.
+
+        Returns
+        -------
+        object
+            A numpy array with the motor map bin factors.
+
+        """
+        # Initialize the distances traveled in each bin and the map factors
+        distances = np.zeros(shape).ravel()
+        factors = np.zeros(distances.size)
+        fractionalBinErrors = np.broadcast_to(fractionalBinErrors, shape).ravel()
+
+        # Move all the bins until they reach the end of the bin
+        movingBins = np.arange(distances.size)
+
+        while movingBins.size > 0:
+            # Calculate the random move lengths
+            if rng is None:
+                moves = np.random.standard_normal(movingBins.size)
+            else:
+                moves = rng.standard_normal(movingBins.size)
+
+            moves = 1 + fractionalBinErrors[movingBins] * moves
+
+            # Check which bins reach the end
+            finalDistances = distances[movingBins] + moves
+            finished = finalDistances >= 1
+
+            # Only count the fraction of the move needed to reach the end
+            fractions = np.ones(movingBins.size)
+            fractions[finished] = (1 - distances[movingBins[finished]]) / moves[finished]
+            factors[movingBins] += fractions
+
+            # Update the traveled distances and the bins that are still moving
+            distances[movingBins] = np.minimum(finalDistances, 1)
+            movingBins = movingBins[~finished]
+
+        return factors.reshape(shape)
+
+    @staticmethod
+    def searchIntervals(x, xp, rows, intervals):
+        """Searches the grid intervals of the given x values starting from the
+        provided interval estimates.
+
+        The intervals are moved one step at a time until the x values are
+        inside them, or until they reach the first or the last grid interval.
+
+        Parameters
+        ----------
+        x: object
+            A numpy array with the x values.
+        xp: object
+            A 3D numpy array with the increasing grids, with the grid points
+            along the last axis.
+        rows: object
+            A numpy array with the xp rows, after merging its first two axes,
+            associated to each x value. It should be broadcastable to the x
+            array.
+        intervals: object
+            A numpy array with the estimated grid intervals. It should be
+            broadcastable to the x array.
+
+        Returns
+        -------
+        object
+            A numpy array with the grid intervals of the x values.
+
+        """
+        # Work with the flattened arrays
+        shape = x.shape
+        nPoints = xp.shape[-1]
+        xp = xp.ravel()
+        x = x.ravel()
+        starts = np.broadcast_to(rows * nPoints, shape).ravel()
+        intervals = np.broadcast_to(intervals, shape).ravel().copy()
+
+        # Move the intervals until they contain the x values
+        movingIndices = np.arange(x.size)
+
+        while movingIndices.size > 0:
+            indices = starts[movingIndices] + intervals[movingIndices]
+            moves = np.logical_and(x[movingIndices] >= xp[indices + 1], intervals[movingIndices] < nPoints - 2).astype(np.intp)
+            moves -= np.logical_and(x[movingIndices] < xp[indices], intervals[movingIndices] > 0)
+            movingIndices = movingIndices[moves != 0]
+            intervals[movingIndices] += moves[moves != 0]
+
+        return intervals.reshape(shape)
@@ -17,6 +17,7 @@ from abc import ABC, abstractmethod
 from scipy.spatial import KDTree
 
 from .cobraConstants import NULL_TARGET_INDEX
+from .EndPointCollisionState import EndPointCollisionState
 
 
 class TargetSelector(ABC):
@@ -84,8 +85,8 @@ class TargetSelector(ABC):
         """Constructs a K-dimensional tree using the target positions.
 
         The KD tree will then be used for the target-to-cobra distance
-        calculations. The KD tree method starts to be efficient compared to
-        brute force for target-to-cobra densities above 50.
+        calculations. If it is not constructed, a KD tree with the default
+        leaf size will be constructed every time it is needed.
 
         Parameters
         ----------
@@ -125,47 +126,18 @@ class TargetSelector(ABC):
             appear first).
 
         """
-        # Get the cobra center and the patrol area limits
-        cobraCenter = self.bench.cobras.centers[cobraIndex]
-        rMin = self.bench.cobras.rMin[cobraIndex]
-        rMax = min(self.bench.cobras.rMax[cobraIndex], maximumDistance)
-
-        # If available, use the KD tree for the distance calculations
-        if self.kdTree is not None:
-            # Get all the targets that the cobra can reach. Remember to
-            # invalidate any possible NULL targets that might exist
-            distances, indices = self.kdTree.query(
-                [cobraCenter.real, cobraCenter.imag], k=None,
-                distance_upper_bound=rMax)
-            indices = np.array(indices, dtype=np.int)
-            distances = np.array(distances)
-            validTargets = np.logical_and(self.targets.notNull[indices],
-                                          distances > rMin)
-            indices = indices[validTargets]
-            distances = distances[validTargets]
-            positions = self.targets.positions[indices]
-        else:
-            # Get all the targets that the cobra can reach. Remember to
-            # invalidate any possible NULL targets that might exist
-            xDistances = np.abs(cobraCenter.real - self.targets.positions.real)
-            (indices,) = np.where(np.logical_and(self.targets.notNull,
-                                                 xDistances < rMax))
-            positions = self.targets.positions[indices]
-            yDistances = np.abs(cobraCenter.imag - positions.imag)
-            validTargets = yDistances < rMax
-            indices = indices[validTargets]
-            positions = positions[validTargets]
-            distances = np.abs(cobraCenter - positions)
-            validTargets = np.logical_and(distances > rMin, distances < rMax)
-            indices = indices[validTargets]
-            positions = positions[validTargets]
-            distances = distances[validTargets]
-
-            # Sort the targets by their distance to the cobra center
-            sortedIndices = distances.argsort()
-            indices = indices[sortedIndices]
-            positions = positions[sortedIndices]
-            distances = distances[sortedIndices]
+        # Get the targets that the cobra can reach, without considering the
+        # cobra black dot
+        (_, indices, distances, _, _, _) = \
+            self.bench.cobras.findReachablePositions(
+                self.targets.positions, cobraIndex, maximumDistance,
+                avoidBlackDots=False, kdTree=self.kdTree)
+
+        # Remove any possible NULL targets that might exist
+        validTargets = self.targets.notNull[indices]
+        indices = indices[validTargets]
+        distances = distances[validTargets]
+        positions = self.targets.positions[indices]
 
         return indices, positions, distances
 
@@ -185,57 +157,51 @@ class TargetSelector(ABC):
             cobra can reach).
 
         """
-        # Extract some useful information
+        # Get all the cobra-target pairs where the cobra can reach the target
+        (cobraIndices, targetIndices, distances, _, _, elbows) = \
+            self.bench.cobras.findReachablePositions(
+                self.targets.positions, maximumDistance=maximumDistance,
+                kdTree=self.kdTree)
+
+        # Remove any possible NULL targets that might exist
+        validTargets = self.targets.notNull[targetIndices]
+        cobraIndices = cobraIndices[validTargets]
+        targetIndices = targetIndices[validTargets]
+        distances = distances[validTargets]
+        elbows = elbows[validTargets]
+
+        # Calculate the column of each pair in the accessible target arrays.
+        # The pairs are already sorted by cobra and distance
         nCobras = self.bench.cobras.nCobras
-        cobraCenters = self.bench.cobras.centers
-        cobraBlackDotPosition = self.bench.cobras.blackDotPosition
-        cobraBlackDotRadius = self.bench.cobras.blackDotRadius
-
-        # Obtain the cobra-target associations
-        associations = []
-        maxTargetsPerCobra = 0
-
-        for i in range(nCobras):
-            # Get the targets that fall inside the cobra patrol area
-            indices, positions, distances = self.getTargetsInsidePatrolArea(
-                i, maximumDistance)
-
-            # Invalidate targets falling in the cobra black dots
-            blackDotdistances = np.abs(
-                cobraCenters[i] + cobraBlackDotPosition[i] - positions)
-            validTargets = blackDotdistances > cobraBlackDotRadius[i]
-            indices = indices[validTargets]
-            positions = positions[validTargets]
-            distances = distances[validTargets]
-
-            # Save the cobra-target association information
-            associations.append((i, indices, positions, distances))
-            maxTargetsPerCobra = max(maxTargetsPerCobra, len(indices))
+        nTargets = np.bincount(cobraIndices, minlength=nCobras)
+        columns = np.arange(len(cobraIndices)) - np.repeat(
+            np.cumsum(nTargets) - nTargets, nTargets)
 
         # Create the accessible target arrays
-        arrayShape = (nCobras, maxTargetsPerCobra)
+        arrayShape = (nCobras, np.max(nTargets, initial=0))
         self.accessibleTargetIndices = np.full(arrayShape, NULL_TARGET_INDEX)
         self.accessibleTargetDistances = np.zeros(arrayShape)
         self.accessibleTargetElbows = np.zeros(arrayShape, dtype="complex")
 
         # Fill the arrays with the cobra-target association information
-        for i, indices, positions, distances in associations:
-            # Calculate the elbow positions at the target positions
-            elbows = self.bench.cobras.calculateCobraElbowPositions(
-                i, positions)
-
-            # Fill the arrays
-            nTargets = len(indices)
-            self.accessibleTargetIndices[i, :nTargets] = indices
-            self.accessibleTargetDistances[i, :nTargets] = distances
-            self.accessibleTargetElbows[i, :nTargets] = elbows
-
-    def solveEndPointCollisions(self):
+        self.accessibleTargetIndices[cobraIndices, columns] = targetIndices
+        self.accessibleTargetDistances[cobraIndices, columns] = distances
+        self.accessibleTargetElbows[cobraIndices, columns] = elbows
+
+    def solveEndPointCollisions(self, cobraIndices=None):
         """Detects and solves cobra end-point collisions assigning them
         alternative targets.
 
         This method should always be run after the selectTargets method.
 
+        Parameters
+        ----------
+        cobraIndices: object, optional
+            A numpy array with the indices of the cobras whose end-point
+            collisions should be solved. Only the collisions involving at
+            least one of these cobras will be solved. If it is set to None,
+            all the end-point collisions will be solved. Default is None.
+
         """
         # Get the indices of the targets that are currently assigned to cobras
         indices = self.assignedTargetIndices
@@ -252,9 +218,17 @@ class TargetSelector(ABC):
         positions = self.bench.cobras.home0.copy()
         positions[usedCobras] = self.targets.positions[indices[usedCobras]]
 
+        # Initialize the end-point collision state for those positions
+        state = EndPointCollisionState(self.bench, positions)
+
         # Get the cobra associations where we have an end-point collision
-        problematicAssociations = self.bench.getProblematicCobraAssociations(
-            positions).T
+        problematicAssociations = self.bench.cobraAssociations[
+            :, state.associationCollisions].T
+
+        # Select the associations that involve the given cobras
+        if cobraIndices is not None:
+            problematicAssociations = problematicAssociations[np.any(
+                np.isin(problematicAssociations, cobraIndices), axis=1)]
 
         # Try to solve the cobra collisions one by one
         for c, nc in problematicAssociations:
@@ -263,50 +237,40 @@ class TargetSelector(ABC):
                 # The unused cobra is the cobra that we are going to move
                 cobraToMove = c if not usedCobras[c] else nc
 
-                # Calculate the initial number of collisions for that cobra
-                initialCollisions = self.bench.getCollisionsForCobra(
-                    cobraToMove, positions)
+                # Get the current number of collisions for that cobra
+                initialCollisions = state.nCollisions[cobraToMove]
 
                 # Move to the next association if the number of collisions is
                 # already zero (it could have been solved in a previous step)
                 if initialCollisions == 0:
                     continue
 
-                # Move the cobra until we find the position with the minimum
-                # number of collisions
+                # Rotate the cobra around its center and calculate the number
+                # of collisions at each of the rotated positions
                 cobraCenter = self.bench.cobras.centers[cobraToMove]
-                initialPosition = positions[cobraToMove]
+                initialPosition = state.fiberPositions[cobraToMove]
+                rotatedPositions = cobraCenter + (
+                    initialPosition - cobraCenter) * np.exp(
+                        1j * np.linspace(0, 2 * np.pi, 7)[1:-1])
+                collisions = self.bench.calculateCandidatePositionsCollisions(
+                    cobraToMove, rotatedPositions, state.fiberPositions,
+                    state.elbowPositions)[0][0]
+
+                # Select the first position with the minimum number of
+                # collisions, if the number of collisions decreased
+                bestIndex = np.argmin(collisions)
                 bestPosition = initialPosition
-                bestCollisions = initialCollisions
-
-                for ang in np.linspace(0, 2 * np.pi, 7)[1:-1]:
-                    # Rotate the cobra around its center
-                    positions[cobraToMove] = cobraCenter + (
-                        initialPosition - cobraCenter) * np.exp(1j * ang)
 
-                    # Calculate the number of collisions at the rotated position
-                    collisions = self.bench.getCollisionsForCobra(
-                        cobraToMove, positions)
-
-                    # Check if the number of collisions decreased
-                    if collisions < bestCollisions:
-                        # Save the information from this cobra position
-                        bestPosition = positions[cobraToMove]
-                        bestCollisions = collisions
-
-                        # Exit the loop if the number of collisions is zero
-                        if collisions == 0:
-                            break
+                if collisions[bestIndex] < initialCollisions:
+                    bestPosition = rotatedPositions[bestIndex]
 
                 # Use the best fiber position
-                positions[cobraToMove] = bestPosition
+                state.move(cobraToMove, bestPosition)
             else:
-                # Calculate the initial number of collisions associated with
-                # the two cobras
-                initialCollisions = self.bench.getCollisionsForCobra(
-                    c, positions)
-                initialCollisions += self.bench.getCollisionsForCobra(
-                    nc, positions)
+                # Get the current number of collisions associated with the two
+                # cobras
+                initialCollisions = (
+                    state.nCollisions[c] + state.nCollisions[nc])
 
                 # Free the current targets
                 initialTarget1 = indices[c]
@@ -346,15 +310,9 @@ class TargetSelector(ABC):
                 bestCollisions = initialCollisions
 
                 for newTarget1, newTarget2 in combinations:
-                    # Assign the new fiber positions
-                    positions[c] = self.targets.positions[newTarget1]
-                    positions[nc] = self.targets.positions[newTarget2]
-
                     # Calculate the number of collisions at the new positions
-                    collisions = self.bench.getCollisionsForCobra(
-                        c, positions)
-                    collisions += self.bench.getCollisionsForCobra(
-                        nc, positions)
+                    collisions = np.sum(state.trialMove(
+                        [c, nc], self.targets.positions[[newTarget1, newTarget2]]))
 
                     # Check if the number of collisions decreased
                     if collisions < bestCollisions:
@@ -378,8 +336,7 @@ class TargetSelector(ABC):
                 # Use the target combination where we had less collisions
                 indices[c] = bestTarget1
                 indices[nc] = bestTarget2
-                positions[c] = self.targets.positions[bestTarget1]
-                positions[nc] = self.targets.positions[bestTarget2]
+                state.move([c, nc], self.targets.positions[[bestTarget1, bestTarget2]])
                 freeTargets[bestTarget1] = False
                 freeTargets[bestTarget2] = False
 
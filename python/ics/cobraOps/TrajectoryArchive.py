@@ -0,0 +1,293 @@
+"""
+
+TrajectoryArchive class.
+
+Consult the following papers for more detailed information:
+
+  https://ui.adsabs.harvard.edu/abs/2012SPIE.8450E..17F
+  https://ui.adsabs.harvard.edu/abs/2014SPIE.9151E..1YF
+  https://ui.adsabs.harvard.edu/abs/2016arXiv160801075T
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10707E..28Y
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10702E..1CT
+
+"""
+
+import os
+import json
+import uuid
+import tempfile
+import numpy as np
+
+from .AttributePrinter import AttributePrinter
+
+ARCHIVE_VERSION = 1
+"""The archive format version. Increase it when the archived arrays change."""
+
+INDEX_FILE_NAME = "index.json"
+"""The name of the archive index file."""
+
+TRAJECTORY_ARRAYS = ("fiberPositions", "elbowPositions")
+"""The names of the trajectory group arrays that are saved in the archive."""
+
+SIMULATOR_ARRAYS = ("finalFiberPositions", "movementDirections",
+                    "movementStrategies", "collisions", "endPointCollisions",
+                    "associationCollisions", "associationEndPointCollisions")
+"""The names of the collision simulator arrays that are saved in the
+archive."""
+
+
+class TrajectoryArchive(AttributePrinter):
+    """Class describing an on-disk archive of simulated cobra trajectories.
+
+    Each field (one collision simulator run) is saved as a set of numpy .npy
+    files, one per array, and the archive contents are described in a small
+    JSON index file. The arrays are read as read-only memory maps, so any
+    field or cobra can be accessed without loading the rest of the archive.
+
+    """
+
+    def __init__(self, directory):
+        """Constructs a new trajectory archive instance.
+
+        The archive directory is created if it doesn't exist. If it already
+        contains an archive, its index is loaded and new fields will be
+        appended to it.
+
+        Parameters
+        ----------
+        directory: str
+            The path to the archive directory.
+
+        Returns
+        -------
+        object
+            The trajectory archive instance.
+
+        """
+        # Save the archive directory, creating it if necessary
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Load the archive index
+        self.fields = None
+        self.loadIndex()
+
+    def __len__(self):
+        """Returns the number of fields in the archive.
+
+        Returns
+        -------
+        int
+            The number of fields in the archive.
+
+        """
+        return len(self.fields)
+
+    def loadIndex(self):
+        """Loads the archive index from the archive directory.
+
+        The archive will have no fields if the index file doesn't exist yet.
+
+        """
+        indexFileName = os.path.join(self.directory, INDEX_FILE_NAME)
+
+        if not os.path.exists(indexFileName):
+            self.fields = []
+            return
+
+        with open(indexFileName, "r") as indexFile:
+            index = json.load(indexFile)
+
+        if index["version"] != ARCHIVE_VERSION:
+            raise ValueError(
+                "The archive format version (%i) is not supported. "
+                "Supported version: %i." % (index["version"], ARCHIVE_VERSION))
+
+        self.fields = index["fields"]
+
+    def addField(self, simulator, name=None):
+        """Appends the results of a collision simulator run to the archive.
+
+        The array files are written before the index is updated, and the
+        index is written to a temporary file first and then renamed, so
+        readers never see incomplete fields. Each field uses unique file
+        names, and the index is loaded again just before it is updated, so
+        fields added by other archive instances since this one was opened
+        are preserved.
+
+        Parameters
+        ----------
+        simulator: object
+            The collision simulator instance. It should have been run before.
+        name: str, optional
+            The field name. It should not be used by any other field in the
+            archive. If it is set to None, the field number will be used.
+            Default is None.
+
+        Returns
+        -------
+        int
+            The index of the new field in the archive.
+
+        """
+        # Collect the arrays to save
+        trajectories = simulator.trajectories
+        arrays = dict(zip(TRAJECTORY_ARRAYS, trajectories.getPositions()))
+
+        for arrayName in SIMULATOR_ARRAYS:
+            array = getattr(simulator, arrayName)
+
+            if array is not None:
+                arrays[arrayName] = array
+
+        # Save each array in a separate .npy file, using a unique identifier
+        # in the file names
+        fieldId = uuid.uuid4().hex
+        fileNames = {}
+
+        for arrayName, array in arrays.items():
+            fileNames[arrayName] = "field_%s_%s.npy" % (fieldId, arrayName)
+            np.save(os.path.join(self.directory, fileNames[arrayName]),
+                    np.ascontiguousarray(array))
+
+        # Load the latest version of the archive index and check that the
+        # field name is not already used
+        self.loadIndex()
+        fieldIndex = len(self.fields)
+
+        if name is None:
+            name = str(fieldIndex)
+
+        if name in (field["name"] for field in self.fields):
+            for fileName in fileNames.values():
+                os.remove(os.path.join(self.directory, fileName))
+
+            raise ValueError(
+                "The archive already contains a field named %s." % name)
+
+        # Add the field to the archive index
+        self.fields.append({
+            "name": name,
+            "nCobras": int(simulator.bench.cobras.nCobras),
+            "nSteps": int(trajectories.nSteps),
+            "stepWidth": int(trajectories.stepWidth),
+            "nCollisions": int(simulator.nCollisions),
+            "nEndPointCollisions": int(simulator.nEndPointCollisions),
+            "arrays": fileNames})
+        self.saveIndex()
+
+        return fieldIndex
+
+    def saveIndex(self):
+        """Saves the archive index in the archive directory.
+
+        """
+        (fileDescriptor, temporaryFileName) = tempfile.mkstemp(
+            suffix=".json", dir=self.directory)
+
+        with os.fdopen(fileDescriptor, "w") as temporaryFile:
+            json.dump({"version": ARCHIVE_VERSION, "fields": self.fields},
+                      temporaryFile, indent=1)
+
+        os.replace(temporaryFileName,
+                   os.path.join(self.directory, INDEX_FILE_NAME))
+
+    def getFieldIndex(self, name):
+        """Returns the index of the field with the given name.
+
+        Parameters
+        ----------
+        name: str
+            The field name.
+
+        Returns
+        -------
+        int
+            The field index.
+
+        """
+        for fieldIndex, field in enumerate(self.fields):
+            if field["name"] == name:
+                return fieldIndex
+
+        raise KeyError("The archive doesn't contain a field named %s." % name)
+
+    def getArray(self, fieldIndex, arrayName):
+        """Returns one of the arrays saved for a given field.
+
+        The array is not loaded in memory. It is returned as a read-only
+        memory map of the array file.
+
+        Parameters
+        ----------
+        fieldIndex: int
+            The field index.
+        arrayName: str
+            The array name (e.g. fiberPositions or collisions).
+
+        Returns
+        -------
+        object
+            A read-only numpy memory map with the array values.
+
+        """
+        fileName = self.fields[fieldIndex]["arrays"][arrayName]
+
+        return np.load(os.path.join(self.directory, fileName), mmap_mode="r")
+
+    def getPositions(self, fieldIndex, cobraIndices=None, steps=None):
+        """Returns the fiber and elbow positions along the trajectories of a
+        given field.
+
+        Only the requested positions are read from disk. Integer indices and
+        slices return views of the memory maps without copying the data.
+
+        Parameters
+        ----------
+        fieldIndex: int
+            The field index.
+        cobraIndices: object, optional
+            An integer, a slice or a numpy array with the indices of the
+            cobras to return. If it is set to None, all the cobras will be
+            returned. Default is None.
+        steps: object, optional
+            An integer, a slice or a numpy array with the trajectory steps to
+            return. If it is set to None, all the trajectory steps will be
+            returned. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the fiber and elbow positions.
+
+        """
+        selection = (slice(None) if cobraIndices is None else cobraIndices,
+                     slice(None) if steps is None else steps)
+
+        return tuple(self.getArray(fieldIndex, arrayName)[selection]
+                     for arrayName in TRAJECTORY_ARRAYS)
+
+    def getCollisions(self, fieldIndex, cobraIndices=None):
+        """Returns the cobras trajectory and end point collision flags of a
+        given field.
+
+        Parameters
+        ----------
+        fieldIndex: int
+            The field index.
+        cobraIndices: object, optional
+            An integer, a slice or a numpy array with the indices of the
+            cobras to return. If it is set to None, all the cobras will be
+            returned. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the trajectory collision flags and the end
+            point collision flags.
+
+        """
+        selection = slice(None) if cobraIndices is None else cobraIndices
+
+        return (self.getArray(fieldIndex, "collisions")[selection],
+                self.getArray(fieldIndex, "endPointCollisions")[selection])
@@ -15,6 +15,8 @@ Consult the following papers for more detailed information:
 import numpy as np
 
 from . import plotUtils
+from .cobraConstants import COLLISION_DETECTION_MEMORY
+from .cobraConstants import COLLISION_REDUCTION_MEMORY
 from .AttributePrinter import AttributePrinter
 
 
@@ -25,7 +27,7 @@ class TrajectoryGroup(AttributePrinter):
 
     """
 
-    def __init__(self, nSteps, stepWidth, bench, finalFiberPositions, movementDirections, movementStrategies):
+    def __init__(self, nSteps, stepWidth, bench, finalFiberPositions, movementDirections, movementStrategies, fiberPositions=None, elbowPositions=None, compact=False, motorSteps=None, keyframes=None):
         """Constructs a new trajectory group instance.
 
         Parameters
@@ -49,6 +51,31 @@ class TrajectoryGroup(AttributePrinter):
             use. True values indicate that the cobras should move in those
             angles as soon as possible, while False values indicate that the
             angle movement should be as late as possible.
+        fiberPositions: object, optional
+            A complex numpy array with precomputed fiber positions along the
+            trajectories, for example calculated in a separate process. If it
+            is set to None, the trajectories will be calculated. Default is
+            None.
+        elbowPositions: object, optional
+            A complex numpy array with the precomputed elbow positions along
+            the trajectories. It is only used if the fiberPositions parameter
+            is provided. Default is None.
+        compact: bool, optional
+            If True, only the trajectory keyframes (start and final rotation
+            angles and motor step limits) will be saved, and the fiber and
+            elbow positions will be evaluated on demand with the
+            getPositions method. It is only used if the fiberPositions
+            parameter is not provided. Default is False.
+        motorSteps: object, optional
+            A numpy array with the precomputed theta and phi motor steps along
+            the trajectories. It is only used if the fiberPositions parameter
+            is provided. Default is None.
+        keyframes: tuple, optional
+            A python tuple with the precomputed start angles, final angles,
+            motor step limits and theta signs, as calculated by the
+            calculateKeyframes method. It is only used if the fiberPositions
+            parameter is provided. If it is set to None, the trajectories
+            cannot be updated or refined. Default is None.
 
         Returns
         -------
@@ -65,12 +92,25 @@ class TrajectoryGroup(AttributePrinter):
         self.finalFiberPositions = finalFiberPositions.copy()
         self.movementDirections = movementDirections.copy()
         self.movementStrategies = movementStrategies.copy()
+        self.compact = compact and fiberPositions is None
 
         # Calculate the trajectory stating fiber positions
         self.calculateStartingFiberPositions()
 
-        # Calculate the cobra trajectories
-        self.calculateCobraTrajectories()
+        # Calculate the cobra trajectories if they have not been provided
+        if fiberPositions is None:
+            self.calculateCobraTrajectories()
+        else:
+            self.fiberPositions = fiberPositions.copy()
+            self.elbowPositions = elbowPositions.copy()
+            self.motorSteps = None if motorSteps is None else motorSteps.copy()
+
+            if keyframes is None:
+                keyframes = (None, None, None, None)
+            else:
+                keyframes = tuple(array.copy() for array in keyframes)
+
+            (self.startAngles, self.finalAngles, self.stepLimits, self.thtSigns) = keyframes
 
     def calculateStartingFiberPositions(self):
         """Calculates the trajectories starting fiber positions.
@@ -80,25 +120,116 @@ class TrajectoryGroup(AttributePrinter):
         self.startFiberPositions = self.bench.cobras.home1.copy()
         self.startFiberPositions[self.movementDirections[0]] = self.bench.cobras.home0[self.movementDirections[0]]
 
-    def calculateCobraTrajectories(self):
+    def updateCobraTrajectories(self, cobraIndices, movementDirections, movementStrategies):
+        """Updates in place the trajectories of a subset of cobras.
+
+        Only the trajectories of the given cobras are recalculated. The
+        trajectories of the other cobras are not modified.
+
+        Parameters
+        ----------
+        cobraIndices: object
+            A numpy array with the indices of the cobras whose trajectories
+            should be updated.
+        movementDirections: object
+            A boolean numpy array with the new theta and phi movement
+            directions for all the cobras. Only the values of the given cobras
+            are used.
+        movementStrategies: object
+            A boolean numpy array with the new theta and phi movement
+            strategies for all the cobras. Only the values of the given cobras
+            are used.
+
+        """
+        # Update the movement directions and strategies of the given cobras
+        self.movementDirections[:, cobraIndices] = movementDirections[:, cobraIndices]
+        self.movementStrategies[:, cobraIndices] = movementStrategies[:, cobraIndices]
+
+        # Update their starting fiber positions
+        cobras = self.bench.cobras
+        self.startFiberPositions[cobraIndices] = np.where(
+            self.movementDirections[0, cobraIndices], cobras.home0[cobraIndices], cobras.home1[cobraIndices])
+
+        # Recalculate their trajectories
+        self.calculateCobraTrajectories(cobraIndices)
+
+    def calculateCobraTrajectories(self, cobraIndices=None):
         """Calculates the cobra trajectories using the cobras motor maps.
 
+        The trajectory keyframes are always saved. If the trajectory group is
+        not compact, the fiber and elbow positions and the theta and phi motor
+        steps relative to the home positions at each step in the trajectories
+        are also saved in the fiberPositions, elbowPositions and motorSteps
+        attributes.
+
+        Parameters
+        ----------
+        cobraIndices: object, optional
+            A numpy array with the indices of the cobras whose trajectories
+            should be calculated. The trajectories of the other cobras will
+            not be modified. If it is set to None, the trajectories of all the
+            cobras will be calculated. Default is None.
+
+        """
+        # Calculate the trajectory keyframes
+        self.calculateKeyframes(cobraIndices)
+
+        # Compact trajectories are evaluated only on demand
+        if self.compact:
+            self.fiberPositions = None
+            self.elbowPositions = None
+            self.motorSteps = None
+            return
+
+        # Evaluate the keyframes at all the trajectory steps
+        (fiberPositions, elbowPositions, motorSteps) = self.evaluateKeyframes(cobraIndices=cobraIndices)
+
+        # Save the results, updating only the selected cobras if necessary
+        if cobraIndices is None:
+            self.elbowPositions = elbowPositions
+            self.fiberPositions = fiberPositions
+            self.motorSteps = motorSteps
+        else:
+            self.elbowPositions[cobraIndices] = elbowPositions
+            self.fiberPositions[cobraIndices] = fiberPositions
+
+            if self.motorSteps is not None:
+                self.motorSteps[:, cobraIndices] = motorSteps
+
+    def calculateKeyframes(self, cobraIndices=None):
+        """Calculates the cobra trajectory keyframes.
+
+        The keyframes fully describe the cobra trajectories: the theta and
+        phi angles at the start and the end of the trajectories (startAngles
+        and finalAngles attributes), the theta and phi motor step limits
+        relative to the home positions (stepLimits attribute) and the sign of
+        the theta movements (thtSigns attribute). Together with the movement
+        strategies, the motor step limits define the trajectory steps where
+        each motor starts and stops moving.
+
+        Parameters
+        ----------
+        cobraIndices: object, optional
+            A numpy array with the indices of the cobras whose keyframes
+            should be calculated. The keyframes of the other cobras will not
+            be modified. If it is set to None, the keyframes of all the cobras
+            will be calculated. Default is None.
+
         """
         # Extract some useful information
-        nCobras = self.bench.cobras.nCobras
-        cobraCenters = self.bench.cobras.centers
-        L1 = self.bench.cobras.L1
-        L2 = self.bench.cobras.L2
-        motorMaps = self.bench.cobras.motorMaps
-        posThtMovement = self.movementDirections[0]
-        posPhiMovement = self.movementDirections[1]
-        thtEarly = self.movementStrategies[0]
-        phiEarly = self.movementStrategies[1]
+        cobras = self.bench.cobras
+        selection = slice(None) if cobraIndices is None else cobraIndices
+        nCobras = len(np.arange(cobras.nCobras)[selection])
+        motorMaps = cobras.motorMaps
+        posThtMovement = self.movementDirections[0, selection]
+        posPhiMovement = self.movementDirections[1, selection]
 
         # Get the cobra rotation angles for the starting and the final fiber
         # positions
-        (startTht, startPhi) = self.bench.cobras.calculateRotationAngles(self.startFiberPositions)
-        (finalTht, finalPhi) = self.bench.cobras.calculateRotationAngles(self.finalFiberPositions)
+        (tht, phi, _) = cobras.calculateInverseKinematics(
+            np.column_stack((self.startFiberPositions[selection], self.finalFiberPositions[selection])), cobraIndices)
+        (startTht, finalTht) = tht.T
+        (startPhi, finalPhi) = phi.T
 
         # Calculate the required theta and phi delta offsets
         deltaTht = -np.mod(startTht - finalTht, 2 * np.pi)
@@ -109,65 +240,252 @@ class TrajectoryGroup(AttributePrinter):
         # consistent with the deltaTht values
         finalTht = startTht + deltaTht
 
-        # Calculate theta and phi angle values along the trajectories
-        tht = np.empty((nCobras, self.nSteps))
-        phi = np.empty((nCobras, self.nSteps))
-        tht[:] = finalTht[:, np.newaxis]
-        phi[:] = finalPhi[:, np.newaxis]
-
-        for c in range(nCobras):
-            # Jump to the next cobra if the two deltas are zero
-            if deltaTht[c] == 0 and deltaPhi[c] == 0:
-                continue
-
-            # Get the appropriate theta and phi motor maps
-            thtSteps = motorMaps.posThtSteps[c] if posThtMovement[c] else motorMaps.negThtSteps[c]
-            phiSteps = motorMaps.posPhiSteps[c] if posPhiMovement[c] else motorMaps.negPhiSteps[c]
-            thtOffsets = motorMaps.thtOffsets[c]
-            phiOffsets = motorMaps.phiOffsets[c]
-
-            # Get the theta moves from the starting to the final position
-            stepLimits = np.interp([0, np.abs(deltaTht[c])], thtOffsets, thtSteps)
-            stepMoves = np.concatenate((np.arange(stepLimits[0], stepLimits[1], self.stepWidth), [stepLimits[1]]))
-            thtMoves = startTht[c] + np.sign(deltaTht[c]) * np.interp(stepMoves, thtSteps, thtOffsets)
-
-            # Get the phi moves from the starting to the final position
-            initOffset = np.pi + startPhi[c] if posPhiMovement[c] else np.abs(startPhi[c])
-            stepLimits = np.interp([initOffset, initOffset + np.abs(deltaPhi[c])], phiOffsets, phiSteps)
-            stepMoves = np.concatenate((np.arange(stepLimits[0], stepLimits[1], self.stepWidth), [stepLimits[1]]))
-            phiMoves = np.interp(stepMoves, phiSteps, phiOffsets)
-            phiMoves = phiMoves - np.pi if posPhiMovement[c] else -phiMoves
-
-            # Fill the rotation angles according to the movement strategies
-            nThtMoves = len(thtMoves)
-            nPhiMoves = len(phiMoves)
-
-            if thtEarly[c]:
-                tht[c, :nThtMoves] = thtMoves
-            else:
-                tht[c, :-nThtMoves] = startTht[c]
-                tht[c, -nThtMoves:] = thtMoves
+        # Calculate the theta and phi offsets relative to the home positions
+        thtOffsets = np.zeros(nCobras)
+        phiOffsets = np.where(posPhiMovement, np.pi + startPhi, np.abs(startPhi))
+
+        # Calculate the motor step limits for the theta and phi movements
+        thtStepLimits = motorMaps.calculateStepOffsets(
+            np.column_stack((thtOffsets, thtOffsets + np.abs(deltaTht))), posThtMovement, indices=cobraIndices)
+        phiStepLimits = motorMaps.calculateStepOffsets(
+            np.column_stack((phiOffsets, phiOffsets + np.abs(deltaPhi))), posPhiMovement, useThtMaps=False, indices=cobraIndices)
+
+        # Save the results, updating only the selected cobras if necessary
+        if cobraIndices is None:
+            self.startAngles = np.stack((startTht, startPhi))
+            self.finalAngles = np.stack((finalTht, finalPhi))
+            self.stepLimits = np.stack((thtStepLimits, phiStepLimits))
+            self.thtSigns = np.sign(deltaTht).astype("int8")
+        else:
+            self.startAngles[:, cobraIndices] = (startTht, startPhi)
+            self.finalAngles[:, cobraIndices] = (finalTht, finalPhi)
+            self.stepLimits[:, cobraIndices] = (thtStepLimits, phiStepLimits)
+            self.thtSigns[cobraIndices] = np.sign(deltaTht)
+
+    def evaluateMotorSteps(self, steps=None, cobraIndices=None):
+        """Evaluates the theta and phi motor steps of the trajectory keyframes
+        at the given trajectory steps.
 
-            if phiEarly[c]:
-                phi[c, :nPhiMoves] = phiMoves
-            else:
-                phi[c, :-nPhiMoves] = startPhi[c]
-                phi[c, -nPhiMoves:] = phiMoves
+        Parameters
+        ----------
+        steps: object, optional
+            A slice or a numpy array with the trajectory steps to evaluate. A
+            2D numpy array can be used to evaluate different steps for each
+            cobra. If it is set to None, all the trajectory steps will be
+            evaluated. Default is None.
+        cobraIndices: object, optional
+            A numpy array with the indices of the cobras to evaluate. If it is
+            set to None, all the cobras will be evaluated. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the theta and the phi motor step moves, as
+            returned by the calculateMotorStepMoves method.
+
+        """
+        # Extract some useful information
+        selection = slice(None) if cobraIndices is None else cobraIndices
+        thtEarly = self.movementStrategies[0, selection]
+        phiEarly = self.movementStrategies[1, selection]
+        (startPhi, finalPhi) = (self.startAngles[1, selection], self.finalAngles[1, selection])
+        (thtStepLimits, phiStepLimits) = self.stepLimits[:, selection]
+        thtSigns = self.thtSigns[selection]
+
+        # Calculate the motor steps along the trajectories, taking into
+        # account the movement strategies
+        movingCobras = np.logical_or(thtSigns != 0, finalPhi - startPhi != 0)
+        thtMoves = self.calculateMotorStepMoves(thtStepLimits, thtEarly, movingCobras, steps)
+        phiMoves = self.calculateMotorStepMoves(phiStepLimits, phiEarly, movingCobras, steps)
+
+        return thtMoves, phiMoves
+
+    def evaluateKeyframes(self, steps=None, cobraIndices=None):
+        """Evaluates the trajectory keyframes at the given trajectory steps.
+
+        Parameters
+        ----------
+        steps: object, optional
+            A slice or a numpy array with the trajectory steps to evaluate. A
+            2D numpy array can be used to evaluate different steps for each
+            cobra. If it is set to None, all the trajectory steps will be
+            evaluated. Default is None.
+        cobraIndices: object, optional
+            A numpy array with the indices of the cobras to evaluate. If it is
+            set to None, all the cobras will be evaluated. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the fiber and elbow positions and the theta
+            and phi motor steps at the given trajectory steps.
+
+        """
+        # Extract some useful information
+        cobras = self.bench.cobras
+        selection = slice(None) if cobraIndices is None else cobraIndices
+        indices = np.arange(cobras.nCobras)[selection]
+        cobraCenters = cobras.centers[selection]
+        L1 = cobras.L1[selection]
+        L2 = cobras.L2[selection]
+        motorMaps = cobras.motorMaps
+        posThtMovement = self.movementDirections[0, selection]
+        posPhiMovement = self.movementDirections[1, selection]
+        (startTht, startPhi) = self.startAngles[:, selection]
+        (finalTht, finalPhi) = self.finalAngles[:, selection]
+        thtSigns = self.thtSigns[selection]
+
+        # Calculate the motor steps along the trajectories
+        ((thtSteps, thtMoves, thtWaits), (phiSteps, phiMoves, phiWaits)) = self.evaluateMotorSteps(steps, cobraIndices)
+
+        # Convert the motor steps to theta and phi angles for all the cobras
+        # at once using the motor maps inverse step tables
+        (thtIndices, _) = np.nonzero(thtMoves)
+        (phiIndices, _) = np.nonzero(phiMoves)
+        thtAngles = startTht[thtIndices] + thtSigns[thtIndices] * motorMaps.calculateAngleOffsets(
+            thtSteps[thtMoves], posThtMovement[thtIndices], indices=indices[thtIndices])
+        phiAngles = motorMaps.calculateAngleOffsets(
+            phiSteps[phiMoves], posPhiMovement[phiIndices], useThtMaps=False, indices=indices[phiIndices])
+        phiAngles = np.where(posPhiMovement[phiIndices], phiAngles - np.pi, -phiAngles)
+
+        # Calculate theta and phi angle values along the trajectories. The
+        # cobras stay at their starting positions until they start to move,
+        # and at their final positions once they stop
+        tht = np.where(thtWaits, startTht[:, np.newaxis], finalTht[:, np.newaxis])
+        phi = np.where(phiWaits, startPhi[:, np.newaxis], finalPhi[:, np.newaxis])
+        tht[thtMoves] = thtAngles
+        phi[phiMoves] = phiAngles
 
         # Calculate the elbow and fiber positions along the trajectory
-        self.elbowPositions = cobraCenters[:, np.newaxis] + L1[:, np.newaxis] * np.exp(1j * tht)
-        self.fiberPositions = self.elbowPositions + L2[:, np.newaxis] * np.exp(1j * (tht + phi))
+        elbowPositions = cobraCenters[:, np.newaxis] + L1[:, np.newaxis] * np.exp(1j * tht)
+        fiberPositions = elbowPositions + L2[:, np.newaxis] * np.exp(1j * (tht + phi))
+
+        return fiberPositions, elbowPositions, np.stack((thtSteps, phiSteps))
+
+    def getPositions(self, steps=None, cobraIndices=None):
+        """Returns the fiber and elbow positions along the trajectories.
+
+        Compact trajectories are evaluated from their keyframes.
+
+        Parameters
+        ----------
+        steps: object, optional
+            A slice or a numpy array with the trajectory steps to return. If
+            it is set to None, all the trajectory steps will be returned.
+            Default is None.
+        cobraIndices: object, optional
+            A numpy array with the indices of the cobras to return. If it is
+            set to None, all the cobras will be returned. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the fiber and elbow positions at the given
+            trajectory steps.
+
+        """
+        # Evaluate the keyframes if the positions are not available
+        if self.fiberPositions is None:
+            (fiberPositions, elbowPositions, _) = self.evaluateKeyframes(steps, cobraIndices)
+
+            return fiberPositions, elbowPositions
+
+        # Select the requested cobras and trajectory steps
+        fiberPositions = self.fiberPositions
+        elbowPositions = self.elbowPositions
+
+        if cobraIndices is not None:
+            fiberPositions = fiberPositions[cobraIndices]
+            elbowPositions = elbowPositions[cobraIndices]
+
+        if steps is not None:
+            fiberPositions = fiberPositions[:, steps]
+            elbowPositions = elbowPositions[:, steps]
+
+        return fiberPositions, elbowPositions
+
+    def calculateMotorStepMoves(self, stepLimits, earlyMovements, movingCobras, steps=None):
+        """Calculates the motor steps at each step in the trajectories for one
+        of the cobra motors.
+
+        The motor steps between the start and end limits are sampled with the
+        trajectories step width, exactly as np.arange would do, and the end
+        limit is always included. Cobras with early movements start to move
+        in the first trajectory step, while cobras with late movements finish
+        their movement in the last trajectory step.
 
-    def calculateCobraAssociationCollisions(self, associationIndices=None):
+        Parameters
+        ----------
+        stepLimits: object
+            A 2D numpy array with the motor steps at the start and the end of
+            the movement for each cobra.
+        earlyMovements: object
+            A boolean numpy array indicating which cobras should move as soon
+            as possible.
+        movingCobras: object
+            A boolean numpy array indicating which cobras are moving.
+        steps: object, optional
+            A slice or a numpy array with the trajectory steps to calculate.
+            A 2D numpy array can be used to calculate different steps for each
+            cobra. If it is set to None, all the trajectory steps will be
+            calculated. Default is None.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the motor steps at each trajectory step, a
+            boolean array indicating the trajectory steps where the motor is
+            moving, and a boolean array indicating the trajectory steps where
+            the motor is still waiting to start its movement.
+
+        """
+        # Calculate the number of moves needed to reach the end limits
+        (start, end) = stepLimits.T
+        nMoves = np.maximum(np.ceil((end - start) / self.stepWidth), 0).astype(np.intp) + 1
+
+        # Calculate the move index associated to each trajectory step
+        firstSteps = np.where(earlyMovements, 0, self.nSteps - nMoves)
+        trajectorySteps = np.arange(self.nSteps)[slice(None) if steps is None else steps]
+        moveIndices = trajectorySteps - firstSteps[:, np.newaxis]
+        moves = np.logical_and(moveIndices >= 0, moveIndices < nMoves[:, np.newaxis])
+        moves[~movingCobras] = False
+        waits = np.logical_and(moveIndices < 0, movingCobras[:, np.newaxis])
+
+        # Calculate the motor steps while moving, using the same step
+        # increments as np.arange
+        (cobraIndices, _) = np.nonzero(moves)
+        moveIndices = moveIndices[moves]
+        moveStarts = start[cobraIndices]
+        moveSteps = moveStarts + moveIndices * ((moveStarts + self.stepWidth) - moveStarts)
+        moveSteps[moveIndices == 1] = moveStarts[moveIndices == 1] + self.stepWidth
+        lastMoves = moveIndices == nMoves[cobraIndices] - 1
+        moveSteps[lastMoves] = end[cobraIndices[lastMoves]]
+
+        # Use the start and end limits before and after the movement
+        steps = np.where(waits, start[:, np.newaxis], end[:, np.newaxis])
+        steps[moves] = moveSteps
+
+        return (steps, moves, waits)
+
+    def calculateCobraAssociationCollisions(self, associationIndices=None, useBroadPhase=False):
         """Calculates which cobra associations are involved in a collision for
         each step in the trajectory.
 
+        The fraction of (association, step) pairs that were discarded by the
+        broad phase is saved in the cullingRatio attribute.
+
         Parameters
         ----------
         associationIndices: object, optional
             A numpy array with the cobra associations indices to use. If it is
             set to None, all the cobra associations will be used. Default is
             None.
+        useBroadPhase: bool, optional
+            If True, a broad phase based on the links bounding circles will be
+            used to skip the exact distance calculation for association steps
+            where the links cannot collide. Those steps will contain a lower
+            bound of the link distance in the distances array. Default is
+            False.
 
         Returns
         -------
@@ -178,28 +496,269 @@ class TrajectoryGroup(AttributePrinter):
             distances along the trajectories.
 
         """
-        # Extract some useful information
-        cobraAssociations = self.bench.cobraAssociations
-        linkRadius = self.bench.cobras.linkRadius
+        # Calculate the distances between the cobras links for each step in the
+        # trajectory
+        distances, minimumSeparations, narrowPhase = self.bench.calculateAssociationDistances(*self.getPositions(), associationIndices, useBroadPhase)
+        self.cullingRatio = 1 - np.mean(narrowPhase) if narrowPhase.size > 0 else 0.0
 
-        # Select a subset of the cobra associations if necessary
+        # Return the cobra association collisions along the trajectory and the
+        # distances array
+        return distances < minimumSeparations, distances
+
+    def calculateCobraAssociationCollisionSummary(self, associationIndices=None, useBroadPhase=False, chunkSize=None, memoryBudget=COLLISION_DETECTION_MEMORY, returnDistances=False):
+        """Calculates which cobra associations are involved in a collision
+        along the trajectories, processing the trajectory steps in chunks to
+        limit the memory usage.
+
+        The fraction of (association, step) pairs that were discarded by the
+        broad phase is saved in the cullingRatio attribute.
+
+        Parameters
+        ----------
+        associationIndices: object, optional
+            A numpy array with the cobra associations indices to use. If it is
+            set to None, all the cobra associations will be used. Default is
+            None.
+        useBroadPhase: bool, optional
+            If True, a broad phase based on the links bounding circles will be
+            used to skip the exact distance calculation for association steps
+            where the links cannot collide. The minimum distances and the
+            distances of those steps will then be lower bounds of the link
+            distances. Default is False.
+        chunkSize: int, optional
+            The number of trajectory steps in each chunk. If it is set to
+            None, it will be calculated from the memory budget. Default is
+            None.
+        memoryBudget: int, optional
+            The approximate memory in bytes that can be used to process each
+            chunk. Default is COLLISION_DETECTION_MEMORY.
+        returnDistances: bool, optional
+            If True, the full cobra association distances array will also be
+            returned. Default is False.
+
+        Returns
+        -------
+        tuple
+            A python tuple with a boolean numpy array indicating which cobra
+            associations are involved in a collision, an integer numpy array
+            with the first trajectory step where each association collides (-1
+            if it doesn't collide), a double numpy array with the minimum
+            association distances along the trajectories, and the full
+            distances array if requested (None otherwise).
+
+        """
+        # Calculate the cobra association collisions in chunks of trajectory
+        # steps
+        summary = self.bench.calculateAssociationCollisionSummary(
+            *self.getPositions(), associationIndices, useBroadPhase,
+            chunkSize=chunkSize, memoryBudget=memoryBudget, returnDistances=returnDistances)
+        self.cullingRatio = self.bench.cullingRatio
+
+        return summary
+
+    def calculateCobraAssociationCollisionReductions(self, associationIndices=None, memoryBudget=COLLISION_REDUCTION_MEMORY):
+        """Calculates which cobra associations are involved in a collision
+        along the trajectories and at their end points, without calculating
+        the full cobra association distances array.
+
+        The distances along the trajectories are reduced in chunks of
+        trajectory steps, so the memory usage doesn't depend on the number of
+        trajectory steps.
+
+        Parameters
+        ----------
+        associationIndices: object, optional
+            A numpy array with the cobra associations indices to use. If it is
+            set to None, all the cobra associations will be used. Default is
+            None.
+        memoryBudget: int, optional
+            The approximate memory in bytes that can be used to process each
+            chunk. Default is COLLISION_REDUCTION_MEMORY.
+
+        Returns
+        -------
+        tuple
+            A python tuple with a boolean numpy array indicating which cobra
+            associations are involved in a collision along the trajectories, a
+            boolean numpy array indicating which cobra associations are
+            involved in a collision at the trajectories end points, and a
+            double numpy array with the minimum association distances along
+            the trajectories.
+
+        """
+        # Reduce the cobra association distances along the trajectories
+        (collisions, _, minimumDistances, _) = self.calculateCobraAssociationCollisionSummary(
+            associationIndices, memoryBudget=memoryBudget)
+
+        # Check which cobra associations collide at the last trajectory step
+        distances, minimumSeparations, _ = self.bench.calculateAssociationDistances(
+            *self.getPositions(steps=slice(-1, None)), associationIndices, useBroadPhase=True)
+        endPointCollisions = (distances < minimumSeparations)[:, -1]
+
+        return collisions, endPointCollisions, minimumDistances
+
+    def calculateSampledCobraAssociationCollisions(self, associationIndices=None, samplingStep=10):
+        """Calculates which cobra associations are involved in a collision
+        along the trajectories, using a coarse-to-fine sampling of the
+        trajectory steps.
+
+        Only every samplingStep steps are evaluated first, and the
+        intermediate steps are only evaluated when the links could collide.
+        The results are the same as the ones obtained evaluating all the
+        trajectory steps.
+
+        Parameters
+        ----------
+        associationIndices: object, optional
+            A numpy array with the cobra associations indices to use. If it is
+            set to None, all the cobra associations will be used. Default is
+            None.
+        samplingStep: int, optional
+            The number of trajectory steps between two consecutive samples.
+            Default is 10.
+
+        Returns
+        -------
+        tuple
+            A python tuple with two boolean numpy arrays indicating which cobra
+            associations are involved in a collision along the trajectories
+            and at the trajectories end points.
+
+        """
+        return self.bench.calculateSampledAssociationCollisions(
+            *self.getPositions(), associationIndices, samplingStep)
+
+    def calculateClosestApproaches(self, associationIndices=None, nSubSteps=8, nIterations=3):
+        """Calculates the time and the distance of closest approach between
+        the cobra links in each cobra association.
+
+        The trajectory step with the minimum link distance is first found for
+        each association. The closest approach is then refined around that
+        step, evaluating the link distances at intermediate times with the
+        cobras kinematics. The motor steps are interpolated linearly between
+        trajectory steps and converted to rotation angles using the motor
+        maps. Each iteration samples 2 * nSubSteps + 1 times around the
+        current best time and reduces the search window by a factor
+        nSubSteps, so the final time resolution is 1 / nSubSteps^nIterations
+        trajectory steps.
+
+        Parameters
+        ----------
+        associationIndices: object, optional
+            A numpy array with the cobra associations indices to use. If it is
+            set to None, all the cobra associations will be used. Default is
+            None.
+        nSubSteps: int, optional
+            The number of sub-steps per search window half width used in each
+            refinement iteration. Default is 8.
+        nIterations: int, optional
+            The number of refinement iterations. Default is 3.
+
+        Returns
+        -------
+        tuple
+            A python tuple with the times of closest approach, in units of
+            trajectory steps (multiply by stepWidth to get motor steps), and
+            the link distances at those times.
+
+        """
+        # Make sure that the trajectory keyframes are available
+        if self.startAngles is None:
+            raise ValueError("The trajectory keyframes are not available. "
+                             "Please use trajectories calculated with the "
+                             "cobras motor maps.")
+
+        # Calculate the exact link distances at each trajectory step
+        distances, _, _ = self.bench.calculateAssociationDistances(
+            *self.getPositions(), associationIndices, useBroadPhase=False)
+
+        # Get the cobra associations and the steps with the minimum distances
+        cobraAssociations = self.bench.cobraAssociations
         if associationIndices is not None:
             cobraAssociations = cobraAssociations[:, associationIndices]
 
-        # Calculate the distances between the cobras links for each step in the
-        # trajectory
-        startPoints1 = self.fiberPositions[cobraAssociations[0]].ravel()
-        endPoints1 = self.elbowPositions[cobraAssociations[0]].ravel()
-        startPoints2 = self.fiberPositions[cobraAssociations[1]].ravel()
-        endPoints2 = self.elbowPositions[cobraAssociations[1]].ravel()
-        distances = self.bench.distancesBetweenLineSegments(startPoints1, endPoints1, startPoints2, endPoints2)
+        minSteps = np.argmin(distances, axis=1)
+        closestSteps = minSteps.astype("float")
+        closestDistances = distances[np.arange(len(minSteps)), minSteps]
+
+        # Refine the closest approaches around those steps
+        halfWidth = 1.0
+        subSteps = np.linspace(-1, 1, 2 * nSubSteps + 1)
+
+        for i in range(nIterations):
+            # Calculate the link distances at the intermediate times
+            times = np.clip(closestSteps[:, np.newaxis] + halfWidth * subSteps, 0, self.nSteps - 1)
+            (fiberPositions1, elbowPositions1) = self.calculateIntermediatePositions(times, cobraAssociations[0])
+            (fiberPositions2, elbowPositions2) = self.calculateIntermediatePositions(times, cobraAssociations[1])
+            timeDistances = self.bench.distancesBetweenLineSegments(
+                fiberPositions1, elbowPositions1, fiberPositions2, elbowPositions2)
+
+            # Update the closest approaches if they are closer than before
+            minIndices = np.argmin(timeDistances, axis=1)
+            minDistances = timeDistances[np.arange(len(minIndices)), minIndices]
+            closer = minDistances < closestDistances
+            closestSteps[closer] = times[closer, minIndices[closer]]
+            closestDistances[closer] = minDistances[closer]
+            halfWidth /= nSubSteps
+
+        return closestSteps, closestDistances
+
+    def calculateIntermediatePositions(self, times, cobraIndices):
+        """Calculates the cobra fiber and elbow positions at intermediate
+        times between the trajectory steps.
+
+        The motor steps are interpolated linearly between trajectory steps
+        and converted to rotation angles using the motor maps. The motor steps
+        at the trajectory steps are evaluated from the trajectory keyframes,
+        so this also works with compact trajectories.
 
-        # Reshape the distances array
-        distances = distances.reshape((len(cobraAssociations[0]), self.nSteps))
+        Parameters
+        ----------
+        times: object
+            A 2D numpy array with the times in units of trajectory steps. Its
+            first dimension should match the cobra indices array.
+        cobraIndices: object
+            A numpy array with the cobra indices.
 
-        # Return the cobra association collisions along the trajectory and the
-        # distances array
-        return distances < (linkRadius[cobraAssociations[0], np.newaxis] + linkRadius[cobraAssociations[1], np.newaxis]), distances
+        Returns
+        -------
+        tuple
+            A python tuple with the fiber and elbow positions at the given
+            times.
+
+        """
+        # Extract some useful information
+        cobras = self.bench.cobras
+        motorMaps = cobras.motorMaps
+        posThtMovement = self.movementDirections[0, cobraIndices]
+        posPhiMovement = self.movementDirections[1, cobraIndices]
+
+        # Evaluate the motor steps at the trajectory steps that bracket the
+        # given times, with different trajectory steps for each cobra
+        lowerSteps = np.clip(np.floor(times).astype(np.intp), 0, self.nSteps - 2)
+        fractions = times - lowerSteps
+        ((thtSteps, _, _), (phiSteps, _, _)) = self.evaluateMotorSteps(
+            np.hstack((lowerSteps, lowerSteps + 1)), cobraIndices)
+
+        # Interpolate the motor steps at the given times
+        nTimes = times.shape[1]
+        thtSteps = (1 - fractions) * thtSteps[:, :nTimes] + fractions * thtSteps[:, nTimes:]
+        phiSteps = (1 - fractions) * phiSteps[:, :nTimes] + fractions * phiSteps[:, nTimes:]
+
+        # Convert the motor steps to theta and phi angles
+        startTht = self.startAngles[0, cobraIndices]
+        thtSigns = self.thtSigns[cobraIndices]
+        tht = startTht[:, np.newaxis] + thtSigns[:, np.newaxis] * motorMaps.calculateAngleOffsets(
+            thtSteps, posThtMovement, indices=cobraIndices)
+        phi = motorMaps.calculateAngleOffsets(phiSteps, posPhiMovement, useThtMaps=False, indices=cobraIndices)
+        phi = np.where(posPhiMovement[:, np.newaxis], phi - np.pi, -phi)
+
+        # Calculate the elbow and fiber positions
+        rows = cobraIndices[:, np.newaxis]
+        elbowPositions = cobras.centers[rows] + cobras.L1[rows] * np.exp(1j * tht)
+        fiberPositions = elbowPositions + cobras.L2[rows] * np.exp(1j * (tht + phi))
+
+        return fiberPositions, elbowPositions
 
     def addToFigure(self, colors=np.array([0.4, 0.4, 0.4, 1.0]), indices=None, paintFootprints=False, footprintColors=np.array([0.0, 0.0, 1.0, 0.05])):
         """Draws the cobra trajectories on top of an existing figure.
@@ -218,8 +777,7 @@ class TrajectoryGroup(AttributePrinter):
 
         """
         # Extract some useful information
-        elbowPositions = self.elbowPositions
-        fiberPositions = self.fiberPositions
+        (fiberPositions, elbowPositions) = self.getPositions()
         linkRadius = self.bench.cobras.linkRadius
 
         # Select a subset of the trajectories if necessary
@@ -286,8 +844,7 @@ class TrajectoryGroup(AttributePrinter):
 
         """
         # Extract some useful information
-        elbowPositions = self.elbowPositions
-        fiberPositions = self.fiberPositions
+        (fiberPositions, elbowPositions) = self.getPositions()
         cobraCenters = self.bench.cobras.centers
         linkRadius = self.bench.cobras.linkRadius
 
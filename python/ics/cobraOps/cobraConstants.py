@@ -46,6 +46,14 @@ MOTOR1_STEP_SIZE = 0.06
 MOTOR2_STEP_SIZE = 0.12
 """The default stage 2 motor step size in degrees."""
 
+STEP_TABLES_MIN_BIN_WIDTH = 0.5
+"""The minimum bin width in motor steps of the motor maps inverse step
+tables. Maps that would need smaller bins are searched instead."""
+
+STEP_TABLES_MAX_SIZE = 16777216
+"""The maximum total number of bins in the motor maps inverse step tables for
+each motor. Maps that don't fit are searched instead."""
+
 MOTOR_NOISE_ALPHA = 0.07
 """The default cobras motor noise normalization factor."""
 
@@ -58,6 +66,14 @@ BLACK_DOT_RELATIVE_POSITION = 0 + 2.35j
 BLACK_DOT_RADIUS = 1.375
 """The default cobra back dot radius in mm."""
 
+COLLISION_DETECTION_MEMORY = 268435456
+"""The default memory budget in bytes used to detect collisions along the
+cobra trajectories (256 MB)."""
+
+COLLISION_REDUCTION_MEMORY = 67108864
+"""The default memory budget in bytes used to reduce the cobra association
+distances in the collision simulator passes (64 MB)."""
+
 NULL_TARGET_INDEX = -1
 """Integer value used to indicate the index of a null target."""
 
@@ -69,3 +85,15 @@ NULL_TARGET_ID = "NULL"
 
 NULL_TARGET_PRIORITY = -1
 """Float value used to indicate the priority of a null target."""
+
+NEVER_COLLIDING_ASSOCIATION = 0
+"""Integer value used to indicate a cobra association that can never
+collide."""
+
+POSSIBLY_COLLIDING_ASSOCIATION = 1
+"""Integer value used to indicate a cobra association that can collide only
+for some link orientations."""
+
+OFTEN_COLLIDING_ASSOCIATION = 2
+"""Integer value used to indicate a cobra association where the cobra fibers
+can reach the same region."""
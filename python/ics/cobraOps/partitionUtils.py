@@ -0,0 +1,431 @@
+"""
+
+Some utility methods to split the PFI bench in spatial partitions that can be
+processed in parallel.
+
+Each partition contains the cobras that it owns and a halo with the direct
+neighbors of those cobras that belong to other partitions. The halo cobras are
+included in the partition calculations, so the owned cobras see all their
+neighbors, but only the results of the owned cobras are used. The partition
+results are then merged in a deterministic pass that solves the conflicts
+between cobras on the partition boundaries.
+
+Consult the following papers for more detailed information:
+
+  https://ui.adsabs.harvard.edu/abs/2012SPIE.8450E..17F
+  https://ui.adsabs.harvard.edu/abs/2014SPIE.9151E..1YF
+  https://ui.adsabs.harvard.edu/abs/2016arXiv160801075T
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10707E..28Y
+  https://ui.adsabs.harvard.edu/abs/2018SPIE10702E..1CT
+
+"""
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.spatial import KDTree
+
+from .cobraConstants import NULL_TARGET_INDEX
+from .CollisionSimulator import CollisionSimulator
+from .TrajectoryGroup import TrajectoryGroup
+
+
+def calculatePartitions(bench, nPartitions):
+    """Splits the bench cobras in angular wedges around the bench center.
+
+    The wedges contain the same number of cobras. For the full PFI bench and
+    three partitions, the wedges follow approximately the three PFI sectors.
+
+    Parameters
+    ----------
+    bench: object
+        The PFI bench instance.
+    nPartitions: int
+        The number of partitions.
+
+    Returns
+    -------
+    object
+        An integer numpy array with the partition index of each cobra.
+
+    """
+    # Sort the cobras by their angle around the bench center
+    angles = np.angle(bench.cobras.centers - bench.center)
+    sortedIndices = np.argsort(angles, kind="stable")
+
+    # Assign the same number of consecutive cobras to each partition
+    partitionIds = np.empty(bench.cobras.nCobras, dtype="int")
+    partitionIds[sortedIndices] = (
+        np.arange(bench.cobras.nCobras) * nPartitions) // bench.cobras.nCobras
+
+    return partitionIds
+
+
+def getPartitionCobras(bench, partitionIds, partition):
+    """Returns the cobras that are part of a given partition, including its
+    halo cobras.
+
+    Parameters
+    ----------
+    bench: object
+        The PFI bench instance.
+    partitionIds: object
+        An integer numpy array with the partition index of each cobra.
+    partition: int
+        The partition index.
+
+    Returns
+    -------
+    tuple
+        A python tuple with a sorted numpy array with the indices of the
+        partition cobras and a boolean numpy array indicating which of those
+        cobras are owned by the partition.
+
+    """
+    # Get the cobras owned by the partition
+    (ownedCobras,) = np.where(partitionIds == partition)
+
+    # Add the direct neighbors of the owned cobras
+    cobraIndices = np.union1d(ownedCobras, bench.getCobrasNeighbors(ownedCobras))
+
+    return cobraIndices, partitionIds[cobraIndices] == partition
+
+
+def selectTargetsInPartitions(bench, targets, selectorClass, nPartitions,
+                              maxWorkers=None, maximumDistance=np.Inf,
+                              solveCollisions=True):
+    """Runs the target selection process in separate bench partitions.
+
+    Each partition runs the selector with the targets that its cobras can
+    reach. The results are merged using the following deterministic rules:
+        - Targets assigned to cobras in more than one partition are kept by
+        the cobra with the lower index. The other cobras are assigned their
+        first accessible target that is still free, if any.
+        - End-point collisions are then solved for the cobras that lost their
+        targets and the cobras on the partition boundaries, which fixes the
+        collisions between cobras in different partitions. The collisions
+        between cobras inside a partition were already solved by the
+        partition selector.
+
+    Parameters
+    ----------
+    bench: object
+        The PFI bench instance.
+    targets: object
+        The TargetGroup instance.
+    selectorClass: object
+        The TargetSelector subclass to use, for example
+        DistanceTargetSelector.
+    nPartitions: int
+        The number of partitions.
+    maxWorkers: int, optional
+        The maximum number of processes to use. If it is set to 1, all the
+        partitions will be processed in the current process. If it is set to
+        None, the number of processors in the machine will be used. Default
+        is None.
+    maximumDistance: float, optional
+        The maximum radial distance allowed between the targets and the cobra
+        centers. Default is no limit (the maximum radius that the cobra can
+        reach).
+    solveCollisions: bool, optional
+        If True, the selector will try to solve cobra end-point collisions
+        assigning them alternative targets. Default is True.
+
+    Returns
+    -------
+    object
+        A selector instance for the whole bench with the merged accessible
+        and assigned targets.
+
+    """
+    # Construct a KD tree with the valid target positions
+    (validTargets,) = np.where(targets.notNull)
+    validPositions = targets.positions[validTargets]
+    kdTree = KDTree(np.column_stack((validPositions.real, validPositions.imag)))
+
+    # Prepare the arguments for each partition
+    partitionIds = calculatePartitions(bench, nPartitions)
+    partitions = []
+
+    for partition in range(nPartitions):
+        # Get the partition cobras
+        (cobraIndices, isOwned) = getPartitionCobras(
+            bench, partitionIds, partition)
+
+        # Get the targets that the partition cobras could reach
+        centers = bench.cobras.centers[cobraIndices]
+        nearbyTargets = kdTree.query_ball_point(
+            np.column_stack((centers.real, centers.imag)),
+            np.max(bench.cobras.rMax[cobraIndices]), return_sorted=False)
+        targetIndices = validTargets[np.unique(np.concatenate(
+            [np.array(t, dtype="int") for t in nearbyTargets]))]
+
+        partitions.append((cobraIndices, isOwned, targetIndices))
+
+    # Run the target selection in each partition
+    results = _mapPartitions(_runTargetSelection, [
+        (bench.select(cobraIndices), targets.select(targetIndices),
+         selectorClass, maximumDistance, solveCollisions)
+        for cobraIndices, _, targetIndices in partitions], maxWorkers)
+
+    # Create the merged accessible target arrays
+    nCobras = bench.cobras.nCobras
+    maxTargetsPerCobra = max(
+        [accessibleIndices.shape[1] for _, accessibleIndices, _, _ in results])
+    arrayShape = (nCobras, maxTargetsPerCobra)
+    accessibleTargetIndices = np.full(arrayShape, NULL_TARGET_INDEX)
+    accessibleTargetDistances = np.zeros(arrayShape)
+    accessibleTargetElbows = np.zeros(arrayShape, dtype="complex")
+    assignedTargetIndices = np.full(nCobras, NULL_TARGET_INDEX)
+
+    # Fill the arrays with the results of the cobras owned by each partition,
+    # transforming the partition target indices to the global ones
+    for (cobraIndices, isOwned, targetIndices), result in zip(
+            partitions, results):
+        (assignedIndices, accessibleIndices, accessibleDistances,
+         accessibleElbows) = result
+        ownedCobras = cobraIndices[isOwned]
+        width = accessibleIndices.shape[1]
+        accessibleIndices = accessibleIndices[isOwned]
+        isNull = accessibleIndices == NULL_TARGET_INDEX
+        accessibleTargetIndices[ownedCobras, :width] = np.where(
+            isNull, NULL_TARGET_INDEX, targetIndices[accessibleIndices])
+        accessibleTargetDistances[ownedCobras, :width] = accessibleDistances[
+            isOwned]
+        accessibleTargetElbows[ownedCobras, :width] = accessibleElbows[
+            isOwned]
+        assignedIndices = assignedIndices[isOwned]
+        isNull = assignedIndices == NULL_TARGET_INDEX
+        assignedTargetIndices[ownedCobras] = np.where(
+            isNull, NULL_TARGET_INDEX, targetIndices[assignedIndices])
+
+    # Free the targets that were assigned to more than one cobra, except for
+    # the cobra with the lower index
+    (usedCobras,) = np.where(assignedTargetIndices != NULL_TARGET_INDEX)
+    (_, firstUses) = np.unique(
+        assignedTargetIndices[usedCobras], return_index=True)
+    repeatedUses = np.full(len(usedCobras), True)
+    repeatedUses[firstUses] = False
+    conflictCobras = usedCobras[repeatedUses]
+    assignedTargetIndices[conflictCobras] = NULL_TARGET_INDEX
+
+    # Assign the first free accessible target to the cobras that lost their
+    # targets
+    freeTargets = np.full(targets.nTargets, True)
+    freeTargets[assignedTargetIndices[
+        assignedTargetIndices != NULL_TARGET_INDEX]] = False
+
+    for c in conflictCobras:
+        accessibleIndices = accessibleTargetIndices[c]
+        accessibleIndices = accessibleIndices[
+            accessibleIndices != NULL_TARGET_INDEX]
+        accessibleIndices = accessibleIndices[freeTargets[accessibleIndices]]
+
+        if len(accessibleIndices) > 0:
+            assignedTargetIndices[c] = accessibleIndices[0]
+            freeTargets[accessibleIndices[0]] = False
+
+    # Create the selector for the whole bench
+    selector = selectorClass(bench, targets)
+    selector.accessibleTargetIndices = accessibleTargetIndices
+    selector.accessibleTargetDistances = accessibleTargetDistances
+    selector.accessibleTargetElbows = accessibleTargetElbows
+    selector.assignedTargetIndices = assignedTargetIndices
+
+    # Solve the end-point collisions of the cobras that lost their targets
+    # and the cobras that have neighbors in other partitions
+    if solveCollisions:
+        cobraAssociations = bench.cobraAssociations
+        boundaryAssociations = (partitionIds[cobraAssociations[0]] !=
+                                partitionIds[cobraAssociations[1]])
+        selector.solveEndPointCollisions(np.union1d(
+            conflictCobras, cobraAssociations[:, boundaryAssociations]))
+
+    return selector
+
+
+def simulateCollisionsInPartitions(bench, targets, nPartitions,
+                                   maxWorkers=None, solveCollisions=True,
+                                   trajectorySteps=200,
+                                   trajectoryStepWidth=50):
+    """Runs the collision simulator in separate bench partitions.
+
+    Each partition calculates the final fiber positions, the movement
+    directions and strategies, and the trajectories of its cobras, solving
+    the trajectory collisions if requested. The results of the owned cobras,
+    including their trajectory keyframes and motor steps, are then merged,
+    and the trajectory collisions are detected again for the whole bench,
+    which includes the collisions between cobras in different partitions.
+    If the collisions should be solved, a deterministic boundary pass runs
+    the collision solver only on the associations between cobras in
+    different partitions.
+
+    Parameters
+    ----------
+    bench: object
+        The PFI bench instance.
+    targets: object
+        The target group instance with one target per cobra, for example
+        obtained with the getSelectedTargets method of a target selector.
+    nPartitions: int
+        The number of partitions.
+    maxWorkers: int, optional
+        The maximum number of processes to use. If it is set to 1, all the
+        partitions will be processed in the current process. If it is set to
+        None, the number of processors in the machine will be used. Default
+        is None.
+    solveCollisions: bool, optional
+        If True, the simulator will try to solve trajectory collisions,
+        changing the movement directions and strategies of the affected
+        cobras. Default is True.
+    trajectorySteps: int, optional
+        The total number of steps in the cobra trajectories. Default is 200.
+    trajectoryStepWidth: int, optional
+        The trajectory step width in units of motor steps. Default is 50.
+
+    Returns
+    -------
+    object
+        A collision simulator instance for the whole bench with the merged
+        results.
+
+    """
+    # Prepare the arguments for each partition
+    partitionIds = calculatePartitions(bench, nPartitions)
+    partitions = [getPartitionCobras(bench, partitionIds, partition)
+                  for partition in range(nPartitions)]
+
+    # Run the collision simulator in each partition
+    results = _mapPartitions(_runCollisionSimulation, [
+        (bench.select(cobraIndices), targets.select(cobraIndices),
+         solveCollisions, trajectorySteps, trajectoryStepWidth)
+        for cobraIndices, _ in partitions], maxWorkers)
+
+    # Create the collision simulator for the whole bench
+    simulator = CollisionSimulator(
+        bench, targets, trajectorySteps, trajectoryStepWidth)
+    nCobras = bench.cobras.nCobras
+    simulator.finalFiberPositions = np.empty(nCobras, dtype="complex")
+    simulator.posSteps = np.empty(nCobras, dtype="int")
+    simulator.negSteps = np.empty(nCobras, dtype="int")
+    simulator.movementDirections = np.empty((2, nCobras), dtype="bool")
+    simulator.movementStrategies = np.empty((2, nCobras), dtype="bool")
+    fiberPositions = np.empty((nCobras, trajectorySteps), dtype="complex")
+    elbowPositions = np.empty((nCobras, trajectorySteps), dtype="complex")
+    motorSteps = np.empty((2, nCobras, trajectorySteps))
+    keyframes = (np.empty((2, nCobras)), np.empty((2, nCobras)),
+                 np.empty((2, nCobras, 2)), np.empty(nCobras, dtype="int8"))
+
+    # Fill the arrays with the results of the cobras owned by each partition
+    for (cobraIndices, isOwned), result in zip(partitions, results):
+        ownedCobras = cobraIndices[isOwned]
+        simulator.finalFiberPositions[ownedCobras] = result[0][isOwned]
+        simulator.posSteps[ownedCobras] = result[1][isOwned]
+        simulator.negSteps[ownedCobras] = result[2][isOwned]
+        simulator.movementDirections[:, ownedCobras] = result[3][:, isOwned]
+        simulator.movementStrategies[:, ownedCobras] = result[4][:, isOwned]
+        fiberPositions[ownedCobras] = result[5][isOwned]
+        elbowPositions[ownedCobras] = result[6][isOwned]
+        motorSteps[:, ownedCobras] = result[7][:, isOwned]
+        keyframes[0][:, ownedCobras] = result[8][0][:, isOwned]
+        keyframes[1][:, ownedCobras] = result[8][1][:, isOwned]
+        keyframes[2][:, ownedCobras] = result[8][2][:, isOwned]
+        keyframes[3][ownedCobras] = result[8][3][isOwned]
+
+    # Create the merged trajectories
+    simulator.trajectories = TrajectoryGroup(
+        nSteps=trajectorySteps, stepWidth=trajectoryStepWidth, bench=bench,
+        finalFiberPositions=simulator.finalFiberPositions,
+        movementDirections=simulator.movementDirections,
+        movementStrategies=simulator.movementStrategies,
+        fiberPositions=fiberPositions, elbowPositions=elbowPositions,
+        motorSteps=motorSteps, keyframes=keyframes)
+
+    # Detect the trajectory collisions for the whole bench
+    simulator.detectTrajectoryCollisions()
+
+    # Solve the collisions between cobras in different partitions, using the
+    # same sequence of solver passes as the collision simulator
+    if solveCollisions:
+        cobraAssociations = bench.cobraAssociations
+        (boundaryAssociations,) = np.where(
+            partitionIds[cobraAssociations[0]] !=
+            partitionIds[cobraAssociations[1]])
+
+        for selectLowerIndices in [True, False, True, False]:
+            simulator.solveTrajectoryCollisions(
+                selectLowerIndices, boundaryAssociations)
+
+    return simulator
+
+
+def _mapPartitions(function, argumentsList, maxWorkers):
+    """Applies a function to the arguments of each partition, using a process
+    pool if necessary.
+
+    Parameters
+    ----------
+    function: object
+        The function to apply. It should be defined at the module level.
+    argumentsList: list
+        A list with the arguments tuple for each partition.
+    maxWorkers: int
+        The maximum number of processes to use.
+
+    Returns
+    -------
+    list
+        A list with the function results for each partition.
+
+    """
+    if maxWorkers == 1 or len(argumentsList) == 1:
+        return [function(*arguments) for arguments in argumentsList]
+
+    with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+        return list(executor.map(function, *zip(*argumentsList)))
+
+
+def _runTargetSelection(bench, targets, selectorClass, maximumDistance,
+                        solveCollisions):
+    """Runs the target selection process for a partition bench.
+
+    Returns
+    -------
+    tuple
+        A python tuple with the assigned target indices and the accessible
+        target indices, distances and elbow positions.
+
+    """
+    selector = selectorClass(bench, targets)
+    selector.run(maximumDistance=maximumDistance,
+                 solveCollisions=solveCollisions)
+
+    return (selector.assignedTargetIndices, selector.accessibleTargetIndices,
+            selector.accessibleTargetDistances,
+            selector.accessibleTargetElbows)
+
+
+def _runCollisionSimulation(bench, targets, solveCollisions, trajectorySteps,
+                            trajectoryStepWidth):
+    """Runs the collision simulator for a partition bench.
+
+    Returns
+    -------
+    tuple
+        A python tuple with the final fiber positions, the positive and
+        negative movement steps, the movement directions and strategies, the
+        fiber and elbow positions and the motor steps along the trajectories,
+        and the trajectory keyframes.
+
+    """
+    simulator = CollisionSimulator(
+        bench, targets, trajectorySteps, trajectoryStepWidth)
+    simulator.run(solveCollisions=solveCollisions)
+    trajectories = simulator.trajectories
+
+    return (simulator.finalFiberPositions, simulator.posSteps,
+            simulator.negSteps, simulator.movementDirections,
+            simulator.movementStrategies,
+            trajectories.fiberPositions, trajectories.elbowPositions,
+            trajectories.motorSteps,
+            (trajectories.startAngles, trajectories.finalAngles,
+             trajectories.stepLimits, trajectories.thtSigns))
@@ -46,12 +46,15 @@ endCollisionsArray = np.zeros(len(maxDistanceArray))
 # Load the cobras calibration product
 calibrationProduct = CobrasCalibrationProduct("updatedMotorMapsFromThisRun2.xml")
 
+# Create the bench instance
+bench = Bench(layout="full", calibrationProduct=calibrationProduct)
+
 # Calculate the collisions for each maxDist-density combination
 for i in range(len(maxDistanceArray)):
     print("TargetDensity", targetDensityArray[i], "MaxDistance", maxDistanceArray[i])
 
-    # Create the bench instance
-    bench = Bench(layout="full", calibrationProduct=calibrationProduct)
+    # Draw new random cobra properties for the bench
+    bench.resample()
 
     # Create a random sample of targets
     targets = targetUtils.generateRandomTargets(targetDensityArray[i], bench)
@@ -0,0 +1,74 @@
+"""
+
+Compares the speed of the vectorized MotorMapGroup.calculateSteps method with
+the equivalent calculation done with one np.interp call per cobra.
+
+"""
+
+import timeit
+import numpy as np
+
+from ics.cobraOps.Bench import Bench
+from ics.cobraOps.CobrasCalibrationProduct import CobrasCalibrationProduct
+
+
+def calculateStepsWithLoop(motorMaps, deltaTht, startPhi, deltaPhi):
+    """Calculates the total number of motor steps calling np.interp for each
+    cobra.
+
+    """
+    # Get the integrated step maps for each movement direction
+    thtSteps = motorMaps.negThtSteps.copy()
+    thtSteps[deltaTht >= 0] = motorMaps.posThtSteps[deltaTht >= 0]
+    phiSteps = motorMaps.negPhiSteps.copy()
+    phiSteps[deltaPhi >= 0] = motorMaps.posPhiSteps[deltaPhi >= 0]
+
+    # Calculate the theta and phi offsets relative to the home positions
+    thtOffset = np.zeros(motorMaps.nMaps)
+    phiOffset = np.abs(startPhi)
+    phiOffset[deltaPhi >= 0] = np.pi + startPhi[deltaPhi >= 0]
+
+    # Calculate the total number of motor steps for each angle
+    nThtSteps = np.empty(motorMaps.nMaps)
+    nPhiSteps = np.empty(motorMaps.nMaps)
+
+    for c in range(motorMaps.nMaps):
+        stepsRange = np.interp(
+            [thtOffset[c], thtOffset[c] + np.abs(deltaTht[c])],
+            motorMaps.thtOffsets[c], thtSteps[c])
+        nThtSteps[c] = stepsRange[1] - stepsRange[0]
+        stepsRange = np.interp(
+            [phiOffset[c], phiOffset[c] + np.abs(deltaPhi[c])],
+            motorMaps.phiOffsets[c], phiSteps[c])
+        nPhiSteps[c] = stepsRange[1] - stepsRange[0]
+
+    return (nThtSteps, nPhiSteps)
+
+
+# Create the bench instance using the calibration product motor maps
+calibrationProduct = CobrasCalibrationProduct(
+    "updatedMotorMapsFromThisRun2.xml")
+bench = Bench(layout="full", calibrationProduct=calibrationProduct)
+motorMaps = bench.cobras.motorMaps
+print("Number of cobras:", motorMaps.nMaps)
+
+# Generate some random cobra movements
+deltaTht = np.random.uniform(-2 * np.pi, 2 * np.pi, motorMaps.nMaps)
+startPhi = np.random.uniform(-np.pi, 0, motorMaps.nMaps)
+deltaPhi = np.random.uniform(-np.pi / 2, np.pi / 2, motorMaps.nMaps)
+
+# Check that both methods produce exactly the same results
+loopResults = calculateStepsWithLoop(motorMaps, deltaTht, startPhi, deltaPhi)
+vectorizedResults = motorMaps.calculateSteps(deltaTht, startPhi, deltaPhi)
+print("Identical results:", all(np.array_equal(a, b) for a, b in zip(
+    loopResults, vectorizedResults)))
+
+# Measure the execution times
+repetitions = 20
+loopTime = timeit.timeit(lambda: calculateStepsWithLoop(
+    motorMaps, deltaTht, startPhi, deltaPhi), number=repetitions) / repetitions
+vectorizedTime = timeit.timeit(lambda: motorMaps.calculateSteps(
+    deltaTht, startPhi, deltaPhi), number=repetitions) / repetitions
+print("np.interp loop:   %.2f ms" % (1e3 * loopTime))
+print("Vectorized:       %.2f ms" % (1e3 * vectorizedTime))
+print("Speedup:          %.1fx" % (loopTime / vectorizedTime))
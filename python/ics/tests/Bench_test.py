@@ -0,0 +1,466 @@
+"""
+
+Collection of unit tests for the Bench class.
+
+"""
+
+import os
+import pytest
+import itertools
+import tracemalloc
+import numpy as np
+
+from ics.cobraOps.Bench import Bench
+from ics.cobraOps.CobrasCalibrationProduct import CobrasCalibrationProduct
+from ics.cobraOps.cobraConstants import NEVER_COLLIDING_ASSOCIATION
+from ics.cobraOps.cobraConstants import OFTEN_COLLIDING_ASSOCIATION
+
+
+class TestBench():
+    """A collection of tests for the Bench class.
+
+    """
+
+    @pytest.mark.parametrize("layout", ["hex", "line", "rails", "full"])
+    def test_calculateCobraAssociations_method(self, layout):
+        # Create the bench
+        bench = Bench(layout=layout)
+
+        # Calculate the associations using the full distance matrix and the KD
+        # tree
+        bench.calculateCobraAssociations(useKDTree=False)
+        denseAssociations = bench.cobraAssociations.copy()
+        bench.calculateCobraAssociations(useKDTree=True)
+
+        # Check that both methods give exactly the same associations
+        assert np.array_equal(bench.cobraAssociations, denseAssociations)
+
+        # Check that the associations are unique and sorted
+        assert np.all(bench.cobraAssociations[0] < bench.cobraAssociations[1])
+        assert np.all(np.diff(bench.cobraAssociations[0]) >= 0)
+
+    def test_calculateCobraAssociations_method_random_centers(self):
+        # Create a bench with randomly distributed cobras
+        cobraCenters = 100 * np.random.random(500) + 100j * np.random.random(500)
+        bench = Bench(cobraCenters)
+
+        # Check that both methods give exactly the same associations
+        kdTreeAssociations = bench.cobraAssociations.copy()
+        bench.calculateCobraAssociations(useKDTree=False)
+        assert np.array_equal(bench.cobraAssociations, kdTreeAssociations)
+
+    def test_calculateCobraAssociations_method_single_cobra(self):
+        # Create a bench with a single cobra
+        bench = Bench(np.array([0], dtype="complex"))
+
+        # Check that there are no associations
+        assert bench.cobraAssociations.shape == (2, 0)
+
+    def test_getCobraNeighbors_method(self, bench):
+        # Check the neighbors of some cobras against a brute force search
+        cobraAssociations = bench.nearbyCobraAssociations
+
+        for cobraIndex in [0, 1, 100, bench.cobras.nCobras - 1]:
+            expectedNeighbors = np.concatenate((
+                cobraAssociations[1][cobraAssociations[0] == cobraIndex],
+                cobraAssociations[0][cobraAssociations[1] == cobraIndex]))
+            assert np.array_equal(
+                bench.getCobraNeighbors(cobraIndex), expectedNeighbors)
+
+    def test_getCobrasNeighbors_method(self, bench):
+        # Check the neighbors of a group of cobras against a brute force search
+        cobraAssociations = bench.nearbyCobraAssociations
+        cobraIndices = np.array([5, 17, 18, 1000, 2000])
+        expectedNeighbors = np.unique(np.concatenate((
+            cobraAssociations[1][np.in1d(cobraAssociations[0], cobraIndices)],
+            cobraAssociations[0][np.in1d(cobraAssociations[1], cobraIndices)])))
+        assert np.array_equal(
+            bench.getCobrasNeighbors(cobraIndices), expectedNeighbors)
+
+        # Check that we get the same result using a boolean mask
+        cobraMask = np.full(bench.cobras.nCobras, False)
+        cobraMask[cobraIndices] = True
+        assert np.array_equal(
+            bench.getCobrasNeighbors(cobraMask), expectedNeighbors)
+
+    def test_getCobrasAssociations_method(self, bench):
+        # Check the associations of a group of cobras against a brute force
+        # search
+        cobraAssociations = bench.cobraAssociations
+        cobraIndices = np.array([5, 17, 18, 1000, 2000])
+        (expectedAssociations,) = np.where(np.logical_or(
+            np.in1d(cobraAssociations[0], cobraIndices),
+            np.in1d(cobraAssociations[1], cobraIndices)))
+        assert np.array_equal(
+            bench.getCobrasAssociations(cobraIndices), expectedAssociations)
+
+        # Check that we get an empty array if no cobras are given
+        assert len(bench.getCobrasAssociations(np.array([], dtype="int"))) == 0
+
+    def test_distancesBetweenLineSegments_method(self):
+        # Create some random line segments, including some zero length ones
+        nSegments = 10000
+        startPoints1 = np.random.randn(nSegments) + 1j * np.random.randn(nSegments)
+        endPoints1 = np.random.randn(nSegments) + 1j * np.random.randn(nSegments)
+        startPoints2 = np.random.randn(nSegments) + 1j * np.random.randn(nSegments)
+        endPoints2 = np.random.randn(nSegments) + 1j * np.random.randn(nSegments)
+        endPoints1[:10] = startPoints1[:10]
+        endPoints2[5:15] = startPoints2[5:15]
+
+        # Calculate the expected distances using the point to segment distances
+        expectedDistances = np.min((
+            Bench.distancesToLineSegments(startPoints1, startPoints2, endPoints2),
+            Bench.distancesToLineSegments(endPoints1, startPoints2, endPoints2),
+            Bench.distancesToLineSegments(startPoints2, startPoints1, endPoints1),
+            Bench.distancesToLineSegments(endPoints2, startPoints1, endPoints1)),
+            axis=0)
+
+        # Check that we get the same distances
+        distances = Bench.distancesBetweenLineSegments(
+            startPoints1, endPoints1, startPoints2, endPoints2)
+        assert np.all(np.abs(distances - expectedDistances) < 1e-12)
+
+        # Check the squared distances and the output buffer
+        out = np.empty(nSegments)
+        distancesSq = Bench.distancesBetweenLineSegments(
+            startPoints1, endPoints1, startPoints2, endPoints2, squared=True,
+            out=out)
+        assert distancesSq is out
+        assert np.all(np.abs(distancesSq - expectedDistances ** 2) < 1e-12)
+
+        # Check the collisions
+        collisions = Bench.collisionsBetweenLineSegments(
+            startPoints1, endPoints1, startPoints2, endPoints2, 0.5)
+        assert np.array_equal(collisions, expectedDistances < 0.5)
+
+    def test_calculateCandidatePositionsCollisions_method(self, bench):
+        # Place the cobra fibers at random positions inside their patrol areas
+        cobras = bench.cobras
+        radii = cobras.rMin + (cobras.rMax - cobras.rMin) * np.random.random(
+            cobras.nCobras)
+        angles = 2 * np.pi * np.random.random(cobras.nCobras)
+        fiberPositions = cobras.centers + radii * np.exp(1j * angles)
+
+        # Calculate several rotated candidate positions for some cobras
+        cobraIndices = np.array([0, 17, 18, 1000])
+        rotationAngles = np.linspace(0, 2 * np.pi, 7)[1:-1]
+        centers = cobras.centers[cobraIndices, np.newaxis]
+        candidatePositions = centers + (
+            fiberPositions[cobraIndices, np.newaxis] - centers) * np.exp(
+                1j * rotationAngles)
+        (nCollisions, minClearances) = \
+            bench.calculateCandidatePositionsCollisions(
+                cobraIndices, candidatePositions, fiberPositions)
+        assert nCollisions.shape == candidatePositions.shape
+        assert minClearances.shape == candidatePositions.shape
+
+        # Check the results against the single cobra calculations
+        for i, c in enumerate(cobraIndices):
+            for j, candidatePosition in enumerate(candidatePositions[i]):
+                positions = fiberPositions.copy()
+                positions[c] = candidatePosition
+                assert nCollisions[i, j] == bench.getCollisionsForCobra(
+                    c, positions)
+
+        # Check that the number of collisions is consistent with the
+        # clearances
+        assert np.all((nCollisions > 0) == (minClearances < 0))
+
+        # Check that we get the same results for a single cobra
+        (singleCollisions, singleClearances) = \
+            bench.calculateCandidatePositionsCollisions(
+                cobraIndices[1], candidatePositions[1], fiberPositions)
+        assert np.array_equal(singleCollisions[0], nCollisions[1])
+        assert np.array_equal(singleClearances[0], minClearances[1])
+
+    def test_resample_method(self, bench):
+        # Save some of the initial bench properties
+        cobraAssociations = bench.cobraAssociations.copy()
+        tht0 = bench.cobras.tht0.copy()
+
+        # Check that the home angles change, but not the associations
+        bench.resample(np.random.default_rng(1))
+        assert not np.array_equal(bench.cobras.tht0, tht0)
+        assert np.array_equal(bench.cobraAssociations, cobraAssociations)
+
+        # Check that the same random generator seed gives the same properties
+        home0 = bench.cobras.home0.copy()
+        bench.resample(np.random.default_rng(1))
+        assert np.array_equal(bench.cobras.home0, home0)
+
+    def test_resample_method_calibration_product(self):
+        # Use a calibration product with a different number of cobras
+        calibrationProduct = CobrasCalibrationProduct(os.path.join(
+            os.path.dirname(__file__), "..", "demos",
+            "updatedMotorMapsFromThisRun2.xml"))
+        bench = Bench(layout="full", calibrationProduct=calibrationProduct)
+
+        # Check that the resampled bench is consistent with a new bench
+        for seed in range(3):
+            bench.resample(np.random.default_rng(seed))
+            newBench = Bench(layout="full")
+            newBench.cobras.useCalibrationProduct(
+                calibrationProduct, rng=np.random.default_rng(seed))
+            newBench.calculateCenterAndRadius()
+            newBench.calculateCobraAssociations()
+
+            assert np.array_equal(bench.cobras.hasProblem,
+                                  newBench.cobras.hasProblem)
+            assert np.array_equal(bench.cobras.home0, newBench.cobras.home0)
+            assert np.array_equal(bench.cobras.motorMaps.posThtSteps,
+                                  newBench.cobras.motorMaps.posThtSteps)
+            assert bench.center == newBench.center
+            assert bench.radius == newBench.radius
+            assert np.array_equal(bench.cobraAssociations,
+                                  newBench.cobraAssociations)
+
+    def test_calculateAssociationDistances_method(self, bench):
+        # Place the cobra fibers at random positions inside their patrol
+        # areas, for several steps
+        cobras = bench.cobras
+        nSteps = 10
+        radii = cobras.rMin[:, np.newaxis] + (
+            cobras.rMax - cobras.rMin)[:, np.newaxis] * np.random.random(
+                (cobras.nCobras, nSteps))
+        angles = 2 * np.pi * np.random.random((cobras.nCobras, nSteps))
+        fiberPositions = cobras.centers[:, np.newaxis] + radii * np.exp(
+            1j * angles)
+        elbowPositions = cobras.calculateMultipleElbowPositions(
+            fiberPositions.ravel(), np.repeat(np.arange(cobras.nCobras), nSteps),
+            np.arange(fiberPositions.size)).reshape(fiberPositions.shape)
+
+        # Calculate the distances with and without the broad phase. The
+        # distances should be exact by default
+        (distances, minimumSeparations, narrowPhase) = \
+            bench.calculateAssociationDistances(
+                fiberPositions, elbowPositions, useBroadPhase=True)
+        (exactDistances, _, exactNarrowPhase) = \
+            bench.calculateAssociationDistances(fiberPositions, elbowPositions)
+        assert distances.shape == (bench.cobraAssociations.shape[1], nSteps)
+        assert np.all(exactNarrowPhase)
+
+        # Check that some distances were not calculated exactly, that the
+        # other ones are lower bounds and that the collisions are the same
+        assert not np.all(narrowPhase)
+        assert np.array_equal(distances[narrowPhase],
+                              exactDistances[narrowPhase])
+        assert np.all(distances <= exactDistances + 1e-12)
+        assert np.array_equal(distances < minimumSeparations,
+                              exactDistances < minimumSeparations)
+
+    def test_calculateAssociationCollisionSummary_method(self, bench):
+        # Move the cobra fibers in random directions, with large steps to have
+        # some collisions
+        cobras = bench.cobras
+        nSteps = 20
+        radii = cobras.rMin[:, np.newaxis] + (
+            cobras.rMax - cobras.rMin)[:, np.newaxis] * np.random.random(
+                (cobras.nCobras, nSteps))
+        angles = 2 * np.pi * np.random.random((cobras.nCobras, nSteps))
+        fiberPositions = cobras.centers[:, np.newaxis] + radii * np.exp(
+            1j * angles)
+        elbowPositions = cobras.calculateMultipleElbowPositions(
+            fiberPositions.ravel(), np.repeat(np.arange(cobras.nCobras), nSteps),
+            np.arange(fiberPositions.size)).reshape(fiberPositions.shape)
+
+        # Calculate the expected values from the full distances array
+        (distances, minimumSeparations, _) = \
+            bench.calculateAssociationDistances(fiberPositions, elbowPositions)
+        collisions = distances < minimumSeparations
+        firstCollisionSteps = np.where(
+            np.any(collisions, axis=1), np.argmax(collisions, axis=1), -1)
+        assert np.any(firstCollisionSteps > 0)
+
+        # Check that we get the same results for different chunks
+        for chunkAssociations, chunkSize in [(False, 3), (True, 1000),
+                                             (False, None)]:
+            results = bench.calculateAssociationCollisionSummary(
+                fiberPositions, elbowPositions,
+                chunkAssociations=chunkAssociations, chunkSize=chunkSize,
+                returnDistances=True)
+            assert np.array_equal(results[0], np.any(collisions, axis=1))
+            assert np.array_equal(results[1], firstCollisionSteps)
+            assert np.array_equal(results[2], np.min(distances, axis=1))
+            assert np.array_equal(results[3], distances)
+
+        # Check that the distances are only returned when requested and that
+        # the extra dimensions are handled correctly
+        positions = (fiberPositions[:, np.newaxis],
+                     elbowPositions[:, np.newaxis])
+        results = bench.calculateAssociationCollisionSummary(
+            *positions, memoryBudget=1e6)
+        assert results[3] is None
+        assert results[1].shape == (len(firstCollisionSteps), 1)
+        assert np.array_equal(results[1][:, 0], firstCollisionSteps)
+
+    def test_calculateAssociationCollisionSummary_method_memory(self, bench):
+        # Move the cobra fibers to random positions along 200 steps
+        cobras = bench.cobras
+        nSteps = 200
+        radii = cobras.rMin[:, np.newaxis] + (
+            cobras.rMax - cobras.rMin)[:, np.newaxis] * np.random.random(
+                (cobras.nCobras, nSteps))
+        angles = 2 * np.pi * np.random.random((cobras.nCobras, nSteps))
+        fiberPositions = cobras.centers[:, np.newaxis] + radii * np.exp(
+            1j * angles)
+        elbowPositions = cobras.calculateMultipleElbowPositions(
+            fiberPositions.ravel(), np.repeat(np.arange(cobras.nCobras), nSteps),
+            np.arange(fiberPositions.size)).reshape(fiberPositions.shape)
+
+        # Check that both chunk modes respect the memory budget, with and
+        # without the broad phase
+        memoryBudget = 4 * 1024 * 1024
+
+        for (chunkAssociations, useBroadPhase) in itertools.product(
+                [False, True], [False, True]):
+            tracemalloc.start()
+            bench.calculateAssociationCollisionSummary(
+                fiberPositions, elbowPositions, useBroadPhase=useBroadPhase,
+                chunkAssociations=chunkAssociations, memoryBudget=memoryBudget)
+            (_, peakMemory) = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert peakMemory < memoryBudget
+
+    def test_calculateSampledAssociationCollisions_method(self, bench):
+        # Move the cobras along smooth trajectories that end at random
+        # positions inside their patrol areas
+        cobras = bench.cobras
+        nSteps = 50
+        startTht = 2 * np.pi * np.random.random(cobras.nCobras)
+        finalTht = 2 * np.pi * np.random.random(cobras.nCobras)
+        phi = np.random.uniform(-np.pi, -0.5, cobras.nCobras)
+        fractions = np.linspace(0, 1, nSteps)
+        tht = startTht[:, np.newaxis] + np.outer(finalTht - startTht, fractions)
+        elbowPositions = cobras.centers[:, np.newaxis] + cobras.L1[
+            :, np.newaxis] * np.exp(1j * tht)
+        fiberPositions = elbowPositions + cobras.L2[:, np.newaxis] * np.exp(
+            1j * (tht + phi[:, np.newaxis]))
+
+        # Calculate the collisions evaluating all the trajectory steps
+        (distances, minimumSeparations, _) = \
+            bench.calculateAssociationDistances(fiberPositions, elbowPositions)
+        collisions = distances < minimumSeparations
+        assert np.any(collisions[:, 1:-1] & ~collisions[:, [0]] &
+                      ~collisions[:, [-1]])
+
+        # Check that we get the same results with the coarse-to-fine sampling
+        for samplingStep in [1, 7, 10, 100]:
+            (sampledCollisions, endPointCollisions) = \
+                bench.calculateSampledAssociationCollisions(
+                    fiberPositions, elbowPositions, samplingStep=samplingStep)
+            assert np.array_equal(sampledCollisions,
+                                  np.any(collisions, axis=1))
+            assert np.array_equal(endPointCollisions, collisions[:, -1])
+
+        # Check that the associations subsets are handled correctly
+        associationIndices = np.arange(0, len(collisions), 3)
+        (sampledCollisions, _) = bench.calculateSampledAssociationCollisions(
+            fiberPositions, elbowPositions, associationIndices)
+        assert np.array_equal(sampledCollisions, np.any(
+            collisions[associationIndices], axis=1))
+
+    def test_calculateCobraAssociationCollisions_method(self, bench):
+        # Place the cobra fibers at random positions inside their patrol areas
+        cobras = bench.cobras
+        radii = cobras.rMin + (cobras.rMax - cobras.rMin) * np.random.random(
+            cobras.nCobras)
+        angles = 2 * np.pi * np.random.random(cobras.nCobras)
+        fiberPositions = cobras.centers + radii * np.exp(1j * angles)
+
+        # Check that the broad phase gives the same collisions
+        collisions = bench.calculateCobraAssociationCollisions(
+            fiberPositions, useBroadPhase=False)
+        assert bench.cullingRatio == 0
+        assert np.array_equal(
+            bench.calculateCobraAssociationCollisions(fiberPositions),
+            collisions)
+        assert 0 < bench.cullingRatio < 1
+
+    def test_select_method(self, bench):
+        # Select a subset of the cobras
+        cobraIndices = np.arange(100, 300)
+        selectedBench = bench.select(cobraIndices)
+        assert selectedBench.cobras.nCobras == len(cobraIndices)
+        assert np.array_equal(selectedBench.cobras.centers,
+                              bench.cobras.centers[cobraIndices])
+        assert np.array_equal(selectedBench.cobras.motorMaps.posThtSteps,
+                              bench.cobras.motorMaps.posThtSteps[cobraIndices])
+
+        # Check that the associations are the ones between the selected cobras
+        cobraAssociations = bench.cobraAssociations
+        insideAssociations = np.all(
+            np.isin(cobraAssociations, cobraIndices), axis=0)
+        assert np.array_equal(
+            cobraIndices[selectedBench.cobraAssociations],
+            cobraAssociations[:, insideAssociations])
+        assert np.array_equal(
+            np.sort(cobraIndices[selectedBench.getCobraNeighbors(50)]),
+            np.intersect1d(bench.getCobraNeighbors(150), cobraIndices))
+
+        # Check that the original bench was not modified
+        assert bench.cobras.nCobras == len(bench.cobras.centers)
+
+    def test_classifyCobraAssociations_method(self):
+        # Create a bench with three cobras in a line, where the last two
+        # cobras have short links
+        bench = Bench(cobraCenters=np.array([0, 8, 16]) + 0j,
+                      pruneAssociations=False)
+        bench.cobras.L1[1:] = 1.2
+        bench.cobras.L2[1:] = 1.2
+        bench.cobras.calculatePatrolAreaRadii()
+        bench.cobras.calculateHomePositions()
+        bench.calculateCobraAssociations()
+
+        # Check the association classes
+        assert np.array_equal(bench.nearbyCobraAssociations, [[0, 1], [1, 2]])
+        assert np.array_equal(bench.cobraAssociations,
+                              bench.nearbyCobraAssociations)
+        assert np.array_equal(
+            bench.associationClasses,
+            [OFTEN_COLLIDING_ASSOCIATION, NEVER_COLLIDING_ASSOCIATION])
+
+        # Check that the never colliding association is removed when the
+        # associations are pruned
+        bench.pruneAssociations = True
+        bench.updateCobraAssociations()
+        assert np.array_equal(bench.cobraAssociations, [[0], [1]])
+        assert np.array_equal(bench.nearbyAssociationIndices, [0, -1])
+        assert np.array_equal(bench.getCobrasAssociations(np.array([1])), [0])
+        assert len(bench.getCobrasAssociations(np.array([2]))) == 0
+
+        # Check that the cobra neighbors are not affected by the pruning
+        assert np.array_equal(bench.getCobraNeighbors(1), [2, 0])
+        assert np.array_equal(bench.getCobraNeighbors(2), [1])
+
+        # A cobra with problems can collide only if its fixed link is close
+        # enough to the other cobra
+        bench.cobras.hasProblem[0] = True
+        bench.cobras.home0[0] = bench.cobras.centers[0] - (
+            bench.cobras.rMax[0])
+        bench.updateCobraAssociations()
+        assert bench.cobraAssociations.shape == (2, 0)
+
+    def test_pruned_associations_collisions(self, bench):
+        # Create the same bench without pruning the associations
+        fullBench = Bench(layout="full", pruneAssociations=False)
+        fullBench.cobras = bench.cobras
+        fullBench.calculateCobraAssociations()
+        neverColliding = (
+            fullBench.associationClasses == NEVER_COLLIDING_ASSOCIATION)
+        assert np.array_equal(
+            bench.cobraAssociations,
+            fullBench.cobraAssociations[:, ~neverColliding])
+
+        # Check that the never colliding associations have no collisions for
+        # random fiber positions
+        cobras = bench.cobras
+        radii = cobras.rMin + (cobras.rMax - cobras.rMin) * np.random.random(
+            cobras.nCobras)
+        angles = 2 * np.pi * np.random.random(cobras.nCobras)
+        fiberPositions = cobras.centers + radii * np.exp(1j * angles)
+        collisions = fullBench.calculateCobraAssociationCollisions(
+            fiberPositions)
+        assert not np.any(collisions[neverColliding])
+        assert np.array_equal(
+            bench.calculateCobraAssociationCollisions(fiberPositions),
+            collisions[~neverColliding])
@@ -0,0 +1,197 @@
+"""
+
+Collection of unit tests for the CobraGroup class.
+
+"""
+
+import pytest
+import numpy as np
+
+from ics.cobraOps import targetUtils
+
+
+@pytest.fixture(scope="function")
+def cobras(bench):
+    return bench.cobras
+
+
+@pytest.fixture(scope="function")
+def angles(cobras):
+    # Get some random rotation angles inside the cobras movement ranges
+    tht = np.pi * (2 * np.random.random(cobras.nCobras) - 1)
+    phi = cobras.phiIn + (cobras.phiOut - cobras.phiIn) * np.random.random(
+        cobras.nCobras)
+
+    return (tht, phi)
+
+
+class TestCobraGroup():
+    """A collection of tests for the CobraGroup class.
+
+    """
+
+    def test_calculateInverseKinematics_method(self, cobras, angles):
+        # Calculate the fiber positions for the given angles
+        (tht, phi) = angles
+        fiberPositions = cobras.calculateFiberPositions(tht, phi)
+
+        # Check that we recover the same angles
+        (newTht, newPhi, elbowPositions) = cobras.calculateInverseKinematics(
+            fiberPositions)
+        assert np.allclose(newTht, tht)
+        assert np.allclose(newPhi, phi)
+        assert np.allclose(
+            elbowPositions, cobras.centers + cobras.L1 * np.exp(1j * tht))
+
+        # Check that the wrappers return the same values
+        assert np.array_equal(
+            cobras.calculateElbowPositions(fiberPositions), elbowPositions)
+        assert np.array_equal(
+            cobras.calculateRotationAngles(fiberPositions), (newTht, newPhi))
+
+    def test_calculateInverseKinematics_method_indices(self, cobras, angles):
+        # Calculate the fiber positions for the given angles
+        fiberPositions = cobras.calculateFiberPositions(*angles)
+        (tht, phi, elbowPositions) = cobras.calculateInverseKinematics(
+            fiberPositions)
+
+        # Check that we get the same values for a subset of the cobras
+        indices = np.array([10, 3, 500, 3])
+        results = cobras.calculateInverseKinematics(
+            fiberPositions[indices], indices)
+        assert np.array_equal(results[0], tht[indices])
+        assert np.array_equal(results[1], phi[indices])
+        assert np.array_equal(results[2], elbowPositions[indices])
+
+        # Check that the extra dimensions are handled correctly
+        positions = np.column_stack((fiberPositions[indices],
+                                     fiberPositions[indices]))
+        results = cobras.calculateInverseKinematics(positions, indices)
+        assert results[2].shape == positions.shape
+        assert np.array_equal(results[2][:, 1], elbowPositions[indices])
+
+        # Check that we get the same values for a single cobra
+        results = cobras.calculateInverseKinematics(
+            fiberPositions[[3, 3]], 3)
+        assert np.array_equal(results[2], elbowPositions[[3, 3]])
+
+    def test_calculateInverseKinematics_method_out(self, cobras, angles):
+        # Calculate the fiber positions for the given angles
+        fiberPositions = cobras.calculateFiberPositions(*angles)
+        results = cobras.calculateInverseKinematics(fiberPositions)
+
+        # Check that the output arrays are used
+        out = (np.empty(cobras.nCobras), np.empty(cobras.nCobras),
+               np.empty(cobras.nCobras, dtype="complex"))
+        outResults = cobras.calculateInverseKinematics(fiberPositions, out=out)
+
+        for result, outResult, outArray in zip(results, outResults, out):
+            assert outResult is outArray
+            assert np.array_equal(outResult, result)
+
+    def test_calculateInverseKinematics_method_problems(self, cobras, angles):
+        # Mark some cobras as having problems
+        cobras.hasProblem[[0, 5]] = True
+
+        # Check that these cobras are kept at their home positions
+        fiberPositions = cobras.calculateFiberPositions(*angles)
+        (_, _, elbowPositions) = cobras.calculateInverseKinematics(
+            fiberPositions)
+        homeElbowPositions = cobras.calculateElbowPositions(cobras.home0)
+        assert np.array_equal(elbowPositions[[0, 5]],
+                              homeElbowPositions[[0, 5]])
+        assert np.array_equal(
+            cobras.calculateCobraElbowPositions(5, fiberPositions[:3]),
+            np.full(3, homeElbowPositions[5]))
+
+    def test_calculateReachability_method(self, cobras):
+        # Create some positions inside and outside the cobras patrol areas
+        insidePositions = cobras.centers + 0.5 * (cobras.rMin + cobras.rMax)
+        outsidePositions = cobras.centers + 1.1 * cobras.rMax
+        positions = np.column_stack((insidePositions, outsidePositions))
+
+        # Check the reachable positions
+        (reachable, tht, phi, elbowPositions) = cobras.calculateReachability(
+            positions)
+        assert np.all(reachable[:, 0])
+        assert not np.any(reachable[:, 1])
+        assert np.all(np.isnan(elbowPositions[:, 1]))
+        assert np.array_equal(
+            elbowPositions[:, 0], cobras.calculateElbowPositions(
+                insidePositions))
+
+        # Check that the maximum distance is used
+        (reachable, _, _, _) = cobras.calculateReachability(
+            insidePositions, maximumDistance=np.min(cobras.rMin))
+        assert not np.any(reachable)
+
+        # Check that the black dots are avoided
+        blackDotPositions = cobras.centers + cobras.blackDotPosition
+        (reachable, _, _, _) = cobras.calculateReachability(
+            blackDotPositions, indices=np.arange(cobras.nCobras))
+        assert not np.any(reachable)
+        (reachable, _, _, _) = cobras.calculateReachability(
+            blackDotPositions, avoidBlackDots=False)
+        assert np.all(reachable)
+
+    def test_findReachablePositions_method(self, bench):
+        # Create enough targets to make sure that all cobras can reach some
+        targets = targetUtils.generateRandomTargets(20, bench)
+
+        # Find the reachable positions for some of the cobras
+        cobras = bench.cobras
+        indices = np.array([100, 5, 2000])
+        (cobraIndices, positionIndices, distances, tht, phi,
+         elbowPositions) = cobras.findReachablePositions(
+             targets.positions, indices)
+
+        # Check that they are the same as the paired calculation results
+        positions = targets.positions
+        (reachable, _, _, _) = cobras.calculateReachability(
+            np.repeat(positions[np.newaxis], len(indices), axis=0), indices)
+
+        for i, cobraIndex in enumerate(indices):
+            selected = cobraIndices == cobraIndex
+            assert np.array_equal(np.sort(positionIndices[selected]),
+                                  np.flatnonzero(reachable[i]))
+            assert np.all(np.diff(distances[selected]) >= 0)
+
+        # Check that the cobras order is preserved
+        (_, firstPositions) = np.unique(cobraIndices, return_index=True)
+        assert np.array_equal(cobraIndices[np.sort(firstPositions)], indices)
+        assert np.sum(np.diff(cobraIndices) != 0) == len(indices) - 1
+
+        # Check the inverse kinematics solution
+        (expectedTht, expectedPhi, expectedElbows) = \
+            cobras.calculateInverseKinematics(
+                positions[positionIndices], cobraIndices)
+        assert np.array_equal(tht, expectedTht)
+        assert np.array_equal(phi, expectedPhi)
+        assert np.array_equal(elbowPositions, expectedElbows)
+
+    def test_subset_method(self, cobras, angles):
+        # Select the cobras in a module using different index types
+        moduleIndices = np.arange(57, 114)
+        moduleMask = np.full(cobras.nCobras, False)
+        moduleMask[moduleIndices] = True
+
+        for indices in [moduleIndices, moduleMask, slice(57, 114)]:
+            subset = cobras.subset(indices)
+            assert subset.nCobras == len(moduleIndices)
+            assert np.array_equal(subset.centers, cobras.centers[indices])
+            assert np.shares_memory(subset.centers, cobras.centers)
+            assert np.shares_memory(subset.motorMaps.posThtSteps,
+                                    cobras.motorMaps.posThtSteps)
+
+        # Check that the arrays are gathered for non equally spaced indices
+        indices = np.array([3, 10, 11, 500])
+        subset = cobras.subset(indices)
+        assert np.array_equal(subset.L1, cobras.L1[indices])
+        assert not np.shares_memory(subset.L1, cobras.L1)
+
+        # Check that the subset kinematics are the same as the full ones
+        subset = cobras.subset(moduleIndices)
+        fiberPositions = cobras.calculateFiberPositions(*angles)
+        assert np.array_equal(
+            subset.calculateElbowPositions(fiberPositions[moduleIndices]),
+            cobras.calculateElbowPositions(fiberPositions)[moduleIndices])
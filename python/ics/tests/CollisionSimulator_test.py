@@ -0,0 +1,166 @@
+"""
+
+Collection of unit tests for the CollisionSimulator class.
+
+"""
+
+import os
+import pytest
+import numpy as np
+
+from ics.cobraOps import targetUtils
+from ics.cobraOps.Bench import Bench
+from ics.cobraOps.CobrasCalibrationProduct import CobrasCalibrationProduct
+from ics.cobraOps.DistanceTargetSelector import DistanceTargetSelector
+from ics.cobraOps.CollisionSimulator import CollisionSimulator
+
+
+@pytest.fixture(scope="function")
+def simulator(bench, targets):
+    # Select the targets and create the collision simulator
+    selector = DistanceTargetSelector(bench, targets)
+    selector.run()
+
+    return CollisionSimulator(bench, selector.getSelectedTargets())
+
+
+class TestCollisionSimulator():
+    """A collection of tests for the CollisionSimulator class.
+
+    """
+
+    def test_run_method(self, simulator):
+        # Run the simulator without solving the trajectory collisions
+        simulator.run(solveCollisions=False)
+        nCollisions = simulator.nCollisions
+
+        # Solve the collisions and check that the trajectories are the same as
+        # the ones calculated for all the cobras
+        for selectLowerIndices in [True, False, True, False]:
+            simulator.solveTrajectoryCollisions(selectLowerIndices)
+
+        trajectories = simulator.trajectories
+        fiberPositions = trajectories.fiberPositions.copy()
+        simulator.calculateTrajectories()
+        assert np.array_equal(simulator.trajectories.fiberPositions,
+                              fiberPositions)
+        assert simulator.nCollisions <= nCollisions
+
+        # Check that the incrementally updated collision information is the
+        # same as the one calculated for all the cobras
+        results = (simulator.associationCollisions.copy(),
+                   simulator.collisions.copy(),
+                   simulator.endPointCollisions.copy(),
+                   simulator.collisionCounts.copy(),
+                   simulator.nCollisions, simulator.nEndPointCollisions)
+        simulator.detectTrajectoryCollisions()
+        assert np.array_equal(results[0], simulator.associationCollisions)
+        assert np.array_equal(results[1], simulator.collisions)
+        assert np.array_equal(results[2], simulator.endPointCollisions)
+        assert np.array_equal(results[3], simulator.collisionCounts)
+        assert results[4] == simulator.nCollisions
+        assert results[5] == simulator.nEndPointCollisions
+
+        # Check the number of colliding associations of each cobra
+        counts = np.bincount(np.ravel(
+            simulator.bench.cobraAssociations[
+                :, simulator.associationCollisions]),
+            minlength=simulator.bench.cobras.nCobras)
+        assert np.array_equal(simulator.collisionCounts, counts)
+        assert simulator.nCollisions == np.sum(counts > 0)
+
+    def test_solveTrajectoryCollisions_method(self, bench, simulator):
+        # Detect the collisions without solving them
+        simulator.run(solveCollisions=False)
+        movementDirections = simulator.movementDirections.copy()
+        midPointCollisions = np.logical_and(
+            simulator.associationCollisions,
+            ~simulator.associationEndPointCollisions)
+
+        # Check that nothing changes if the colliding associations are not
+        # selected
+        simulator.solveTrajectoryCollisions(
+            True, np.flatnonzero(~midPointCollisions))
+        assert np.array_equal(simulator.movementDirections,
+                              movementDirections)
+
+        # Check that only the cobras in the selected associations change
+        # their theta movement directions
+        selectedAssociations = np.flatnonzero(midPointCollisions)[:1]
+        simulator.solveTrajectoryCollisions(True, selectedAssociations)
+        changedCobras = np.flatnonzero(
+            simulator.movementDirections[0] != movementDirections[0])
+        assert np.all(np.isin(changedCobras, bench.cobraAssociations[
+            0, selectedAssociations]))
+
+    def test_keepDistances_parameter(self, bench, simulator):
+        # Run the simulator without the full distances array
+        simulator.run()
+        assert simulator.distances is None
+
+        # Run the same simulation keeping the full distances array
+        fullSimulator = CollisionSimulator(bench, simulator.targets,
+                                           keepDistances=True)
+        fullSimulator.run()
+        nAssociations = bench.cobraAssociations.shape[1]
+        assert fullSimulator.distances.shape[1] == \
+            fullSimulator.trajectorySteps
+
+        # Check that both simulations give the same results
+        assert np.array_equal(simulator.movementDirections,
+                              fullSimulator.movementDirections)
+        assert np.array_equal(simulator.associationCollisions,
+                              fullSimulator.associationCollisions)
+        assert np.array_equal(simulator.associationEndPointCollisions,
+                              fullSimulator.associationEndPointCollisions)
+        assert np.array_equal(simulator.collisions, fullSimulator.collisions)
+        assert simulator.nCollisions == fullSimulator.nCollisions
+        assert simulator.nEndPointCollisions == \
+            fullSimulator.nEndPointCollisions
+
+        # Check that the minimum distances are consistent with the collisions
+        minimumDistances = simulator.associationMinimumDistances
+        assert minimumDistances.shape == (nAssociations,)
+        linkRadius = bench.cobras.linkRadius
+        minimumSeparations = (linkRadius[bench.cobraAssociations[0]] +
+                              linkRadius[bench.cobraAssociations[1]])
+        assert np.array_equal(minimumDistances < minimumSeparations,
+                              simulator.associationCollisions)
+        assert np.allclose(minimumDistances,
+                           fullSimulator.associationMinimumDistances)
+
+    def test_run_method_pruned_associations(self):
+        # Use a calibration product with many cobras with problems
+        calibrationProduct = CobrasCalibrationProduct(os.path.join(
+            os.path.dirname(__file__), "..", "demos", "updatedMaps6.xml"))
+        calibrationProduct.status[::6] = 2
+
+        # Run the same simulation with and without pruned associations
+        simulators = []
+
+        for pruneAssociations in [True, False]:
+            np.random.seed(0)
+            bench = Bench(layout="full", calibrationProduct=calibrationProduct,
+                          pruneAssociations=pruneAssociations)
+            assert np.any(bench.cobras.hasProblem)
+            targets = targetUtils.generateRandomTargets(2, bench)
+            selector = DistanceTargetSelector(bench, targets)
+            selector.run()
+            simulator = CollisionSimulator(
+                bench, selector.getSelectedTargets())
+            simulator.run()
+            simulators.append(simulator)
+
+        # Check that the pruning doesn't change the simulation results
+        (pruned, full) = simulators
+        assert (pruned.bench.cobraAssociations.shape[1] <
+                full.bench.cobraAssociations.shape[1])
+        assert np.array_equal(pruned.finalFiberPositions,
+                              full.finalFiberPositions)
+        assert np.array_equal(pruned.movementDirections,
+                              full.movementDirections)
+        assert np.array_equal(pruned.movementStrategies,
+                              full.movementStrategies)
+        assert np.array_equal(pruned.collisions, full.collisions)
+        assert np.array_equal(pruned.endPointCollisions,
+                              full.endPointCollisions)
@@ -0,0 +1,85 @@
+"""
+
+Collection of unit tests for the EndPointCollisionState class.
+
+"""
+
+import pytest
+import numpy as np
+
+from ics.cobraOps.EndPointCollisionState import EndPointCollisionState
+
+
+@pytest.fixture(scope="function")
+def fiberPositions(bench):
+    # Place the cobra fibers at random positions inside their patrol areas
+    cobras = bench.cobras
+    radii = cobras.rMin + (cobras.rMax - cobras.rMin) * np.random.random(
+        cobras.nCobras)
+    angles = 2 * np.pi * np.random.random(cobras.nCobras)
+
+    return cobras.centers + radii * np.exp(1j * angles)
+
+
+class TestEndPointCollisionState():
+    """A collection of tests for the EndPointCollisionState class.
+
+    """
+
+    def test_constructor(self, bench, fiberPositions):
+        # Create the collision state
+        state = EndPointCollisionState(bench, fiberPositions)
+
+        # Check that the collisions are the same as the bench ones
+        problematicAssociations = bench.getProblematicCobraAssociations(
+            fiberPositions)
+        assert np.array_equal(
+            bench.cobraAssociations[:, state.associationCollisions],
+            problematicAssociations)
+
+        # Check the number of collisions for some cobras
+        for c in [0, 1, 100, 1000, bench.cobras.nCobras - 1]:
+            assert state.nCollisions[c] == bench.getCollisionsForCobra(
+                c, fiberPositions)
+
+    def test_trialMove_method(self, bench, fiberPositions):
+        # Create the collision state
+        state = EndPointCollisionState(bench, fiberPositions)
+        initialCollisions = state.nCollisions.copy()
+
+        # Rotate two neighbor cobras around their centers
+        cobraIndices = bench.cobraAssociations[:, 10]
+        cobraCenters = bench.cobras.centers[cobraIndices]
+        newPositions = cobraCenters + (
+            fiberPositions[cobraIndices] - cobraCenters) * np.exp(1j * np.pi)
+        collisions = state.trialMove(cobraIndices, newPositions)
+
+        # Check that the collisions are the same as the bench ones
+        fiberPositions[cobraIndices] = newPositions
+        assert np.array_equal(collisions, [
+            bench.getCollisionsForCobra(c, fiberPositions)
+            for c in cobraIndices])
+
+        # Check that the state was not modified
+        assert np.array_equal(state.nCollisions, initialCollisions)
+
+    def test_move_method(self, bench, fiberPositions):
+        # Create the collision state
+        state = EndPointCollisionState(bench, fiberPositions)
+
+        # Rotate some cobras around their centers, one of them twice
+        for cobraIndices in [[5], [17, 18], [1000, 5]]:
+            cobraCenters = bench.cobras.centers[cobraIndices]
+            newPositions = cobraCenters + (
+                fiberPositions[cobraIndices] - cobraCenters) * np.exp(1j)
+            state.move(cobraIndices, newPositions)
+            fiberPositions[cobraIndices] = newPositions
+
+        # Check that the state is the same as a new state created with the
+        # final positions
+        newState = EndPointCollisionState(bench, fiberPositions)
+        assert np.array_equal(state.nCollisions, newState.nCollisions)
+        assert np.array_equal(
+            state.associationCollisions, newState.associationCollisions)
+        assert np.allclose(
+            state.associationDistances, newState.associationDistances)
@@ -0,0 +1,253 @@
+"""
+
+Collection of unit tests for the MotorMapGroup class.
+
+"""
+
+import os
+import pytest
+import numpy as np
+
+from ics.cobraOps.CobrasCalibrationProduct import CobrasCalibrationProduct
+from ics.cobraOps.MotorMapGroup import MotorMapGroup
+
+
+@pytest.fixture(scope="module")
+def calibrationProduct():
+    return CobrasCalibrationProduct(os.path.join(
+        os.path.dirname(__file__), "..", "demos",
+        "updatedMotorMapsFromThisRun2.xml"))
+
+
+@pytest.fixture(scope="function")
+def motorMaps(calibrationProduct):
+    # Use the calibration product motor maps, which are not uniform
+    motorMaps = MotorMapGroup(200)
+    motorMaps.useCalibrationProduct(
+        calibrationProduct, rng=np.random.default_rng(0))
+
+    return motorMaps
+
+
+class TestMotorMapGroup():
+    """A collection of tests for the MotorMapGroup class.
+
+    """
+
+    def test_interpolateUniformGrids_method(self):
+        # Create some functions defined on uniform grids
+        nFunctions = 50
+        gridSteps = np.random.uniform(0.01, 0.1, nFunctions)
+        xp = np.arange(100) * gridSteps[:, np.newaxis]
+        fp = np.cumsum(np.random.random((nFunctions, 100)), axis=1)
+
+        # Evaluate them inside and outside the grids and at the grid points
+        x = np.random.uniform(-1, 11, (nFunctions, 20))
+        x[:, 0] = xp[:, 10]
+        x[:, 1] = xp[:, -1]
+        x[:, 2] = np.nan
+
+        # Check that we get exactly the same results as with np.interp
+        values = MotorMapGroup.interpolateUniformGrids(x, xp, fp, gridSteps)
+
+        for i in range(nFunctions):
+            assert np.array_equal(values[i], np.interp(x[i], xp[i], fp[i]),
+                                  equal_nan=True)
+
+    def test_calculateSteps_method(self, bench):
+        # Generate some random cobra movements
+        motorMaps = bench.cobras.motorMaps
+        deltaTht = np.random.uniform(-7, 7, motorMaps.nMaps)
+        startPhi = np.random.uniform(-np.pi, 0, motorMaps.nMaps)
+        deltaPhi = np.random.uniform(-2, 2, motorMaps.nMaps)
+        (nThtSteps, nPhiSteps) = motorMaps.calculateSteps(
+            deltaTht, startPhi, deltaPhi)
+
+        # Check the results for some cobras against np.interp
+        for c in [0, 10, motorMaps.nMaps - 1]:
+            thtSteps = (motorMaps.posThtSteps[c] if deltaTht[c] >= 0 else
+                        motorMaps.negThtSteps[c])
+            stepsRange = np.interp([0, np.abs(deltaTht[c])],
+                                   motorMaps.thtOffsets[c], thtSteps)
+            assert nThtSteps[c] == stepsRange[1] - stepsRange[0]
+
+            phiSteps = (motorMaps.posPhiSteps[c] if deltaPhi[c] >= 0 else
+                        motorMaps.negPhiSteps[c])
+            phiOffset = (np.pi + startPhi[c] if deltaPhi[c] >= 0 else
+                         np.abs(startPhi[c]))
+            stepsRange = np.interp(
+                [phiOffset, phiOffset + np.abs(deltaPhi[c])],
+                motorMaps.phiOffsets[c], phiSteps)
+            assert nPhiSteps[c] == stepsRange[1] - stepsRange[0]
+
+    def test_calculateAngleOffsets_method(self, motorMaps):
+        # Generate some random motor steps for each motor map
+        positiveMovements = np.random.random(motorMaps.nMaps) > 0.5
+        steps = np.random.uniform(-100, 20000, (motorMaps.nMaps, 20))
+        steps[:, 0] = np.nan
+
+        for useThtMaps in [True, False]:
+            # Get the integrated step maps for each movement direction
+            if useThtMaps:
+                offsets = motorMaps.thtOffsets
+                stepMaps = np.where(positiveMovements[:, np.newaxis],
+                                    motorMaps.posThtSteps,
+                                    motorMaps.negThtSteps)
+            else:
+                offsets = motorMaps.phiOffsets
+                stepMaps = np.where(positiveMovements[:, np.newaxis],
+                                    motorMaps.posPhiSteps,
+                                    motorMaps.negPhiSteps)
+
+            # Include the map points and their closest values
+            steps[:, 1] = stepMaps[:, 10]
+            steps[:, 2] = np.nextafter(stepMaps[:, 10], -np.inf)
+            steps[:, 3] = np.nextafter(stepMaps[:, 10], np.inf)
+            steps[:, 4] = stepMaps[:, -1]
+
+            # Check that we get exactly the same results as with np.interp
+            angleOffsets = motorMaps.calculateAngleOffsets(
+                steps, positiveMovements, useThtMaps)
+
+            for i in range(motorMaps.nMaps):
+                assert np.array_equal(
+                    angleOffsets[i],
+                    np.interp(steps[i], stepMaps[i], offsets[i]),
+                    equal_nan=True)
+
+            # Check that the step offsets are the inverse of the angle offsets
+            stepOffsets = motorMaps.calculateStepOffsets(
+                angleOffsets[:, 5:], positiveMovements, useThtMaps)
+            inside = np.logical_and(steps[:, 5:] > 0,
+                                    steps[:, 5:] < stepMaps[:, -1:])
+            assert np.allclose(stepOffsets[inside], steps[:, 5:][inside])
+
+    def test_calculateAngleOffsets_method_indices(self, motorMaps):
+        # Calculate the angle offsets for all the motor maps
+        steps = np.random.uniform(0, 5000, (motorMaps.nMaps, 3))
+        angleOffsets = motorMaps.calculateAngleOffsets(steps, False)
+
+        # Check that we get the same values for a subset of the maps
+        indices = np.array([10, 3, 150, 3])
+        assert np.array_equal(
+            motorMaps.calculateAngleOffsets(steps[indices], False,
+                                            indices=indices),
+            angleOffsets[indices])
+        assert np.array_equal(
+            motorMaps.calculateAngleOffsets(steps[3], False, indices=3),
+            angleOffsets[3])
+
+    def test_getStepTables_method_flat_intervals(self, motorMaps):
+        # Add a flat interval and a very small interval to two of the maps
+        motorMaps.S1Pm[10, 20] = 0
+        motorMaps.S1Pm[30, 40] = 1e-4
+        motorMaps.updateIntegratedStepMaps()
+
+        # Check that those maps are searched instead of using a table
+        (binWidths, tableStarts, tableSizes, tables, searchRows) = \
+            motorMaps.getStepTables()
+        assert np.array_equal(np.flatnonzero(searchRows), [10, 30])
+        assert np.all(np.isfinite(binWidths[~searchRows]))
+        assert np.sum(tableSizes) == len(tables)
+        assert np.all(binWidths[~searchRows] >= 0.5)
+
+        # Check that we still get the same values as with np.interp
+        stepMaps = motorMaps.posThtSteps
+        steps = np.random.uniform(-10, 1.1 * np.max(stepMaps),
+                                  (motorMaps.nMaps, 50))
+        steps[:, :5] = stepMaps[:, 18:23]
+        steps[30, 5:10] = stepMaps[30, 39:44] + 5e-5
+        angleOffsets = motorMaps.calculateAngleOffsets(steps, True)
+
+        for i in range(motorMaps.nMaps):
+            assert np.array_equal(angleOffsets[i], np.interp(
+                steps[i], stepMaps[i], motorMaps.thtOffsets[i]))
+
+    def test_getStepTables_method_size_limit(self, motorMaps, monkeypatch):
+        # Limit the total size of the step tables
+        (_, _, tableSizes, _, _) = motorMaps.getStepTables()
+        maxSize = np.sum(tableSizes) // 2
+        monkeypatch.setattr(
+            "ics.cobraOps.MotorMapGroup.STEP_TABLES_MAX_SIZE", maxSize)
+        motorMaps.updateIntegratedStepMaps()
+
+        # Check that the largest tables are searched
+        (_, _, newTableSizes, tables, searchRows) = motorMaps.getStepTables()
+        assert len(tables) <= maxSize
+        assert np.any(searchRows)
+        assert np.min(tableSizes[searchRows]) >= np.max(
+            tableSizes[~searchRows])
+
+        # Check that we still get the same values as with np.interp
+        steps = np.random.uniform(0, 5000, (motorMaps.nMaps, 10))
+        angleOffsets = motorMaps.calculateAngleOffsets(steps, True)
+
+        for i in range(motorMaps.nMaps):
+            assert np.array_equal(angleOffsets[i], np.interp(
+                steps[i], motorMaps.posThtSteps[i], motorMaps.thtOffsets[i]))
+
+    def test_calculateIntegratedStepMaps_method(self, motorMaps):
+        # Make the fast motor maps different from the slow motor maps
+        motorMaps.F1Pm = 0.5 * motorMaps.S1Pm
+        motorMaps.F2Nm = 0.5 * motorMaps.S2Nm
+        motorMaps.updateIntegratedStepMaps()
+        slowThtSteps = motorMaps.posThtSteps.copy()
+        slowPhiSteps = motorMaps.negPhiSteps.copy()
+
+        # Check that the fast integrated step maps are not recalculated
+        integratedStepMaps = motorMaps.getIntegratedStepMaps()
+        motorMaps.calculateIntegratedStepMaps(useSlowMaps=False)
+        assert motorMaps.getIntegratedStepMaps() is integratedStepMaps
+        assert np.shares_memory(motorMaps.posThtSteps, integratedStepMaps)
+        assert np.allclose(motorMaps.posThtSteps, 0.5 * slowThtSteps)
+        assert np.allclose(motorMaps.negPhiSteps, 0.5 * slowPhiSteps)
+
+        # Check that the motor maps type can be selected for each cobra
+        useSlowMaps = np.random.random(motorMaps.nMaps) > 0.5
+        motorMaps.calculateIntegratedStepMaps(useSlowMaps=useSlowMaps)
+        assert np.array_equal(motorMaps.posThtSteps[useSlowMaps],
+                              slowThtSteps[useSlowMaps])
+        assert np.allclose(motorMaps.posThtSteps[~useSlowMaps],
+                           0.5 * slowThtSteps[~useSlowMaps])
+
+        # Check that the selected motor maps are used in the calculations
+        steps = np.random.uniform(0, 5000, (motorMaps.nMaps, 3))
+        angleOffsets = motorMaps.calculateAngleOffsets(steps, True)
+        assert np.array_equal(angleOffsets, motorMaps.calculateAngleOffsets(
+            steps, True, useSlowMaps=useSlowMaps))
+
+        for i in range(motorMaps.nMaps):
+            assert np.array_equal(angleOffsets[i], np.interp(
+                steps[i], motorMaps.posThtSteps[i], motorMaps.thtOffsets[i]))
+
+    def test_calculateIntegratedStepMaps_method_dtype(self, motorMaps):
+        # Use single precision integrated step maps
+        doublePrecisionSteps = motorMaps.posPhiSteps.copy()
+        motorMaps.calculateIntegratedStepMaps(dtype="float32")
+        assert motorMaps.posPhiSteps.dtype == np.float32
+        assert np.allclose(motorMaps.posPhiSteps, doublePrecisionSteps)
+
+        # Check that the inverse step tables still give the same results as
+        # np.interp
+        steps = np.random.uniform(0, 5000, (motorMaps.nMaps, 10))
+        angleOffsets = motorMaps.calculateAngleOffsets(steps, True, False)
+
+        for i in range(motorMaps.nMaps):
+            assert np.array_equal(angleOffsets[i], np.interp(
+                steps[i], motorMaps.posPhiSteps[i], motorMaps.phiOffsets[i]))
+
+    def test_getStepTables_method(self, motorMaps, calibrationProduct):
+        # Check that the tables are saved in the cache
+        tables = motorMaps.getStepTables()
+        integratedStepMaps = motorMaps.getIntegratedStepMaps()
+        assert motorMaps.getStepTables() is tables
+        assert motorMaps.getStepTables(useThtMaps=False) is not tables
+
+        # Check that the caches are cleaned when the motor maps are updated
+        motorMaps.useCalibrationProduct(calibrationProduct,
+                                        rng=np.random.default_rng(1))
+        assert motorMaps.getStepTables() is not tables
+        assert motorMaps.getIntegratedStepMaps() is not integratedStepMaps
+        assert np.array_equal(
+            motorMaps.getIntegratedStepMaps()[:motorMaps.nMaps],
+            motorMaps.posThtSteps)
@@ -0,0 +1,83 @@
+"""
+
+Collection of unit tests for the MotorNoiseSimulator class.
+
+"""
+
+import pytest
+import numpy as np
+
+from ics.cobraOps.DistanceTargetSelector import DistanceTargetSelector
+from ics.cobraOps.CollisionSimulator import CollisionSimulator
+from ics.cobraOps.MotorNoiseSimulator import MotorNoiseSimulator
+
+
+@pytest.fixture(scope="function")
+def simulator(bench, targets):
+    # Select the targets and calculate the cobra trajectories
+    selector = DistanceTargetSelector(bench, targets)
+    selector.run()
+    simulator = CollisionSimulator(bench, selector.getSelectedTargets())
+    simulator.run()
+
+    return simulator
+
+
+class TestMotorNoiseSimulator():
+    """A collection of tests for the MotorNoiseSimulator class.
+
+    """
+
+    def test_calculateMapFactors_method(self):
+        # Check that the factors are one when there is no motor noise
+        factors = MotorNoiseSimulator.calculateMapFactors(0.0, (3, 10, 20))
+        assert factors.shape == (3, 10, 20)
+        assert np.all(factors == 1)
+
+        # Check that the factors are positive and have the expected mean
+        fractionalBinErrors = np.array([0.05, 0.1])[:, np.newaxis]
+        factors = MotorNoiseSimulator.calculateMapFactors(
+            fractionalBinErrors, (2, 10000), rng=np.random.default_rng(0))
+        assert np.all(factors > 0)
+        assert np.allclose(np.mean(factors, axis=1), 1, atol=0.01)
+        assert np.std(factors[0]) < np.std(factors[1])
+
+    def test_calculateNoisyTrajectories_method(self, simulator):
+        # Check that the planned trajectories are recovered without noise
+        trajectories = simulator.trajectories
+        noiseSimulator = MotorNoiseSimulator(trajectories, alpha=0.0)
+        (fiberPositions, elbowPositions) = \
+            noiseSimulator.calculateNoisyTrajectories(2)
+        assert fiberPositions.shape == (2,) + trajectories.fiberPositions.shape
+        assert np.allclose(fiberPositions, trajectories.fiberPositions)
+        assert np.allclose(elbowPositions, trajectories.elbowPositions)
+
+        # Check that the noisy trajectories start at the same positions
+        noiseSimulator = MotorNoiseSimulator(trajectories)
+        (fiberPositions, _) = noiseSimulator.calculateNoisyTrajectories(
+            2, rng=np.random.default_rng(0))
+        assert np.allclose(fiberPositions[:, :, 0],
+                           trajectories.fiberPositions[:, 0])
+        assert not np.allclose(fiberPositions[:, :, -1],
+                               trajectories.fiberPositions[:, -1])
+
+    def test_run_method(self, simulator):
+        # Run the simulation without noise in several chunks
+        noiseSimulator = MotorNoiseSimulator(simulator.trajectories, alpha=0.0)
+        noiseSimulator.run(3, realizationsPerChunk=2)
+
+        # Check that we get the planned trajectories collisions
+        assert noiseSimulator.nRealizations == 3
+        assert np.array_equal(noiseSimulator.collisionProbabilities,
+                              simulator.collisions.astype("float"))
+        assert np.array_equal(
+            noiseSimulator.associationCollisionProbabilities,
+            simulator.associationCollisions.astype("float"))
+
+        # Check that the probabilities are correct when there is noise
+        noiseSimulator = MotorNoiseSimulator(simulator.trajectories)
+        noiseSimulator.run(3, rng=np.random.default_rng(0))
+        probabilities = noiseSimulator.collisionProbabilities
+        assert len(probabilities) == simulator.bench.cobras.nCobras
+        assert np.all(probabilities >= 0) and np.all(probabilities <= 1)
+        assert np.all(np.isin(probabilities, [0, 1 / 3, 2 / 3, 1]))
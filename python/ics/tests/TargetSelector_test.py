@@ -199,6 +199,13 @@ class TestTargetSelector():
         # Check that we get the correct assignment
         assert np.all(selector.assignedTargetIndices == [0, 3])
 
+        # Check that only the collisions of the given cobras are solved
+        selector.assignedTargetIndices = np.array([1, 2])
+        selector.solveEndPointCollisions(np.array([], dtype="int"))
+        assert np.all(selector.assignedTargetIndices == [1, 2])
+        selector.solveEndPointCollisions(np.array([1]))
+        assert np.all(selector.assignedTargetIndices == [0, 3])
+
         # Assign the targets in a way that we don't have an end-point collision
         selector.assignedTargetIndices = np.array([0, 2])
 
@@ -0,0 +1,118 @@
+"""
+
+Collection of unit tests for the TrajectoryArchive class.
+
+"""
+
+import pytest
+import numpy as np
+
+from ics.cobraOps.DistanceTargetSelector import DistanceTargetSelector
+from ics.cobraOps.CollisionSimulator import CollisionSimulator
+from ics.cobraOps.TrajectoryArchive import TrajectoryArchive
+
+
+@pytest.fixture(scope="function")
+def simulator(bench, targets):
+    # Select the targets and run the collision simulator
+    selector = DistanceTargetSelector(bench, targets)
+    selector.run()
+    simulator = CollisionSimulator(bench, selector.getSelectedTargets())
+    simulator.run()
+
+    return simulator
+
+
+class TestTrajectoryArchive():
+    """A collection of tests for the TrajectoryArchive class.
+
+    """
+
+    def test_constructor(self, tmp_path):
+        # Check that an empty archive is created
+        archive = TrajectoryArchive(str(tmp_path / "archive"))
+        assert len(archive) == 0
+        assert (tmp_path / "archive").is_dir()
+
+    def test_addField_method(self, simulator, tmp_path):
+        # Add the same field twice
+        archive = TrajectoryArchive(str(tmp_path))
+        assert archive.addField(simulator) == 0
+        assert archive.addField(simulator, name="second") == 1
+        assert len(archive) == 2
+        assert (tmp_path / "index.json").is_file()
+
+        # Check that the fields are available after reopening the archive
+        archive = TrajectoryArchive(str(tmp_path))
+        assert len(archive) == 2
+        assert archive.getFieldIndex("0") == 0
+        assert archive.getFieldIndex("second") == 1
+        assert archive.fields[1]["nCollisions"] == simulator.nCollisions
+
+        with pytest.raises(KeyError):
+            archive.getFieldIndex("third")
+
+        # Check that a new field can be appended to the existing archive
+        assert archive.addField(simulator) == 2
+        assert len(TrajectoryArchive(str(tmp_path))) == 3
+
+        # Check that field names cannot be repeated
+        with pytest.raises(ValueError):
+            archive.addField(simulator, name="second")
+
+        assert len(TrajectoryArchive(str(tmp_path))) == 3
+        assert len(list(tmp_path.glob("*.npy"))) == 3 * len(
+            archive.fields[0]["arrays"])
+
+    def test_addField_method_two_writers(self, simulator, tmp_path):
+        # Open the same archive twice and add fields with both instances
+        archive1 = TrajectoryArchive(str(tmp_path))
+        archive2 = TrajectoryArchive(str(tmp_path))
+        assert archive1.addField(simulator, name="first") == 0
+        assert archive2.addField(simulator, name="second") == 1
+        assert archive1.addField(simulator) == 2
+
+        # Check that no field was lost or overwritten
+        archive = TrajectoryArchive(str(tmp_path))
+        assert [field["name"] for field in archive.fields] == [
+            "first", "second", "2"]
+        fileNames = [fileName for field in archive.fields
+                     for fileName in field["arrays"].values()]
+        assert len(set(fileNames)) == len(fileNames)
+        assert np.array_equal(archive.getArray(1, "collisions"),
+                              simulator.collisions)
+
+    def test_getArray_method(self, simulator, tmp_path):
+        # Check that the arrays are read as memory maps
+        archive = TrajectoryArchive(str(tmp_path))
+        archive.addField(simulator)
+        associationCollisions = archive.getArray(0, "associationCollisions")
+        assert isinstance(associationCollisions, np.memmap)
+        assert np.array_equal(associationCollisions,
+                              simulator.associationCollisions)
+        assert np.array_equal(archive.getArray(0, "movementDirections"),
+                              simulator.movementDirections)
+
+    def test_getPositions_method(self, simulator, tmp_path):
+        # Check that the positions are the same as the simulated ones
+        trajectories = simulator.trajectories
+        archive = TrajectoryArchive(str(tmp_path))
+        archive.addField(simulator)
+        (fiberPositions, elbowPositions) = archive.getPositions(0)
+        assert np.array_equal(fiberPositions, trajectories.fiberPositions)
+        assert np.array_equal(elbowPositions, trajectories.elbowPositions)
+
+        # Check that single cobras and step ranges are views of the files
+        (fiberPositions, _) = archive.getPositions(0, 10, slice(20, 40))
+        assert isinstance(fiberPositions, np.memmap)
+        assert np.array_equal(fiberPositions,
+                              trajectories.fiberPositions[10, 20:40])
+
+        # Check that the collision flags are the same as the simulated ones
+        (collisions, endPointCollisions) = archive.getCollisions(0)
+        assert np.array_equal(collisions, simulator.collisions)
+        assert np.array_equal(endPointCollisions,
+                              simulator.endPointCollisions)
+        cobraIndices = np.array([3, 10, 500])
+        (collisions, _) = archive.getCollisions(0, cobraIndices)
+        assert np.array_equal(collisions, simulator.collisions[cobraIndices])
@@ -0,0 +1,206 @@
+"""
+
+Collection of unit tests for the TrajectoryGroup class.
+
+"""
+
+import pytest
+import numpy as np
+
+from ics.cobraOps.DistanceTargetSelector import DistanceTargetSelector
+from ics.cobraOps.CollisionSimulator import CollisionSimulator
+from ics.cobraOps.TrajectoryGroup import TrajectoryGroup
+
+
+@pytest.fixture(scope="function")
+def trajectories(bench, targets):
+    # Select the targets and calculate the cobra trajectories
+    selector = DistanceTargetSelector(bench, targets)
+    selector.run()
+    simulator = CollisionSimulator(bench, selector.getSelectedTargets())
+    simulator.calculateFinalFiberPositions()
+    simulator.defineMovementDirections()
+    simulator.defineMovementStrategies()
+    simulator.calculateTrajectories()
+
+    return simulator.trajectories
+
+
+class TestTrajectoryGroup():
+    """A collection of tests for the TrajectoryGroup class.
+
+    """
+
+    def test_calculateMotorStepMoves_method(self, trajectories):
+        # Create some random motor step limits
+        nCobras = 100
+        start = np.random.uniform(0, 3000, nCobras)
+        end = start + np.random.uniform(0, 9000, nCobras)
+        end[:3] = start[:3]
+        end[3] = start[3] + 2 * trajectories.stepWidth
+        stepLimits = np.column_stack((start, end))
+        earlyMovements = np.random.random(nCobras) > 0.5
+        movingCobras = np.full(nCobras, True)
+        movingCobras[0] = False
+        (steps, moves, waits) = trajectories.calculateMotorStepMoves(
+            stepLimits, earlyMovements, movingCobras)
+
+        # Check that the moves are exactly the same as with np.arange
+        for i in range(1, nCobras):
+            expectedMoves = np.concatenate((np.arange(
+                start[i], end[i], trajectories.stepWidth), [end[i]]))
+            assert np.array_equal(steps[i, moves[i]], expectedMoves)
+            assert np.all(steps[i, waits[i]] == start[i])
+            assert np.all(steps[i, ~np.logical_or(moves[i], waits[i])] ==
+                          end[i])
+
+            if earlyMovements[i]:
+                assert np.all(moves[i, :len(expectedMoves)])
+                assert not np.any(waits[i])
+            else:
+                assert np.all(moves[i, -len(expectedMoves):])
+
+        # Check that the cobras that do not move stay at the end limits
+        assert not np.any(moves[0]) and not np.any(waits[0])
+        assert np.all(steps[0] == end[0])
+
+    def test_calculateCobraTrajectories_method(self, trajectories):
+        # Check that the trajectories end at the final positions
+        assert trajectories.fiberPositions.shape == (
+            trajectories.bench.cobras.nCobras, trajectories.nSteps)
+        assert np.allclose(trajectories.fiberPositions[:, 0],
+                           trajectories.startFiberPositions, atol=1e-6)
+        assert np.allclose(trajectories.fiberPositions[:, -1],
+                           trajectories.finalFiberPositions, atol=1e-6)
+
+        # Check that the motor steps change monotonically
+        for steps in trajectories.motorSteps:
+            assert np.all(np.diff(steps, axis=1) >= 0)
+
+    def test_updateCobraTrajectories_method(self, trajectories):
+        # Change the theta movement direction of some cobras
+        cobraIndices = np.array([3, 10, 500])
+        movementDirections = trajectories.movementDirections.copy()
+        movementDirections[0, cobraIndices] = ~movementDirections[
+            0, cobraIndices]
+        movementStrategies = trajectories.movementStrategies.copy()
+        movementStrategies[:, cobraIndices] = True
+
+        # Check that the updated trajectories are the same as the ones
+        # calculated for all the cobras
+        newTrajectories = TrajectoryGroup(
+            trajectories.nSteps, trajectories.stepWidth, trajectories.bench,
+            trajectories.finalFiberPositions, movementDirections,
+            movementStrategies)
+        fiberPositions = trajectories.fiberPositions
+        trajectories.updateCobraTrajectories(
+            cobraIndices, movementDirections, movementStrategies)
+        assert trajectories.fiberPositions is fiberPositions
+        assert np.array_equal(trajectories.movementDirections,
+                              movementDirections)
+        assert np.array_equal(trajectories.startFiberPositions,
+                              newTrajectories.startFiberPositions)
+        assert np.array_equal(trajectories.fiberPositions,
+                              newTrajectories.fiberPositions)
+        assert np.array_equal(trajectories.elbowPositions,
+                              newTrajectories.elbowPositions)
+        assert np.array_equal(trajectories.motorSteps,
+                              newTrajectories.motorSteps)
+
+    def test_calculateClosestApproaches_method(self, trajectories):
+        # Check that the intermediate positions match the trajectory steps
+        cobraIndices = np.array([3, 10, 500])
+        times = np.tile(np.arange(trajectories.nSteps, dtype="float"),
+                        (len(cobraIndices), 1))
+        (fiberPositions, elbowPositions) = \
+            trajectories.calculateIntermediatePositions(times, cobraIndices)
+        assert np.allclose(fiberPositions,
+                           trajectories.fiberPositions[cobraIndices])
+        assert np.allclose(elbowPositions,
+                           trajectories.elbowPositions[cobraIndices])
+
+        # Calculate the closest approaches for the closest associations
+        bench = trajectories.bench
+        (distances, _, _) = bench.calculateAssociationDistances(
+            trajectories.fiberPositions, trajectories.elbowPositions,
+            useBroadPhase=False)
+        associationIndices = np.argsort(np.min(distances, axis=1))[:20]
+        (closestSteps, closestDistances) = \
+            trajectories.calculateClosestApproaches(associationIndices)
+        assert np.all(closestSteps >= 0)
+        assert np.all(closestSteps <= trajectories.nSteps - 1)
+        assert np.all(closestDistances <= np.min(
+            distances[associationIndices], axis=1))
+
+        # Check the results against a dense sampling of the trajectories
+        cobraAssociations = bench.cobraAssociations[:, associationIndices]
+        times = np.tile(np.linspace(0, trajectories.nSteps - 1,
+                                    20 * (trajectories.nSteps - 1) + 1),
+                        (len(associationIndices), 1))
+        denseDistances = bench.distancesBetweenLineSegments(
+            *trajectories.calculateIntermediatePositions(
+                times, cobraAssociations[0]),
+            *trajectories.calculateIntermediatePositions(
+                times, cobraAssociations[1]))
+        assert np.all(closestDistances <=
+                      np.min(denseDistances, axis=1) + 1e-6)
+
+    def test_compact_trajectories(self, trajectories):
+        # Calculate the same trajectories using the compact representation
+        compactTrajectories = TrajectoryGroup(
+            trajectories.nSteps, trajectories.stepWidth, trajectories.bench,
+            trajectories.finalFiberPositions,
+            trajectories.movementDirections,
+            trajectories.movementStrategies, compact=True)
+        assert compactTrajectories.fiberPositions is None
+        assert compactTrajectories.elbowPositions is None
+
+        # Check that the keyframes use much less memory than the positions
+        keyframesSize = sum(
+            array.nbytes for array in (compactTrajectories.startAngles,
+                                       compactTrajectories.finalAngles,
+                                       compactTrajectories.stepLimits,
+                                       compactTrajectories.thtSigns))
+        assert keyframesSize < (trajectories.fiberPositions.nbytes +
+                                trajectories.elbowPositions.nbytes) / 50
+
+        # Check that the positions evaluated on demand are the same
+        for steps in [None, slice(50, 120), np.array([0, 7, 199])]:
+            for cobraIndices in [None, np.array([3, 10, 500])]:
+                (fiberPositions, elbowPositions) = trajectories.getPositions(
+                    steps, cobraIndices)
+                (compactFiberPositions, compactElbowPositions) = \
+                    compactTrajectories.getPositions(steps, cobraIndices)
+                assert np.array_equal(compactFiberPositions, fiberPositions)
+                assert np.array_equal(compactElbowPositions, elbowPositions)
+
+        # Check that the collisions are the same
+        (compactCollisions, _) = \
+            compactTrajectories.calculateCobraAssociationCollisions()
+        (collisions, _) = trajectories.calculateCobraAssociationCollisions()
+        assert np.array_equal(compactCollisions, collisions)
+
+        # Check that the closest approaches are the same
+        associationIndices = np.flatnonzero(np.any(collisions, axis=1))[:20]
+        (compactClosestSteps, compactClosestDistances) = \
+            compactTrajectories.calculateClosestApproaches(associationIndices)
+        (closestSteps, closestDistances) = \
+            trajectories.calculateClosestApproaches(associationIndices)
+        assert np.array_equal(compactClosestSteps, closestSteps)
+        assert np.array_equal(compactClosestDistances, closestDistances)
+
+    def test_calculateCobraAssociationCollisionReductions_method(
+            self, trajectories):
+        # Calculate the full collisions array for some associations
+        associationIndices = np.arange(0, 3000, 3)
+        (trajectoryCollisions, distances) = \
+            trajectories.calculateCobraAssociationCollisions(
+                associationIndices)
+
+        # Check that the reductions are the same using small chunks
+        (collisions, endPointCollisions, minimumDistances) = \
+            trajectories.calculateCobraAssociationCollisionReductions(
+                associationIndices, memoryBudget=2**20)
+        assert np.array_equal(collisions, np.any(trajectoryCollisions, axis=1))
+        assert np.array_equal(endPointCollisions, trajectoryCollisions[:, -1])
+        assert np.array_equal(minimumDistances, np.min(distances, axis=1))
@@ -0,0 +1,131 @@
+"""
+
+Collection of unit tests for the partitionUtils module.
+
+"""
+
+import numpy as np
+
+from ics.cobraOps import partitionUtils
+from ics.cobraOps import targetUtils
+from ics.cobraOps.cobraConstants import NULL_TARGET_INDEX
+from ics.cobraOps.CollisionSimulator import CollisionSimulator
+from ics.cobraOps.DistanceTargetSelector import DistanceTargetSelector
+from ics.cobraOps.TrajectoryGroup import TrajectoryGroup
+
+
+class TestPartitionUtils():
+    """A collection of tests for the partitionUtils module.
+
+    """
+
+    def test_calculatePartitions_method(self, bench):
+        # Split the bench in three partitions
+        partitionIds = partitionUtils.calculatePartitions(bench, 3)
+
+        # Check that all the partitions have the same number of cobras
+        assert np.array_equal(np.unique(partitionIds), [0, 1, 2])
+        assert np.all(np.bincount(partitionIds) == bench.cobras.nCobras // 3)
+
+    def test_getPartitionCobras_method(self, bench):
+        # Get the cobras in the first partition
+        partitionIds = partitionUtils.calculatePartitions(bench, 3)
+        (cobraIndices, isOwned) = partitionUtils.getPartitionCobras(
+            bench, partitionIds, 0)
+
+        # Check that the partition contains all the owned cobras and their
+        # neighbors
+        (ownedCobras,) = np.where(partitionIds == 0)
+        assert np.array_equal(cobraIndices[isOwned], ownedCobras)
+        assert np.all(np.isin(bench.getCobrasNeighbors(ownedCobras),
+                              cobraIndices))
+        assert np.all(partitionIds[cobraIndices[~isOwned]] != 0)
+
+    def test_selectTargetsInPartitions_method(self, bench):
+        # Run the target selection with and without partitions
+        targets = targetUtils.generateRandomTargets(2, bench)
+        selector = DistanceTargetSelector(bench, targets)
+        selector.run()
+        partitionedSelector = partitionUtils.selectTargetsInPartitions(
+            bench, targets, DistanceTargetSelector, 3, maxWorkers=1)
+
+        # Check that the accessible targets are the same
+        for c in range(bench.cobras.nCobras):
+            indices = selector.accessibleTargetIndices[c]
+            partitionedIndices = partitionedSelector.accessibleTargetIndices[c]
+            assert np.array_equal(
+                np.sort(indices[indices != NULL_TARGET_INDEX]),
+                np.sort(partitionedIndices[
+                    partitionedIndices != NULL_TARGET_INDEX]))
+
+        # Check that each target is assigned at most to one cobra and that
+        # the cobras can reach their targets
+        assignedIndices = partitionedSelector.assignedTargetIndices
+        usedCobras = assignedIndices != NULL_TARGET_INDEX
+        assert len(np.unique(assignedIndices[usedCobras])) == np.sum(usedCobras)
+        assert np.all(np.any(
+            partitionedSelector.accessibleTargetIndices[usedCobras] ==
+            assignedIndices[usedCobras, np.newaxis], axis=1))
+
+    def test_simulateCollisionsInPartitions_method(self, bench):
+        # Run the collision simulator with and without partitions
+        targets = targetUtils.generateOneTargetPerCobra(bench, 3.5)
+        simulator = CollisionSimulator(bench, targets)
+        simulator.run(solveCollisions=False)
+        partitionedSimulator = partitionUtils.simulateCollisionsInPartitions(
+            bench, targets, 3, maxWorkers=2, solveCollisions=False)
+
+        # Check that we get the same results if the collisions are not solved
+        assert np.allclose(partitionedSimulator.finalFiberPositions,
+                           simulator.finalFiberPositions)
+        assert np.array_equal(partitionedSimulator.movementDirections,
+                              simulator.movementDirections)
+        assert np.allclose(partitionedSimulator.trajectories.fiberPositions,
+                           simulator.trajectories.fiberPositions)
+        assert np.array_equal(partitionedSimulator.collisions,
+                              simulator.collisions)
+
+    def test_simulateCollisionsInPartitions_method_solveCollisions(
+            self, bench, targets):
+        # Run the collision simulator in partitions, solving the collisions,
+        # with one and several processes
+        selector = DistanceTargetSelector(bench, targets)
+        selector.run()
+        targets = selector.getSelectedTargets()
+        simulator = partitionUtils.simulateCollisionsInPartitions(
+            bench, targets, 3, maxWorkers=1)
+        parallelSimulator = partitionUtils.simulateCollisionsInPartitions(
+            bench, targets, 3, maxWorkers=2)
+
+        # Check that the merge is deterministic
+        assert np.array_equal(parallelSimulator.movementDirections,
+                              simulator.movementDirections)
+        assert np.array_equal(parallelSimulator.movementStrategies,
+                              simulator.movementStrategies)
+        assert np.array_equal(parallelSimulator.collisions,
+                              simulator.collisions)
+
+        # Check that the merged trajectories, including their keyframes and
+        # motor steps, are the same as the ones calculated for the whole bench
+        trajectories = simulator.trajectories
+        expectedTrajectories = TrajectoryGroup(
+            trajectories.nSteps, trajectories.stepWidth, bench,
+            simulator.finalFiberPositions, simulator.movementDirections,
+            simulator.movementStrategies)
+        assert np.array_equal(trajectories.fiberPositions,
+                              expectedTrajectories.fiberPositions)
+        assert np.array_equal(trajectories.motorSteps,
+                              expectedTrajectories.motorSteps)
+        assert np.array_equal(trajectories.startAngles,
+                              expectedTrajectories.startAngles)
+        assert np.array_equal(trajectories.stepLimits,
+                              expectedTrajectories.stepLimits)
+        assert np.array_equal(trajectories.thtSigns,
+                              expectedTrajectories.thtSigns)
+
+        # Check that the merged simulator can run the collision solver and
+        # calculate the closest approaches
+        simulator.solveTrajectoryCollisions(True)
+        (closestSteps, _) = simulator.trajectories.calculateClosestApproaches(
+            np.arange(10))
+        assert len(closestSteps) == 10
@@ -10,5 +10,5 @@ setup(name="ics.cobraOps",
       package_dir={'':'python'},
       zip_safe=True,
       license="GPLv3",
-      install_requires=["numpy", "matplotlib"],
+      install_requires=["numpy", "scipy", "matplotlib"],
       )